@@ -0,0 +1,113 @@
+#
+# Benchmark decoding of getAllDomainStats records
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+#
+# Run from the top of the source tree:
+#
+#   python3 -m tests.benchmarks.domainstats [--domains N]
+#
+# Compares decode_domain_stats against the per-key regex scan the stats
+# manager used previously, over a synthetic payload shaped like a busy
+# host: every domain has 4 disks, 2 NICs and 4 vcpus.
+
+import argparse
+import re
+import time
+
+from virtManager.lib.statsmanager import decode_domain_stats
+
+
+def _build_record(idx, disks=4, nets=2, vcpus=4):
+    rec = {
+        "state.state": 1,
+        "state.reason": 1,
+        "cpu.time": 1000000000 + idx,
+        "cpu.user": 500000000,
+        "cpu.system": 400000000,
+        "balloon.current": 1048576,
+        "balloon.maximum": 1048576,
+        "balloon.unused": 524288,
+        "vcpu.current": vcpus,
+        "vcpu.maximum": vcpus,
+        "block.count": disks,
+        "net.count": nets,
+    }
+    for vcpu in range(vcpus):
+        rec["vcpu.%d.state" % vcpu] = 1
+        rec["vcpu.%d.time" % vcpu] = 250000000
+        rec["vcpu.%d.wait" % vcpu] = 0
+    for disk in range(disks):
+        prefix = "block.%d." % disk
+        rec[prefix + "name"] = "vd%s" % chr(ord("a") + disk)
+        rec[prefix + "path"] = "/var/lib/libvirt/images/vm%d-%d.qcow2" % (
+            idx, disk)
+        for field in ["rd.reqs", "rd.bytes", "rd.times",
+                      "wr.reqs", "wr.bytes", "wr.times",
+                      "fl.reqs", "fl.times",
+                      "allocation", "capacity", "physical"]:
+            rec[prefix + field] = 4096 * (idx + disk + 1)
+    for net in range(nets):
+        prefix = "net.%d." % net
+        rec[prefix + "name"] = "vnet%d" % (idx * nets + net)
+        for field in ["rx.bytes", "rx.pkts", "rx.errs", "rx.drop",
+                      "tx.bytes", "tx.pkts", "tx.errs", "tx.drop"]:
+            rec[prefix + field] = 1500 * (idx + net + 1)
+    return rec
+
+
+def _regex_scan(rawstats):
+    # The pre decode_domain_stats lookups: two re.match calls per key
+    # for net stats and two more for disk stats
+    rx = tx = rd = wr = 0
+    for key in rawstats.keys():
+        if re.match(r"net.[0-9]+.rx.bytes", key):
+            rx += rawstats[key]
+        if re.match(r"net.[0-9]+.tx.bytes", key):
+            tx += rawstats[key]
+    for key in rawstats.keys():
+        if re.match(r"block.[0-9]+.rd.bytes", key):
+            rd += rawstats[key]
+        if re.match(r"block.[0-9]+.wr.bytes", key):
+            wr += rawstats[key]
+    return rx, tx, rd, wr
+
+
+def _time_tick(cb, payload, rounds):
+    best = None
+    for ignore in range(rounds):
+        start = time.perf_counter()
+        for rec in payload:
+            cb(rec)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Benchmark getAllDomainStats decoding")
+    parser.add_argument("--domains", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=10)
+    options = parser.parse_args()
+
+    payload = [_build_record(idx) for idx in range(options.domains)]
+    now = time.time()
+
+    for rec in payload:
+        sample = decode_domain_stats(rec, now)
+        assert _regex_scan(rec) == (sample.netRxBytes, sample.netTxBytes,
+                                    sample.diskRdBytes, sample.diskWrBytes)
+
+    regex = _time_tick(_regex_scan, payload, options.rounds)
+    decode = _time_tick(lambda rec: decode_domain_stats(rec, now),
+                        payload, options.rounds)
+
+    print("%d domains, best of %d ticks" % (options.domains, options.rounds))
+    print("  regex scan:          %8.2f ms/tick" % (regex * 1000))
+    print("  decode_domain_stats: %8.2f ms/tick" % (decode * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+#
+# Benchmark XMLBuilder.get_xml
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+#
+# Run from the top of the source tree:
+#
+#   python3 -m tests.benchmarks.getxml [--rounds N]
+#
+# Times, for the tests/data/xmlparse domain corpus:
+#
+# - get_xml on parsed domains, with and without the cached result
+# - copy_api, the scratch document copy made for every build mode
+#   get_xml, via copyDoc and via the old serialize + parseDoc round trip
+# - get_xml on a build mode Guest, with and without the cached result
+
+# pylint: disable=protected-access
+
+import argparse
+import glob
+import os
+import time
+
+import virtinst
+from virtinst import xmlapi
+
+from tests import utils
+
+
+def _best_of(cb, rounds):
+    best = None
+    for ignore in range(rounds):
+        start = time.perf_counter()
+        cb()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _uncached_get_xml(objs):
+    for obj in objs:
+        obj._xml_cache = None
+        obj.get_xml()
+
+
+def _cached_get_xml(objs):
+    for obj in objs:
+        obj.get_xml()
+
+
+def _serialize_copy(apis):
+    for api in apis:
+        xmlapi._Libxml2API(api._doc.children.serialize())
+
+
+def _copydoc_copy(apis):
+    for api in apis:
+        api.copy_api()
+
+
+def _build_guest(conn, idx):
+    guest = virtinst.Guest(conn)
+    guest.name = "bench-%d" % idx
+    guest.type = "kvm"
+    guest.memory = 1048576
+    guest.vcpus = 4
+    guest.os.os_type = "hvm"
+    for disknum in range(4):
+        disk = virtinst.DeviceDisk(conn)
+        disk.device = "disk"
+        disk.target = "vd%s" % chr(ord("a") + disknum)
+        disk.bus = "virtio"
+        guest.add_device(disk)
+    for ignore in range(2):
+        net = virtinst.DeviceInterface(conn)
+        net.type = "network"
+        net.source = "default"
+        net.model = "virtio"
+        guest.add_device(net)
+    return guest
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark get_xml")
+    parser.add_argument("--rounds", type=int, default=20)
+    options = parser.parse_args()
+
+    conn = utils.URIs.open_testdefault_cached()
+    parsed = []
+    for infile in sorted(glob.glob(
+            os.path.join(utils.DATADIR, "xmlparse", "*-in.xml"))):
+        xml = open(infile).read()
+        if xml.startswith("<domain "):
+            parsed.append(virtinst.Guest(conn, parsexml=xml))
+    built = [_build_guest(conn, idx) for idx in range(len(parsed))]
+    apis = [g._xmlstate.xmlapi for g in parsed]
+
+    results = [
+        ("parsed get_xml, uncached",
+            _best_of(lambda: _uncached_get_xml(parsed), options.rounds)),
+        ("parsed get_xml, cached",
+            _best_of(lambda: _cached_get_xml(parsed), options.rounds)),
+        ("copy_api, serialize + parseDoc",
+            _best_of(lambda: _serialize_copy(apis), options.rounds)),
+        ("copy_api, copyDoc",
+            _best_of(lambda: _copydoc_copy(apis), options.rounds)),
+        ("build get_xml, uncached",
+            _best_of(lambda: _uncached_get_xml(built), options.rounds)),
+        ("build get_xml, cached",
+            _best_of(lambda: _cached_get_xml(built), options.rounds)),
+    ]
+
+    print("%d domains, best of %d rounds" % (len(parsed), options.rounds))
+    for label, elapsed in results:
+        print("  %-32s %8.2f ms" % (label + ":", elapsed * 1000))
+
+
+if __name__ == "__main__":
+    main()
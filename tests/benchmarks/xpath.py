@@ -0,0 +1,133 @@
+#
+# Benchmark xpath handling in xmlapi
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+#
+# Run from the top of the source tree:
+#
+#   python3 -m tests.benchmarks.xpath [--rounds N]
+#
+# Times, for every domain XML under tests/data:
+#
+# - parsing each xpath string the round trip uses, with a fresh _XPath
+#   every time and through the _parse_xpath cache
+# - the full round trip: parse the domain, then get_xml for it and each
+#   of its devices
+# - get_xml for build mode guests, which creates every element through
+#   _node_make_stub
+
+# pylint: disable=protected-access
+
+import argparse
+import glob
+import os
+import time
+
+import virtinst
+from virtinst import xmlapi
+
+from tests import utils
+
+
+def _best_of(cb, rounds):
+    best = None
+    for ignore in range(rounds):
+        start = time.perf_counter()
+        cb()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def _load_domains():
+    ret = []
+    for path in sorted(glob.glob(os.path.join(utils.DATADIR, "**", "*.xml"),
+                                 recursive=True)):
+        xml = open(path).read()
+        # Some cli compare outputs are several domain documents in a row
+        if xml.startswith("<domain ") and "\n<domain " not in xml:
+            ret.append(xml)
+    return ret
+
+
+def _round_trip(conn, domains):
+    for xml in domains:
+        guest = virtinst.Guest(conn, parsexml=xml)
+        for dev in guest.devices.get_all():
+            dev.get_xml()
+        guest.get_xml()
+
+
+def _build(conn, count):
+    for idx in range(count):
+        guest = virtinst.Guest(conn)
+        guest.name = "bench-%d" % idx
+        guest.memory = 1048576
+        guest.os.os_type = "hvm"
+        guest.features.acpi = True
+        guest.features.apic = True
+        guest.cpu.mode = "host-passthrough"
+        for disknum in range(4):
+            disk = virtinst.DeviceDisk(conn)
+            disk.target = "vd%s" % chr(ord("a") + disknum)
+            disk.bus = "virtio"
+            disk.driver_name = "qemu"
+            disk.driver_type = "qcow2"
+            guest.add_device(disk)
+        guest.get_xml()
+
+
+def _record_xpaths(conn, domains):
+    seen = []
+    origfunc = xmlapi._parse_xpath
+
+    def _recording_parse_xpath(fullxpath):
+        seen.append(fullxpath)
+        return origfunc(fullxpath)
+
+    xmlapi._parse_xpath = _recording_parse_xpath
+    try:
+        _round_trip(conn, domains)
+    finally:
+        xmlapi._parse_xpath = origfunc
+    return seen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark xpath handling")
+    parser.add_argument("--rounds", type=int, default=10)
+    options = parser.parse_args()
+
+    conn = utils.URIs.open_testdefault_cached()
+    domains = _load_domains()
+    xpaths = _record_xpaths(conn, domains)
+
+    def _uncached_parse():
+        for xpath in xpaths:
+            xmlapi._XPath(xpath)
+
+    def _cached_parse():
+        for xpath in xpaths:
+            xmlapi._parse_xpath(xpath)
+
+    results = [
+        ("xpath parse, uncached",
+            _best_of(_uncached_parse, options.rounds)),
+        ("xpath parse, cached",
+            _best_of(_cached_parse, options.rounds)),
+        ("domain round trip",
+            _best_of(lambda: _round_trip(conn, domains), options.rounds)),
+        ("build get_xml",
+            _best_of(lambda: _build(conn, len(domains)), options.rounds)),
+    ]
+
+    print("%d domains, %d xpath lookups, best of %d rounds" %
+          (len(domains), len(xpaths), options.rounds))
+    for label, elapsed in results:
+        print("  %-24s %8.2f ms" % (label + ":", elapsed * 1000))
+    print("  %s" % (xmlapi._parse_xpath.cache_info(),))
+
+
+if __name__ == "__main__":
+    main()
@@ -880,6 +880,7 @@ c.add_valid("--location %(TREEDIR)s --initrd-inject virt-install --extra-args ks
 c.add_valid("--hvm --location %(TREEDIR)s --extra-args console=ttyS0")  # Directory tree URL install with extra-args
 c.add_valid("--paravirt --location %(TREEDIR)s")  # Paravirt location
 c.add_valid("--location %(TREEDIR)s --os-variant fedora12")  # URL install with manual os-variant
+c.add_valid("--location %(TREEDIR)s,cache=off")  # URL install with the url cache disabled
 c.add_valid("--cdrom %(EXISTIMG2)s --os-variant win2k3")  # HVM windows install with disk
 c.add_valid("--cdrom %(EXISTIMG2)s --os-variant win2k3 --print-step 2")  # HVM windows install, print 3rd stage XML
 c.add_valid("--pxe --autostart")  # --autostart flag
@@ -1400,11 +1401,18 @@ c.add_compare("--connect %(URI-KVM)s -o test-clone-simple --auto -f /foo.img --p
 c.add_compare(_CLONE_MANAGED + " --auto-clone", "auto-managed")  # Auto flag w/ managed storage
 c.add_compare(_CLONE_UNMANAGED + " --auto-clone", "auto-unmanaged")  # Auto flag w/ local storage
 c.add_valid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --nonsparse")  # Auto flag, actual VM, skip state check
+c.add_valid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --parallel 4")  # Clone all disks concurrently
+c.add_valid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --count 3")  # Bulk clone with generated names
+c.add_valid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --count 2 --name bulk-%%d-vm")  # Bulk clone with a name template
 c.add_valid("--connect %(URI-TEST-FULL)s -o test-clone-simple -n newvm --preserve-data --file %(EXISTIMG1)s")  # Preserve data shouldn't complain about existing volume
 c.add_valid("-n clonetest " + _CLONE_UNMANAGED + " --file %(EXISTIMG3)s --file %(EXISTIMG4)s --check path_exists=off")  # Skip existing file check
 c.add_valid("-n clonetest " + _CLONE_UNMANAGED + " --auto-clone --mac 22:11:11:11:11:11 --check all=off")  # Colliding mac but we skip the check
 c.add_invalid("-n clonetest " + _CLONE_UNMANAGED + " --auto-clone --mac 22:11:11:11:11:11", grep="--check mac_in_use=off")  # Colliding mac should fail
 c.add_invalid("--auto-clone")  # Just the auto flag
+c.add_invalid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --count 2 --mac 22:11:11:11:11:11", grep="--mac can not be used with --count")
+c.add_invalid("--connect %(URI-TEST-FULL)s -o test-clone --file /tmp/foo.img --count 2", grep="--file can not be used with --count")
+c.add_invalid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --count 2 --parallel 2", grep="--parallel can not be used with --count")
+c.add_invalid("--connect %(URI-TEST-FULL)s -o test-clone --auto-clone --count 0", grep="--count must be at least 1")
 c.add_invalid(_CLONE_EMPTY + " --file foo")  # Didn't specify new name
 c.add_invalid(_CLONE_EMPTY + " --auto-clone -n test")  # new name raises error
 c.add_invalid("-o test --auto-clone", grep="shutoff")  # VM is running
@@ -4,11 +4,15 @@
 # See the COPYING file in the top-level directory.
 
 import os
+import shutil
 import tempfile
 
+import pytest
+
 from tests import utils
 
 from virtinst import Cloner
+from virtinst import diskbackend
 
 
 CLI_XMLDIR = utils.DATADIR + "/cli/virtclone/"
@@ -44,6 +48,119 @@ def test_clone_unmanaged():
     assert open(tmp2.name).read() == open(inp2).read()
 
 
+def test_clone_unmanaged_parallel(monkeypatch):
+    """
+    Test concurrent disk duplication, and storage cleanup when one
+    of the disks fails to clone
+    """
+    xmlpath = CLI_XMLDIR + "clone-disk.xml"
+    conn = utils.URIs.open_testdefault_cached()
+    xml = open(xmlpath).read()
+    inp1 = os.path.abspath(__file__)
+    inp2 = xmlpath
+    xml = xml.replace("/tmp/__virtinst_cli_exist1.img", inp1)
+    xml = xml.replace("/tmp/__virtinst_cli_exist2.img", inp2)
+    tmpdir = tempfile.TemporaryDirectory()
+
+    def _clone(out1, out2):
+        cloner = Cloner(conn, src_xml=xml)
+        diskinfos = cloner.get_nonshare_diskinfos()
+        diskinfos[0].set_new_path(os.path.join(tmpdir.name, out1), True)
+        diskinfos[1].set_new_path(os.path.join(tmpdir.name, out2), True)
+        cloner.set_parallel(2)
+        cloner.prepare()
+        try:
+            cloner.start_duplicate(None)
+        finally:
+            names = [d.name() for d in conn.listAllDomains()]
+            defined.append(cloner.new_guest.name in names)
+            if defined[-1]:
+                conn.lookupByName(cloner.new_guest.name).undefine()
+
+    defined = []
+    _clone("new1.img", "new2.img")
+    assert defined == [True]
+    assert open(os.path.join(tmpdir.name, "new1.img")).read() == \
+            open(inp1).read()
+    assert open(os.path.join(tmpdir.name, "new2.img")).read() == \
+            open(inp2).read()
+
+    origcreate = diskbackend.CloneStorageCreator.create
+    def _fake_create(self, meter):
+        if self.get_path().endswith("fail.img"):
+            open(self.get_path(), "w").write("partial")
+            raise RuntimeError("fake clone failure")
+        return origcreate(self, meter)
+    monkeypatch.setattr(diskbackend.CloneStorageCreator,
+            "create", _fake_create)
+
+    # The failed clone is undefined, and none of its storage is left
+    with pytest.raises(RuntimeError, match="fake clone failure"):
+        _clone("new3.img", "fail.img")
+    assert defined == [True, False]
+    assert not os.path.exists(os.path.join(tmpdir.name, "new3.img"))
+    assert not os.path.exists(os.path.join(tmpdir.name, "fail.img"))
+
+
+def test_clone_bulk(monkeypatch, tmp_path):
+    """
+    Test bulk cloning: name and path generation, and every clone
+    getting a copy of the unmanaged storage from a single read pass
+    """
+    xmlpath = CLI_XMLDIR + "clone-disk.xml"
+    conn = utils.URIs.open_testdefault_cached()
+    xml = open(xmlpath).read()
+    inp1 = str(tmp_path / "disk1.img")
+    inp2 = str(tmp_path / "disk2.img")
+    shutil.copy(os.path.abspath(__file__), inp1)
+    shutil.copy(xmlpath, inp2)
+    xml = xml.replace("/tmp/__virtinst_cli_exist1.img", inp1)
+    xml = xml.replace("/tmp/__virtinst_cli_exist2.img", inp2)
+
+    cloners = Cloner.build_bulk(conn, 3, src_xml=xml,
+                                name_template="bulk%d-vm")
+    assert [c.new_guest.name for c in cloners] == [
+            "bulk1-vm", "bulk2-vm", "bulk3-vm"]
+    assert len(set(c.new_guest.uuid for c in cloners)) == 3
+
+    # Generated paths don't collide with other clones in the run
+    for cloner in cloners:
+        diskinfos = cloner.get_nonshare_diskinfos()
+        diskinfos[1].set_new_path(
+                str(tmp_path / (cloner.new_guest.name + ".img")), True)
+        cloner.prepare()
+    paths = [c.get_nonshare_diskinfos()[0].new_disk.get_source_path()
+             for c in cloners]
+    assert paths == [str(tmp_path / "disk1-clone.img"),
+                     str(tmp_path / "disk1-clone-1.img"),
+                     str(tmp_path / "disk1-clone-2.img")]
+
+    # Each source is read by a single copier, writing every clone
+    copiers = []
+    originit = diskbackend._LocalFileCopier.__init__
+    def _fake_init(self, src_fd, dst_fds, *args, **kwargs):
+        copiers.append(len(dst_fds))
+        return originit(self, src_fd, dst_fds, *args, **kwargs)
+    monkeypatch.setattr(diskbackend._LocalFileCopier, "__init__", _fake_init)
+
+    try:
+        Cloner.start_bulk_duplicate(cloners, None)
+    finally:
+        for cloner in cloners:
+            conn.lookupByName(cloner.new_guest.name).undefine()
+
+    assert copiers == [3, 3]
+    for path in paths:
+        assert open(path).read() == open(inp1).read()
+    for cloner in cloners:
+        newpath = str(tmp_path / (cloner.new_guest.name + ".img"))
+        assert open(newpath).read() == open(inp2).read()
+
+    cloners = Cloner.build_bulk(conn, 2, src_xml=xml)
+    assert [c.new_guest.name for c in cloners] == [
+            "origtest-clone", "origtest-clone1"]
+
+
 def test_generate_name():
     conn = utils.URIs.open_testdriver_cached()
     def _g(n):
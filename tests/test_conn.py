@@ -7,9 +7,12 @@ import pytest
 
 from virtinst import cli
 from virtinst import pollhelpers
+from virtinst import DeviceDisk
 from virtinst import StoragePool
 from virtinst import URI
 
+from tests import utils
+
 
 ############################
 # VirtinstConnection tests #
@@ -92,3 +95,152 @@ def test_poll():
     poolobj1.undefine()
     poolobj2.destroy()
     poolobj2.undefine()
+
+
+def test_poll_deltas():
+    # Event driven polling only looks up the passed names
+    conn = cli.getConnection("test:///default")
+    def build_cb(obj, name):
+        return obj
+
+    gone, new, master = pollhelpers.fetch_nets(conn, {}, build_cb,
+            deltas=["default", "idontexist"])
+    assert len(gone) == 0
+    assert len(new) == 1
+    assert new[0].name() == "default"
+
+    objmap = dict((obj.name(), obj) for obj in master)
+    objmap["fakenet"] = "fakenet-obj"
+    gone, new, master = pollhelpers.fetch_nets(conn, objmap, build_cb,
+            deltas=["default", "fakenet"])
+    assert gone == ["fakenet-obj"]
+    assert len(new) == 0
+    assert [o.name() for o in master] == ["default"]
+
+    # Empty deltas are a no-op, not a full listing
+    gone, new, master = pollhelpers.fetch_vms(conn, {}, build_cb, deltas=[])
+    assert gone == []
+    assert new == []
+    assert master == []
+
+
+def test_poll_nodedevs_scale():
+    # Simulate a host with thousands of SR-IOV VFs, and check that an
+    # event driven poll does a single lookup instead of a full listing
+    class _FakeDev:
+        def __init__(self, name):
+            self._name = name
+        def name(self):
+            counts["name"] += 1
+            return self._name
+
+    class _FakeSupport:
+        @staticmethod
+        def conn_nodedev():
+            return True
+
+    class _FakeBackend:
+        support = _FakeSupport()
+        def listAllDevices(self, flags):
+            ignore = flags
+            counts["list"] += 1
+            return [_FakeDev(n) for n in devnames]
+        def nodeDeviceLookupByName(self, name):
+            counts["lookup"] += 1
+            if name not in devnameset:
+                raise RuntimeError("no nodedev %s" % name)
+            return _FakeDev(name)
+
+    devnames = ["pci_0000_%.2x_%.2x_%x" % (b, s, f)
+                for b in range(8) for s in range(32) for f in range(8)]
+    devnameset = set(devnames)
+    counts = {"name": 0, "list": 0, "lookup": 0}
+    backend = _FakeBackend()
+    def build_cb(obj, name):
+        return name
+
+    gone, new, master = pollhelpers.fetch_nodedevs(backend, {}, build_cb)
+    assert len(new) == len(devnames) == 2048
+    assert counts == {"name": 2048, "list": 1, "lookup": 0}
+
+    # Full poll with nothing changed
+    objmap = dict((name, name) for name in master)
+    gone, new, master = pollhelpers.fetch_nodedevs(backend, objmap, build_cb)
+    assert not gone and not new
+    assert len(master) == 2048
+
+    # One VF removed, one added, with only event deltas
+    counts = {"name": 0, "list": 0, "lookup": 0}
+    devnames.remove("pci_0000_00_00_1")
+    devnames.append("pci_0000_ff_00_0")
+    devnameset = set(devnames)
+    objmap = dict((name, name) for name in master)
+    gone, new, master = pollhelpers.fetch_nodedevs(backend, objmap, build_cb,
+            deltas=["pci_0000_00_00_1", "pci_0000_ff_00_0"])
+    assert gone == ["pci_0000_00_00_1"]
+    assert new == ["pci_0000_ff_00_0"]
+    assert len(master) == 2048
+    assert counts == {"name": 0, "list": 0, "lookup": 2}
+
+
+def test_fetch_indexes():
+    # Indexed lookups over the fetch_all_* caches
+    # pylint: disable=protected-access
+    conn = utils.URIs.openconn(utils.URIs.test_suite)
+
+    path = "/dev/default-pool/collidevol1.img"
+    names = [vm.name for idx, vm, disk in conn.lookup_domains_by_path(path)]
+    assert "test-collide" in names
+    assert "test-collide" in DeviceDisk.path_in_use_by(conn, path)
+    assert conn.lookup_domains_by_path("/idontexist") == []
+
+    # Index is built once per cache fill
+    index = conn._fetch_index_cache["domains-by-path"]
+    conn.lookup_domains_by_path(path)
+    assert conn._fetch_index_cache["domains-by-path"] is index
+
+    vol = conn.lookup_vol_by_path("/dev/default-pool/default-vol")
+    assert vol.name == "default-vol"
+    assert not conn.lookup_vol_by_path("/idontexist")
+
+    pool = conn.lookup_pool_by_name("default-pool")
+    assert conn.lookup_pool_by_target_path(pool.target_path) is pool
+    assert not conn.lookup_pool_by_name("idontexist")
+
+    # cache_new_pool must invalidate the pool indexes
+    poolxml = StoragePool(conn)
+    poolxml.type = "dir"
+    poolxml.name = "conntest-index"
+    poolxml.target_path = "/tmp/foo/bar/baz/conntest-index"
+    poolobj = poolxml.install(create=False)
+    try:
+        assert conn.lookup_pool_by_name("conntest-index")
+    finally:
+        poolobj.undefine()
+
+
+def test_fetch_indexes_callback():
+    # virt-manager's fetch callbacks return a new list on every call,
+    # which must not force the indexes to be rebuilt
+    # pylint: disable=protected-access
+    conn = utils.URIs.openconn(utils.URIs.test_suite)
+    domains = conn.fetch_all_domains()
+    vols = conn.fetch_all_vols()
+    conn.cb_fetch_all_domains = lambda: list(domains)
+    conn.cb_fetch_all_vols = lambda: list(vols)
+    try:
+        path = "/dev/default-pool/collidevol1.img"
+        assert "test-collide" in DeviceDisk.path_in_use_by(conn, path)
+        domindex = conn._fetch_index_cache["domains-by-path"][1]
+        volindex = conn._fetch_index_cache["vols-by-backing-store"][1]
+        DeviceDisk.path_in_use_by(conn, path)
+        assert conn._fetch_index_cache["domains-by-path"][1] is domindex
+        assert conn._fetch_index_cache["vols-by-backing-store"][1] is volindex
+
+        # A changed list does rebuild
+        conn.cb_fetch_all_domains = lambda: list(domains[1:])
+        DeviceDisk.path_in_use_by(conn, path)
+        assert conn._fetch_index_cache["domains-by-path"][1] is not domindex
+    finally:
+        conn.cb_fetch_all_domains = None
+        conn.cb_fetch_all_vols = None
@@ -3,6 +3,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import errno
 import os
 import tempfile
 
@@ -163,6 +164,56 @@ def test_disk_diskbackend_misc():
     assert disk.get_size()
 
 
+def test_disk_clone_sparse(monkeypatch):
+    # pylint: disable=protected-access
+    from virtinst import diskbackend
+
+    # Synthetic image: hole, random data, zeroed data, trailing hole
+    mib = 1024 * 1024
+    data = os.urandom(mib)
+    tmpinput = tempfile.NamedTemporaryFile()
+    with open(tmpinput.name, "wb") as f:
+        f.truncate(16 * mib)
+        f.seek(4 * mib)
+        f.write(data + bytes(mib) + data[:5000])
+
+    def _clone(sparse):
+        tmpoutput = tempfile.NamedTemporaryFile()
+        offsets = []
+        src_fd = os.open(tmpinput.name, os.O_RDONLY)
+        dst_fd = os.open(tmpoutput.name, os.O_WRONLY)
+        try:
+            copier = diskbackend._LocalFileCopier(
+                    src_fd, [dst_fd], offsets.append, mib // 2)
+            if sparse:
+                copier.copy_sparse(20 * mib)
+            else:
+                copier.copy_full()
+        finally:
+            os.close(src_fd)
+            os.close(dst_fd)
+
+        assert offsets == sorted(offsets)
+        outdata = open(tmpoutput.name, "rb").read()
+        assert outdata[:16 * mib] == open(tmpinput.name, "rb").read()
+        assert len(outdata) == (sparse and 20 * mib or 16 * mib)
+        return os.stat(tmpoutput.name).st_blocks * 512
+
+    full = _clone(False)
+    sparse = _clone(True)
+    assert sparse < full
+
+    # Filesystems without reflink, copy_file_range or hole reporting
+    def _unsupported(*args, **kwargs):
+        raise OSError(errno.EXDEV, "unsupported")
+    monkeypatch.setattr(diskbackend.fcntl, "ioctl", _unsupported)
+    monkeypatch.setattr(os, "copy_file_range", _unsupported)
+    monkeypatch.setattr(os, "sendfile", _unsupported)
+    monkeypatch.delattr(os, "SEEK_DATA")
+    assert _clone(True) <= 2 * mib + 8192
+    _clone(False)
+
+
 def test_disk_diskbackend_parse():
     # Test that calling validate() on parsed disk XML doesn't attempt
     # to verify the path exists. Assume it's a working config
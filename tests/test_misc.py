@@ -7,6 +7,8 @@ import io
 import os
 import unittest
 
+import libvirt
+
 import virtinst
 
 from tests import utils
@@ -91,6 +93,44 @@ def test_misc_nonpredicatble_generate():
     virtinst.DeviceInterface.check_mac_in_use(predconn, None)
 
 
+def test_misc_generate_name_sets():
+    """
+    Set based name generation matches the collision callback results
+    """
+    from virtinst import generatename
+    existing = ["foo", "foo-1", "foo-2", "foo-01", "foo-4", "foo-x",
+                "foo1.img", "foo3.img", "foo-clone5", "bar",
+                # Digits int() rejects, or reads as another number
+                "foo-\u00b2", "foo-\u0663"]
+
+    def _both(*args, **kwargs):
+        ret1 = generatename.generate_names("foo", existing.__contains__,
+                *args, **kwargs)
+        ret2 = generatename.generate_names("foo", None, *args,
+                existing_names=set(existing), **kwargs)
+        assert ret1 == ret2
+        return ret1
+
+    assert _both(1) == ["foo-3"]
+    assert _both(3) == ["foo-3", "foo-5", "foo-6"]
+    assert _both(2, start_num=4) == ["foo-5", "foo-6"]
+    assert _both(3, suffix=".img", sep="") == [
+            "foo.img", "foo2.img", "foo4.img"]
+    assert _both(2, suffix=".img", sep="", force_num=True) == [
+            "foo2.img", "foo4.img"]
+    assert _both(1, sep="-clone", start_num=5) == ["foo-clone6"]
+    assert generatename.generate_name("bar", None,
+            existing_names=existing) == "bar-1"
+
+    conn = utils.URIs.open_testdefault_cached()
+    names = generatename.libvirt_name_set(conn.listAllDomains)
+    assert "test" in names
+
+    def _fail():
+        raise libvirt.libvirtError("fake list failure")
+    assert generatename.libvirt_name_set(_fail) is None
+
+
 def test_misc_support_cornercases():
     """
     Test support.py corner cases
@@ -199,3 +239,196 @@ def test_misc_meter():
     # BaseMeter coverage
     meter = _progresspriv.BaseMeter()
     _test_meter_values(meter)
+
+
+def test_misc_volumeupload_stream():
+    """
+    Block reader plus partial stream sends must transfer every byte
+    """
+    # pylint: disable=protected-access
+    from virtinst.install import volumeupload
+
+    class _PartialStream:
+        def __init__(self):
+            self.data = bytearray()
+
+        def send(self, data):
+            ret = min(len(data), 100000)
+            self.data += data[:ret]
+            return ret
+
+    content = os.urandom(3 * 1024 * 1024 + 12345)
+    stream = _PartialStream()
+    reader = volumeupload._BlockReader(io.BytesIO(content))
+    for block in reader.blocks():
+        volumeupload._send_all(stream, block)
+    assert bytes(stream.data) == content
+
+
+def test_misc_volumeupload_sparse(tmp_path):
+    """
+    Drive the sparse stream callbacks like sparseSendAll does, over a
+    file with a hole in the middle and a trailing hole
+    """
+    # pylint: disable=protected-access
+    from virtinst.install import volumeupload
+
+    head = os.urandom(4096)
+    middle = os.urandom(8192)
+    path = tmp_path / "sparse.img"
+    with open(str(path), "wb") as f:
+        f.write(head)
+        f.seek(1024 * 1024, os.SEEK_CUR)
+        f.write(middle)
+        f.truncate(f.tell() + 1024 * 1024)
+    size = os.path.getsize(str(path))
+
+    progress = []
+    out = bytearray()
+    with open(str(path), "rb") as f:
+        data_cb, hole_cb, skip_cb = volumeupload._make_sparse_callbacks(
+                f.fileno(), progress.append)
+        while True:
+            indata, length = hole_cb(None, None)
+            if not indata and length == 0:
+                break
+            assert length > 0
+            if not indata:
+                skip_cb(None, length, None)
+                out += bytes(length)
+                continue
+            out += data_cb(None, min(length, 65536), None)
+
+    assert bytes(out) == path.read_bytes()
+    assert progress[-1] == size
+
+
+def _parse_newc(data):
+    """
+    Parse a newc cpio archive into a {name: (mode, content)} dict
+    """
+    ret = {}
+    offset = 0
+    while True:
+        assert data[offset:offset + 6] == b"070701"
+        fields = [int(data[offset + 6 + i * 8:offset + 14 + i * 8], 16)
+                  for i in range(13)]
+        mode, uid, filesize, namesize = (fields[1], fields[2],
+                                         fields[6], fields[11])
+        assert uid == 0
+        offset += 110
+        name = data[offset:offset + namesize - 1].decode("utf-8")
+        offset += namesize + (-(110 + namesize) % 4)
+        if name == "TRAILER!!!":
+            return ret
+        ret[name] = (mode, data[offset:offset + filesize])
+        offset += filesize + (-filesize % 4)
+
+
+def test_misc_initrd_injection(tmp_path):
+    """
+    Round trip the initrd archive we append, for each compression
+    """
+    # pylint: disable=protected-access
+    import gzip
+    import lzma
+    from virtinst.install import installerinject
+
+    src1 = tmp_path / "ks.cfg"
+    src1.write_bytes(b"text\n")
+    src2 = tmp_path / "payload.bin"
+    src2.write_bytes(os.urandom(3 * 1024 * 1024 + 3))
+    os.chmod(str(src2), 0o755)
+
+    for compression, decompress in [("gzip", gzip.decompress),
+                                    ("xz", lzma.decompress)]:
+        initrd = tmp_path / ("initrd-" + compression)
+        initrd.write_bytes(b"")
+        installerinject.perform_initrd_injections(str(initrd),
+                [str(src1), (str(src2), "renamed.bin")], str(tmp_path),
+                compression=compression)
+
+        entries = _parse_newc(decompress(initrd.read_bytes()))
+        assert sorted(entries) == [".", "ks.cfg", "renamed.bin"]
+        assert entries["."][0] == 0o40755
+        assert entries["ks.cfg"][1] == b"text\n"
+        assert entries["renamed.bin"][0] == 0o100755
+        assert entries["renamed.bin"][1] == src2.read_bytes()
+
+
+def test_misc_job_poller():
+    """
+    Jobs sharing a JobPoller are all polled, back off while they
+    aren't progressing, and aren't polled after removal
+    """
+    import time
+    from virtinst import progress
+
+    class _FakeConn:
+        pass
+    conn = _FakeConn()
+    poller = progress.JobPoller.get_instance(conn)
+    assert progress.JobPoller.get_instance(conn) is poller
+
+    calls = {"busy": 0, "idle": 0}
+    def _busy():
+        calls["busy"] += 1
+        return True
+    def _idle():
+        calls["idle"] += 1
+        return False
+
+    busyjob = poller.add(_busy, min_interval=.02, max_interval=1)
+    idlejob = poller.add(_idle, min_interval=.02, max_interval=.16)
+    time.sleep(.5)
+    poller.remove(busyjob)
+    poller.remove(idlejob)
+    assert calls["busy"] > calls["idle"] > 0
+    assert idlejob.interval == .16
+
+    # poke() polls right away, regardless of the interval
+    before = calls["busy"]
+    busyjob = poller.add(_busy, min_interval=60)
+    poller.poke(busyjob)
+    time.sleep(.2)
+    poller.remove(busyjob)
+    assert calls["busy"] > before
+
+
+def test_misc_job_poller_event_key():
+    """
+    A domain job event pokes a job registered for the domain by UUID,
+    even when the job runs on a separate lookup of the domain, like
+    virt-manager's migrate does
+    """
+    import time
+    from virtinst import progress
+
+    conn = utils.URIs.open_testdefault_cached()
+    poller = progress.JobPoller.get_instance(conn)
+    migratedom = conn.lookupByName("test")
+
+    polled = []
+    def _poll():
+        polled.append(time.monotonic())
+        return False
+    job = poller.add(_poll, min_interval=60, max_interval=60,
+                     key=migratedom.UUIDString())
+    otherjob = poller.add(lambda: polled.append(None), min_interval=60,
+                          max_interval=60, key="other-uuid")
+    try:
+        # What vmmConnection._domain_job_event does with the event's
+        # own domain object
+        eventdom = conn.lookupByName("test")
+        start = time.monotonic()
+        poller.poke_key(eventdom.UUIDString())
+        for ignore in range(100):
+            if polled:
+                break
+            time.sleep(.01)
+    finally:
+        poller.remove(job)
+        poller.remove(otherjob)
+
+    assert len(polled) == 1
+    assert polled[0] - start < 1
@@ -119,3 +119,48 @@ def test_drivers():
     assert win7.supports_unattended_drivers("x86_64") is True
     assert win7.supports_unattended_drivers("fakearch") is False
     assert win7.get_pre_installable_drivers_location("x86_64")
+
+
+def test_osinfo_index(tmp_path, monkeypatch):
+    # pylint: disable=protected-access
+    from virtinst import osdict
+
+    osdb = osdict._OSDB(cachedir=str(tmp_path))
+    names = [o.name for o in osdb.list_os()]
+    assert names == [o.name for o in OSDB.list_os()]
+    indexpath = tmp_path / "osinfo-index.json"
+    assert indexpath.exists()
+
+    # A fresh OSDB should serve lookups from the index, without
+    # loading the osinfo DB until a Libosinfo.Os is needed
+    osdb = osdict._OSDB(cachedir=str(tmp_path))
+    assert [o.name for o in osdb.list_os()] == names
+    win7 = osdb.lookup_os("win7")
+    assert osdb.lookup_os_by_full_id(win7.full_id) is win7
+    assert win7.is_windows()
+    assert win7.supports_virtiodisk() == OSDB.lookup_os(
+            "win7").supports_virtiodisk()
+    assert getattr(osdb, "_OSDB__os_loader") is None
+    assert win7.get_handle().get_id() == win7.full_id
+    assert getattr(osdb, "_OSDB__os_loader") is not None
+
+    def _check_stale():
+        osdb = osdict._OSDB(cachedir=str(tmp_path))
+        osdb.list_os()
+        assert getattr(osdb, "_OSDB__os_loader") is not None
+
+    # A libosinfo upgrade, or a different messages locale, invalidates
+    # the index even if the osinfo DB is unchanged
+    monkeypatch.setattr(osdict, "_get_libosinfo_version",
+            lambda: "0.0.1")
+    _check_stale()
+    monkeypatch.setattr(osdict, "_get_messages_locale",
+            lambda: ["xx_XX.UTF-8", None])
+    _check_stale()
+
+    # A changed osinfo DB invalidates the index
+    mtime = indexpath.stat().st_mtime
+    monkeypatch.setattr(osdict, "_get_osinfo_fingerprint",
+            lambda: {"dirs": [["/fake", 1]]})
+    _check_stale()
+    assert indexpath.stat().st_mtime >= mtime
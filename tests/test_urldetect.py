@@ -3,7 +3,14 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import glob
+import http.server
 import os
+import shutil
+import struct
+import tempfile
+import threading
+import time
 import unittest.mock
 
 import pytest
@@ -141,3 +148,351 @@ def test_misc():
         _test("empty")
     assert "installable distribution" in str(e.value)
     assert "mistyped" in str(e.value)
+
+
+class _RangeHTTPHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Serves self.server.files, with byte range and ETag support. Can drop the
+    connection halfway through a response, and throttle responses
+    like a busy mirror
+    """
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+    def _send(self, send_body):
+        data = self.server.files.get(self.path)
+        rangehdr = self.headers.get("Range")
+        self.server.seen.append((self.command, self.path, rangehdr))
+        if data is None:
+            self.send_error(404)
+            return
+
+        etag = '"%d-%d"' % (len(data), hash(data))
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.end_headers()
+            return
+
+        start, end = 0, len(data)
+        if rangehdr:
+            first, last = rangehdr.split("=")[1].split("-")
+            start, end = int(first), int(last) + 1
+            self.send_response(206)
+            self.send_header("Content-Range",
+                    "bytes %d-%d/%d" % (start, end - 1, len(data)))
+        else:
+            self.send_response(200)
+        self.send_header("Accept-Ranges", "bytes")
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(end - start))
+        self.end_headers()
+        if not send_body:
+            return
+
+        body = data[start:end]
+        if self.server.drop_next:
+            self.server.drop_next = False
+            body = body[:len(body) // 2]
+            self.close_connection = True
+        blocksize = 256 * 1024
+        try:
+            for pos in range(0, len(body), blocksize):
+                self.wfile.write(body[pos:pos + blocksize])
+                time.sleep(self.server.delay)
+        except (BrokenPipeError, ConnectionResetError):
+            # Client closed the response early, like the segmented
+            # download does with its initial request
+            self.close_connection = True
+
+    def do_HEAD(self):
+        self._send(False)
+
+    def do_GET(self):
+        self._send(True)
+
+
+def _start_http_server(monkeypatch, files):
+    """
+    Start a _RangeHTTPHandler server for files, and return it along
+    with the base URL of the files
+    """
+    import requests
+
+    # Undo the testsuite requests mocking
+    monkeypatch.setattr(requests, "Session", requests.sessions.Session)
+
+    server = http.server.ThreadingHTTPServer(
+            ("127.0.0.1", 0), _RangeHTTPHandler)
+    server.files = files
+    server.seen = []
+    server.drop_next = False
+    server.delay = 0
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, "http://127.0.0.1:%d/tree" % server.server_address[1]
+
+
+def test_http_fetcher_local_server(monkeypatch):
+    """
+    Run the HTTP fetcher against a local stand in server: concurrent
+    probe prefetching, segmented range downloads, and resuming an
+    interrupted transfer. Also logs a rough timing of segmented vs
+    single stream downloads from a throttled server
+    """
+    # pylint: disable=protected-access
+    from virtinst.install import urlfetcher
+
+    bigdata = os.urandom(8 * 1024 * 1024)
+    server, url = _start_http_server(monkeypatch, {
+        "/tree/.treeinfo": b"[general]\nfamily = Fake\n",
+        "/tree/big.img": bigdata})
+    scratchdir = tempfile.TemporaryDirectory()
+    meter = virtinst.progress.make_meter(quiet=True)
+    fetcher = urlfetcher.fetcherForURI(url, scratchdir.name, meter)
+
+    def _acquire():
+        fn = fetcher.acquireFile("big.img")
+        try:
+            return open(fn, "rb").read()
+        finally:
+            os.unlink(fn)
+
+    def _ranges():
+        return [s[2] for s in server.seen
+                if s[0] == "GET" and s[1] == "/tree/big.img" and s[2]]
+
+    try:
+        ret = fetcher.prefetchFileContents([".treeinfo", "VERSION"])
+        assert ret == {".treeinfo": "[general]\nfamily = Fake\n",
+                       "VERSION": None}
+
+        # Small files are a single stream
+        assert _acquire() == bigdata
+        assert _ranges() == []
+
+        # Big files are split in ranges
+        monkeypatch.setattr(urlfetcher._HTTPURLFetcher,
+                "_segment_min_size", 1024 * 1024)
+        assert _acquire() == bigdata
+        assert len(_ranges()) == 4
+
+        # Interrupted transfers resume where they stopped
+        server.seen = []
+        monkeypatch.setattr(urlfetcher._HTTPURLFetcher, "_segments", 1)
+        server.drop_next = True
+        assert _acquire() == bigdata
+        assert _ranges() == ["bytes=%d-%d" %
+                (len(bigdata) // 2, len(bigdata) - 1)]
+
+        # Rough benchmark against a throttled server
+        server.delay = .01
+        timings = {}
+        for segments in [1, 4]:
+            monkeypatch.setattr(urlfetcher._HTTPURLFetcher,
+                    "_segments", segments)
+            start = time.time()
+            assert _acquire() == bigdata
+            timings[segments] = time.time() - start
+        virtinst.log.debug("HTTP download timings by segment count: %s",
+                timings)
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_http_fetcher_cache(monkeypatch):
+    """
+    Test the persistent url cache: repeated fetches are served from it
+    after a conditional GET, changed files are fetched again, and old
+    entries are evicted
+    """
+    from virtinst.install import urlcache
+    from virtinst.install import urlfetcher
+
+    kernel = os.urandom(1024 * 1024)
+    server, url = _start_http_server(monkeypatch, {
+        "/tree/.treeinfo": b"[general]\nfamily = Fake\n",
+        "/tree/vmlinuz": kernel})
+    scratchdir = tempfile.TemporaryDirectory()
+    cachedir = tempfile.TemporaryDirectory()
+    meter = virtinst.progress.make_meter(quiet=True)
+
+    def _acquire(filename):
+        fetcher = urlfetcher.fetcherForURI(url, scratchdir.name, meter,
+                cachedir=cachedir.name)
+        fn = fetcher.acquireFile(filename)
+        try:
+            return open(fn, "rb").read()
+        finally:
+            os.unlink(fn)
+
+    def _requested():
+        return [s[1] for s in server.seen]
+
+    try:
+        assert _acquire("vmlinuz") == kernel
+        # Served from the cache after a conditional request
+        server.seen = []
+        assert _acquire("vmlinuz") == kernel
+        assert _requested() == ["/tree/vmlinuz"]
+        fetcher = urlfetcher.fetcherForURI(url, scratchdir.name, meter,
+                cachedir=cachedir.name)
+        assert fetcher.prefetchFileContents([".treeinfo"]) == {
+                ".treeinfo": "[general]\nfamily = Fake\n"}
+        assert fetcher.acquireFileContent(".treeinfo") == (
+                "[general]\nfamily = Fake\n")
+
+        # Changed content invalidates the cached copy
+        kernel = os.urandom(1024 * 1024)
+        server.files["/tree/vmlinuz"] = kernel
+        assert _acquire("vmlinuz") == kernel
+        cache = urlcache.URLCache(cachedir.name)
+        with cache.lookup(url + "/vmlinuz").open() as f:
+            assert f.read() == kernel
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    # Least recently used entries are evicted past max_size
+    cachedir = tempfile.TemporaryDirectory()
+    cache = urlcache.URLCache(cachedir.name, max_size=1024 * 1024 + 50)
+    headers = {"etag": '"foo"'}
+    cache.store("http://example.com/a", headers, data=b"a" * 1024 * 1024)
+    with cache.lookup("http://example.com/a").open() as f:
+        os.utime(f.name, (1, 1))
+    cache.store("http://example.com/b", headers, data=b"b" * 100)
+    assert not cache.lookup("http://example.com/a")
+    assert cache.lookup("http://example.com/b").get_validators() == {
+            "If-None-Match": '"foo"'}
+    # Responses without validators aren't cached
+    cache.store("http://example.com/c", {}, data=b"c")
+    assert not cache.lookup("http://example.com/c")
+
+
+def test_iso9660_reader():
+    # pylint: disable=protected-access
+    from virtinst.install import urlfetcher
+
+    isopath = tests.utils.DATADIR + "/fakemedia/fake-fedora17-tree.iso"
+    reader = urlfetcher._ISO9660Reader(isopath)
+    try:
+        assert reader.hasFile("/.treeinfo")
+        assert reader.hasFile("/images/pxeboot")
+        assert reader.hasFile("/images/pxeboot/vmlinuz")
+        assert not reader.hasFile("/idontexist")
+        content = reader.grabFile("/.treeinfo", None)
+        assert content.startswith(b"[general]")
+    finally:
+        reader.close()
+
+    # Anything that isn't ISO9660 should be rejected, so the caller
+    # can fall back to xorriso
+    with pytest.raises(urlfetcher._ISOReaderError):
+        urlfetcher._ISO9660Reader(__file__)
+
+
+def _make_plain_iso(path, files):
+    """
+    Write a minimal ISO9660 image with no Rock Ridge or Joliet data.
+
+    :param files: list of (raw directory record name, content), all
+        placed in an IMAGES directory under the root
+    """
+    sector = 2048
+
+    def _record(lba, size, flags, name):
+        reclen = 33 + len(name) + (1 - len(name) % 2)
+        rec = bytearray(reclen)
+        rec[0] = reclen
+        struct.pack_into("<I", rec, 2, lba)
+        struct.pack_into(">I", rec, 6, lba)
+        struct.pack_into("<I", rec, 10, size)
+        struct.pack_into(">I", rec, 14, size)
+        rec[25] = flags
+        rec[32] = len(name)
+        rec[33:33 + len(name)] = name
+        return bytes(rec)
+
+    def _sector(data):
+        return data.ljust(sector, b"\0")
+
+    rootlba, imageslba, filelba = 18, 19, 20
+    root = (_record(rootlba, sector, 2, b"\x00") +
+            _record(rootlba, sector, 2, b"\x01") +
+            _record(imageslba, sector, 2, b"IMAGES"))
+    images = (_record(imageslba, sector, 2, b"\x00") +
+              _record(rootlba, sector, 2, b"\x01"))
+    for idx, (name, content) in enumerate(files):
+        images += _record(filelba + idx, len(content), 0, name)
+
+    pvd = bytearray(sector)
+    pvd[0:7] = b"\x01CD001\x01"
+    struct.pack_into("<H", pvd, 128, sector)
+    pvd[156:190] = _record(rootlba, sector, 2, b"\x00")
+    terminator = b"\xffCD001\x01"
+
+    with open(path, "wb") as f:
+        f.write(bytes(16 * sector))
+        f.write(bytes(pvd))
+        f.write(_sector(terminator))
+        f.write(_sector(root))
+        f.write(_sector(images))
+        for name, content in files:
+            f.write(_sector(content))
+
+
+def test_iso9660_reader_plain_names(tmp_path):
+    """
+    Plain ISO9660 names keep their on disk case like xorriso shows
+    them, with the version and the dot before a missing extension
+    dropped
+    """
+    # pylint: disable=protected-access
+    from virtinst.install import urlfetcher
+
+    isopath = str(tmp_path / "plain.iso")
+    _make_plain_iso(isopath, [(b"VMLINUZ.;1", b"kernel"),
+                              (b"INITRD.IMG;1", b"initrd")])
+    reader = urlfetcher._ISO9660Reader(isopath)
+    try:
+        assert reader.hasFile("/IMAGES")
+        assert reader.hasFile("/IMAGES/VMLINUZ")
+        assert reader.hasFile("/IMAGES/INITRD.IMG")
+        assert not reader.hasFile("/images/vmlinuz")
+        assert reader.grabFile("/IMAGES/VMLINUZ", None) == b"kernel"
+        assert reader.grabFile("/IMAGES/INITRD.IMG", None) == b"initrd"
+    finally:
+        reader.close()
+
+
+def test_iso9660_reader_matches_xorriso():
+    """
+    The native reader must see the same paths xorriso does, since
+    either one may end up serving an image
+    """
+    # pylint: disable=protected-access
+    if not shutil.which("xorriso"):
+        pytest.skip("xorriso not installed")
+    from virtinst.install import urlfetcher
+
+    isos = sorted(glob.glob(tests.utils.DATADIR + "/fakemedia/*.iso"))
+    assert isos
+    for isopath in isos:
+        xorriso = urlfetcher._XorrisoReader(isopath)
+        xorriso_paths = set()
+        for line in xorriso._cache_file_list:
+            # Lines look like '.' or './images/pxeboot'
+            path = line.strip("'")[1:]
+            if path:
+                xorriso_paths.add(path)
+
+        reader = urlfetcher._ISO9660Reader(isopath)
+        try:
+            native_paths = set(reader._files) | reader._dirs
+            native_paths.discard("/")
+            assert native_paths == xorriso_paths, isopath
+            for path in sorted(reader._files)[:5]:
+                assert (reader.grabFile(path, None) ==
+                        xorriso.grabFile(path, None)), path
+        finally:
+            reader.close()
@@ -3,6 +3,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import glob
+
 import pytest
 
 import virtinst
@@ -1074,6 +1076,85 @@ def testReplaceChildParse():
     utils.diff_compare(guest.get_xml(), parsefile)
 
 
+def testGetXMLCache():
+    """
+    Ensure repeated get_xml calls reuse the generated XML, and that
+    any change to the object or its children invalidates it
+    """
+    conn = utils.URIs.open_testdefault_cached()
+    for infile in sorted(glob.glob(DATADIR + "*-in.xml")):
+        xml = open(infile).read()
+        if not xml.startswith("<domain "):
+            continue
+        guest = virtinst.Guest(conn, parsexml=xml)
+        origxml = guest.get_xml()
+        assert guest.get_xml() is origxml
+        assert virtinst.Guest(conn, parsexml=origxml).get_xml() == origxml
+
+        guest.name = "cache-test"
+        assert "<name>cache-test</name>" in guest.get_xml()
+        for disk in guest.devices.disk:
+            guest.remove_device(disk)
+        assert "<disk" not in guest.get_xml()
+
+    guest = virtinst.Guest(conn)
+    guest.name = "foo"
+    origxml = guest.get_xml()
+    assert guest.get_xml() is origxml
+
+    disk = virtinst.DeviceDisk(conn)
+    disk.target = "vdb"
+    assert "vdb" in disk.get_xml()
+    guest.add_device(disk)
+    assert "vdb" in guest.get_xml()
+    disk.target = "vdc"
+    assert "vdc" in disk.get_xml()
+    assert "vdc" in guest.get_xml()
+
+    guest.add_xml_manual_action(
+            virtinst.xmlbuilder.XMLManualAction("./@id", "5"))
+    assert "id=\"5\"" in guest.get_xml()
+
+    guest.remove_device(disk)
+    assert "vdc" not in guest.get_xml()
+    assert "vdc" in disk.get_xml()
+
+
+def testXPathCache():
+    """
+    Round trip every domain XML in tests/data, and make sure the parsed
+    xpath cache is both used and bounded
+    """
+    from virtinst import xmlapi
+    conn = utils.URIs.open_testdefault_cached()
+    # Other tests share the module level cache, so start from scratch
+    # to make the counts below mean something
+    xmlapi._parse_xpath.cache_clear()
+
+    for path in sorted(glob.glob(utils.DATADIR + "/**/*.xml",
+                                 recursive=True)):
+        xml = open(path).read()
+        # Some cli compare outputs are several domain documents in a row
+        if not xml.startswith("<domain ") or "\n<domain " in xml:
+            continue
+        guest = virtinst.Guest(conn, parsexml=xml)
+        for dev in guest.devices.get_all():
+            assert dev.get_xml()
+        guest.get_xml()
+
+    info = xmlapi._parse_xpath.cache_info()
+    assert info.misses
+    assert info.hits > info.misses
+    assert info.currsize <= xmlapi._XPATH_CACHE_SIZE
+
+    # Stub creation when some, but not all, ancestors already exist
+    api = xmlapi.XMLAPI("<domain>\n  <foo/>\n</domain>")
+    api.set_xpath_content("./foo/bar[@baz='wib']/frob/@val", "1")
+    assert api.get_xpath_content(
+        "./foo/bar[@baz='wib']/frob/@val", False) == "1"
+    assert api.get_xml(".").count("<foo") == 1
+
+
 def testGuestXMLDeviceMatch():
     """
     Test Guest.find_device and Device.compare_device
@@ -467,6 +467,61 @@ def testAddHosts(app):
     _finish(addhw, check=details)
 
 
+def _count_host_devices(tab, name):
+    cells = tab.findChildren(
+            lambda w: w.roleName == "table cell" and name in w.name,
+            isLambda=True)
+    return len(cells)
+
+
+def testAddHostdevLazyNodedevs(app):
+    """
+    Host device lists work before the connection has done its full
+    nodedev listing, and the full listing adopts the devices that
+    were looked up before it ran
+    """
+    details = _open_app(app, "test-clone-simple")
+    addhw = _open_addhw(app, details)
+
+    # Typed listing plus a parent lookup by name, before the full listing
+    tab = _select_hw(addhw, "MDEV Host Device", "host-tab")
+    tab.find_fuzzy("css_0_0_0023 mdev_8e37ee90", "table cell")
+    tab = _select_hw(addhw, "PCI Host Device", "host-tab")
+    tab.find_fuzzy("(Interface eth0)", "table cell")
+
+    # Give the tick thread time for the full listing, which must not
+    # duplicate any devices
+    app.sleep(1)
+    _select_hw(addhw, "USB Host Device", "host-tab")
+    tab = _select_hw(addhw, "PCI Host Device", "host-tab")
+    lib.utils.check(
+            lambda: _count_host_devices(tab, "(Interface eth0)") == 1)
+    tab = _select_hw(addhw, "MDEV Host Device", "host-tab")
+    lib.utils.check(
+            lambda: _count_host_devices(tab, "mdev_8e37ee90") == 1)
+
+
+def testAddHostdevNodedevEventsBeforeLoad(app):
+    """
+    Nodedev events that arrive before anything asked for nodedevs are
+    dropped, the full listing picks the device up instead
+    """
+    details = _open_app(app, "test-clone-simple",
+            extra_opts=["--test-options=fake-nodedev-event=pci_8086_1049",
+                        "--test-options=short-poll"])
+    app.sleep(1.2)  # lifecycle and update events fire before any load
+    addhw = _open_addhw(app, details)
+    tab = _select_hw(addhw, "PCI Host Device", "host-tab")
+    lib.utils.check(
+            lambda: _count_host_devices(tab, "(Interface eth0)") == 1)
+
+    app.sleep(1)
+    _select_hw(addhw, "USB Host Device", "host-tab")
+    tab = _select_hw(addhw, "PCI Host Device", "host-tab")
+    lib.utils.check(
+            lambda: _count_host_devices(tab, "(Interface eth0)") == 1)
+
+
 def testAddChars(app):
     """
     Add a bunch of char devices
@@ -1,6 +1,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import tempfile
+
 import tests.utils
 from . import lib
 
@@ -309,3 +311,33 @@ def testManagerConnOpenFail(app):
     lib.utils.check(lambda: not manager.active)
     app.click_alert_button("Unable to connect", "Close")
     lib.utils.check(lambda: manager.active)
+
+
+def testManagerManyVMs(app):
+    """
+    Benchmark style check that the VM list stays responsive with many
+    VMs, when every row is updated on every stats poll
+    """
+    count = 500
+    domxml = ("<domain type='test'><name>many-vms-%d</name>"
+              "<memory>65536</memory><os><type>hvm</type></os></domain>")
+    emptyxml = open(tests.utils.DATADIR + "/testdriver/empty.xml").read()
+    nodexml = emptyxml.replace("</node>",
+            "".join(domxml % i for i in range(count)) + "</node>")
+
+    tmpxml = tempfile.NamedTemporaryFile(
+            prefix="virt-manager-uitests-many-vms", suffix=".xml")
+    open(tmpxml.name, "w").write(nodexml)
+    uri = "__virtinst_test__test://%s,predictable" % tmpxml.name
+
+    app.open(uri=uri, extra_opts=["--test-options=short-poll"])
+    manager = app.topwin
+    cell = manager.find("many-vms-%d" % (count - 1), "table cell")
+
+    # Let a number of polls update all the rows, then make sure the UI
+    # still reacts promptly
+    app.sleep(3)
+    cell.click()
+    shutdown = manager.find("Shut Down", "push button")
+    lib.utils.check(lambda: shutdown.sensitive, timeout=5)
+    assert "Running" in cell.text
@@ -1,6 +1,9 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import os
+import tempfile
+
 import tests.utils
 from . import lib
 
@@ -90,6 +93,51 @@ def testMigrateMock(app):
     lib.utils.check(lambda: not mig.showing)
 
 
+def testMigrateBatch(app):
+    """
+    Migrate every running VM at once, with the mock migration
+    """
+    domxml = ("<domain type='test'><name>batch-vm-%d</name>"
+              "<memory>65536</memory><os><type>hvm</type></os></domain>")
+    emptyxml = open(tests.utils.DATADIR + "/testdriver/empty.xml").read()
+    nodexml = emptyxml.replace("</node>",
+            "".join(domxml % i for i in range(6)) + "</node>")
+    tmpxml = tempfile.NamedTemporaryFile(
+            prefix="virt-manager-uitests-batch-migrate", suffix=".xml")
+    open(tmpxml.name, "w").write(nodexml)
+    app.uri = "__virtinst_test__test://%s,predictable" % tmpxml.name
+
+    app.manager_createconn(tests.utils.URIs.test_empty)
+
+    mig = _open_migrate(app, "batch-vm-0")
+    mig.find("address-text").set_text("TESTSUITE-FAKE")
+    mig.find("Advanced", "toggle button").click_expander()
+    mig.find("Bandwidth", "spin button").set_text("100")
+    mig.find("Compress", "check box").click()
+    mig.find("Parallel connections", "spin button").set_text("4")
+    maxparallel = mig.find("Simultaneous migrations", "spin button")
+    lib.utils.check(lambda: not maxparallel.sensitive)
+    mig.find("Migrate all running VMs", "check box").click()
+    lib.utils.check(lambda: maxparallel.sensitive)
+    # The port can't be shared by simultaneous migrations
+    portcheck = mig.find("port-check")
+    lib.utils.check(lambda: not portcheck.sensitive)
+    lib.utils.check(lambda: not portcheck.checked)
+    mig.find("batch-vm-0 and 5 other running VMs")
+    maxparallel.set_text("3")
+
+    mig.find("Migrate", "push button").click()
+    app.find_window("Migrating 6 VMs")
+    lib.utils.check(lambda: not mig.showing, timeout=15)
+
+    # Disconnect the source, so every VM still listed is one that
+    # landed on the destination
+    app.manager_conn_disconnect(
+            "test %s" % os.path.basename(tmpxml.name))
+    for idx in range(6):
+        app.topwin.find("^batch-vm-%d$" % idx, "table cell")
+
+
 def testMigrateConnMismatch(app):
     # Add a possible target but disconnect it
     app.uri = tests.utils.URIs.test_default
@@ -783,10 +783,10 @@ class vmmAddHardware(vmmGObjectUI):
                         prettyname += " (%s)" % subdev.pretty_name()
 
             if devtype == "mdev":
-                for parentdev in self.conn.list_nodedevs():
-                    if dev.xmlobj.parent == parentdev.xmlobj.name:
-                        prettyname = "%s %s" % (
-                                parentdev.pretty_name(), prettyname)
+                parentdev = self.conn.get_nodedev_by_name(dev.xmlobj.parent)
+                if parentdev:
+                    prettyname = "%s %s" % (
+                            parentdev.pretty_name(), prettyname)
 
             model.append([dev.xmlobj, prettyname])
 
@@ -21,6 +21,38 @@ from virtinst import xmlutil
 from . import config
 
 
+class _IdleEmitBatcher(object):
+    """
+    Collects idle_emit_batched() calls from any thread, and emits them
+    all from a single main loop callback, instead of one idle callback
+    per signal
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+
+    def add(self, obj, signal, args):
+        with self._lock:
+            schedule = not self._pending
+            # Queueing the same signal for an object again before
+            # dispatch only updates its args
+            self._pending[(obj, signal)] = args
+        if schedule:
+            GLib.idle_add(self._dispatch)
+
+    def _dispatch(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = {}
+
+        for (obj, signal), args in pending.items():
+            obj.emit(signal, *args)
+        return False
+
+
+_idle_emit_batcher = _IdleEmitBatcher()
+
+
 class vmmGObject(GObject.GObject):
     # Objects can set this to false to disable leak tracking
     _leak_check = True
@@ -273,6 +305,15 @@ class vmmGObject(GObject.GObject):
 
         self.idle_add(emitwrap, signal, *args)
 
+    def idle_emit_batched(self, signal, *args):
+        """
+        Like idle_emit, but coalesced: every batched emission queued
+        before the main loop gets to run is dispatched, in order, from
+        a single idle callback. Used for signals that fire for every
+        object on every tick.
+        """
+        _idle_emit_batcher.add(self, signal, args)
+
 
 class vmmGObjectUI(vmmGObject):
     def __init__(self, filename, windowname, builder=None, topwin=None):
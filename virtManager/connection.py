@@ -4,6 +4,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import heapq
 import os
 import threading
 import time
@@ -14,6 +15,7 @@ import libvirt
 import virtinst
 from virtinst import log
 from virtinst import pollhelpers
+from virtinst.progress import JobPoller
 
 from .lib import connectauth
 from .lib import testmock
@@ -23,9 +25,28 @@ from .object.domain import vmmDomain
 from .object.network import vmmNetwork
 from .object.nodedev import vmmNodeDevice
 from .object.storagepool import vmmStoragePool
+from .lib.statsmanager import StatsRingBuffer
 from .lib.statsmanager import vmmStatsManager
 
 
+# Mapping of virtinst NodeDevice.device_type to the matching
+# VIR_CONNECT_LIST_NODE_DEVICES_CAP_* flag suffix
+_NODEDEV_CAP_FLAGS = {
+    "system": "SYSTEM",
+    "pci": "PCI_DEV",
+    "usb_device": "USB_DEV",
+    "usb": "USB_INTERFACE",
+    "net": "NET",
+    "scsi_host": "SCSI_HOST",
+    "scsi_target": "SCSI_TARGET",
+    "scsi": "SCSI",
+    "storage": "STORAGE",
+    "drm": "DRM",
+    "mdev": "MDEV",
+    "ccw": "CCW_DEV",
+}
+
+
 class _ObjectList(vmmGObject):
     """
     Class that wraps our internal list of libvirt objects
@@ -37,12 +58,14 @@ class _ObjectList(vmmGObject):
     def __init__(self):
         vmmGObject.__init__(self)
 
-        self._objects = []
+        # Mapping of object class -> {name: object}, so lookups and
+        # duplicate checks don't need to scan every object
+        self._objects = {}
         self._denylist = {}
         self._lock = threading.Lock()
 
     def _cleanup(self):
-        self._objects = []
+        self._objects = {}
 
     def _denylist_key(self, obj):
         return str(obj.__class__) + obj.get_name()
@@ -89,10 +112,11 @@ class _ObjectList(vmmGObject):
         with self._lock:
             # Identity check is sufficient here, since we should never be
             # asked to remove an object that wasn't at one point in the list.
-            if obj not in self._objects:
+            classobjs = self._objects.get(obj.__class__, {})
+            if classobjs.get(obj.get_name()) is not obj:
                 return self.remove_denylist(obj)
 
-            self._objects.remove(obj)
+            classobjs.pop(obj.get_name())
             return True
 
     def add(self, obj):
@@ -108,34 +132,47 @@ class _ObjectList(vmmGObject):
             #
             # We don't use lookup_object here since we need to hold the
             # lock the whole time to prevent a 'time of check' issue
-            for checkobj in self._objects:
-                if (checkobj.__class__ == obj.__class__ and
-                    checkobj.get_name() == obj.get_name()):
-                    return False
+            classobjs = self._objects.setdefault(obj.__class__, {})
+            if obj.get_name() in classobjs:
+                return False
 
-            self._objects.append(obj)
+            classobjs[obj.get_name()] = obj
             return True
 
+    def rename(self, obj):
+        """
+        Re-key an object after its name changed.
+
+        :param obj: vmmLibvirtObject that was renamed
+        """
+        with self._lock:
+            classobjs = self._objects.get(obj.__class__, {})
+            for name, checkobj in list(classobjs.items()):
+                if checkobj is obj:
+                    classobjs.pop(name)
+                    classobjs[obj.get_name()] = obj
+                    return
+
     def get_objects_for_class(self, classobj):
         """
         Return all objects over the passed vmmLibvirtObject class
         """
         with self._lock:
-            return [o for o in self._objects if o.__class__ is classobj]
+            return list(self._objects.get(classobj, {}).values())
 
     def lookup_object(self, classobj, name):
         """
         Lookup an object with the passed classobj + name
         """
-        # Doesn't require locking, since get_objects_for_class covers us
-        for obj in self.get_objects_for_class(classobj):
-            if obj.get_name() == name:
-                return obj
-        return None
+        with self._lock:
+            return self._objects.get(classobj, {}).get(name)
 
     def all_objects(self):
         with self._lock:
-            return self._objects[:]
+            ret = []
+            for classobjs in self._objects.values():
+                ret.extend(classobjs.values())
+            return ret
 
 
 class vmmConnection(vmmGObject):
@@ -149,6 +186,7 @@ class vmmConnection(vmmGObject):
         "nodedev-added": (vmmGObject.RUN_FIRST, None, [object]),
         "nodedev-removed": (vmmGObject.RUN_FIRST, None, [object]),
         "resources-sampled": (vmmGObject.RUN_FIRST, None, []),
+        "vms-sampled": (vmmGObject.RUN_FIRST, None, [object]),
         "state-changed": (vmmGObject.RUN_FIRST, None, []),
         "open-completed": (vmmGObject.RUN_FIRST, None, [object]),
     }
@@ -157,6 +195,11 @@ class vmmConnection(vmmGObject):
      _STATE_CONNECTING,
      _STATE_ACTIVE) = range(1, 4)
 
+    _STATS_FIELDS = ["timestamp", "memory", "memoryPercent",
+                     "cpuTime", "cpuHostPercent",
+                     "diskRdRate", "diskWrRate", "netRxRate", "netTxRate",
+                     "diskMaxRate", "netMaxRate"]
+
     def __init__(self, uri):
         self._uri = uri
         vmmGObject.__init__(self)
@@ -169,8 +212,17 @@ class vmmConnection(vmmGObject):
         self.connect_error = None
 
         self._init_object_count = None
+        self._init_object_total = None
         self._init_object_event = None
 
+        # Queue of (priority, seq, obj) for new objects waiting on their
+        # initial XML fetch, drained by up to get_init_concurrency()
+        # worker threads
+        self._init_queue = []
+        self._init_queue_seq = 0
+        self._init_workers = 0
+        self._init_lock = threading.Lock()
+
         self.using_domain_events = False
         self._domain_cb_ids = []
         self.using_network_events = False
@@ -183,9 +235,23 @@ class vmmConnection(vmmGObject):
         self._xml_flags = {}
 
         self._objects = _ObjectList()
+
+        # Object names we received events for, keyed by tick() poll
+        # parameter. Consumed by the next tick, which reconciles just
+        # these names instead of listing every object
+        self._poll_deltas = {"pollvm": set(), "pollnet": set(),
+                             "pollpool": set(), "pollnodedev": set()}
+        self._poll_deltas_lock = threading.Lock()
+
+        # Node devices are only enumerated the first time something asks
+        # for them, see _request_nodedev_load
+        self._nodedevs_load_requested = False
+        self._nodedevs_loaded = False
+
         self.statsmanager = vmmStatsManager()
 
-        self._stats = []
+        self._stats = StatsRingBuffer(self._STATS_FIELDS,
+                self.config.get_stats_history_length() + 1)
         self._hostinfo = None
 
         self.add_gsettings_handle(
@@ -263,9 +329,6 @@ class vmmConnection(vmmGObject):
         self._backend.cb_fetch_all_pools = (
             lambda: [obj.get_xmlobj(refresh_if_nec=False)
                      for obj in self.list_pools()])
-        self._backend.cb_fetch_all_nodedevs = (
-            lambda: [obj.get_xmlobj(refresh_if_nec=False)
-                     for obj in self.list_nodedevs()])
 
         def fetch_all_vols():
             ret = []
@@ -518,8 +581,18 @@ class vmmConnection(vmmGObject):
         return self._objects.get_objects_for_class(vmmStoragePool)
 
     def get_nodedev_by_name(self, name):
-        return self._objects.lookup_object(vmmNodeDevice, name)
+        obj = self._objects.lookup_object(vmmNodeDevice, name)
+        if not obj and not self._nodedevs_loaded:
+            obj = self._lookup_nodedev_backend(name)
+        self._request_nodedev_load()
+        return obj
     def list_nodedevs(self):
+        """
+        Return the node devices we track. Until the first full listing
+        has finished in the tick thread this may be incomplete, callers
+        that need every device should use the nodedev-added signal.
+        """
+        self._request_nodedev_load()
         return self._objects.get_objects_for_class(vmmNodeDevice)
 
 
@@ -527,9 +600,99 @@ class vmmConnection(vmmGObject):
     # nodedev helper functions #
     ############################
 
+    def _request_nodedev_load(self):
+        """
+        Schedule the first full nodedev listing. Hosts can have
+        thousands of them (SR-IOV VFs, USB and SCSI devices) but they
+        are only needed by a few dialogs, so we don't pay for them at
+        connection open time. The listing runs in the tick thread, and
+        new devices are reported with the nodedev-added signal like
+        any other polled object.
+        """
+        if self._nodedevs_load_requested or not self.is_active():
+            return
+        if not self.support.conn_nodedev():
+            return  # pragma: no cover
+
+        log.debug("Scheduling nodedev load for %s", self.get_uri())
+        self._nodedevs_load_requested = True
+        self.schedule_priority_tick(pollnodedev=True, force=True)
+
+    def _nodedevs_load_finished(self):
+        self._nodedevs_loaded = True
+        self._backend.cb_fetch_all_nodedevs = (
+            lambda: [obj.get_xmlobj(refresh_if_nec=False)
+                     for obj in self.list_nodedevs()])
+
+    def _track_nodedevs(self, newobjs):
+        """
+        Start tracking nodedevs that a caller needs before the full
+        listing has finished. They are initialized right away, so they
+        behave like polled objects, and the full listing reconciles
+        them once it runs.
+        """
+        ret = []
+        for obj in newobjs:
+            obj.init_libvirt_state()
+            if not self._objects.add(obj):
+                obj.cleanup()
+                obj = self._objects.lookup_object(vmmNodeDevice,
+                                                  obj.get_name())
+                if not obj:
+                    continue  # pragma: no cover
+            else:
+                self.idle_emit("nodedev-added", obj)
+            ret.append(obj)
+        return ret
+
+    def _lookup_nodedev_backend(self, name):
+        if not self.is_active() or not self.support.conn_nodedev():
+            return None  # pragma: no cover
+        try:
+            backend = self._backend.nodeDeviceLookupByName(name)
+        except libvirt.libvirtError:
+            return None
+        objs = self._track_nodedevs([vmmNodeDevice(self, backend, name)])
+        return objs and objs[0] or None
+
+    def _list_nodedevs_by_cap(self, devtype):
+        """
+        If nodedevs aren't loaded yet, use listAllDevices capability
+        filtering to only build objects for devtype. Returns None if
+        we can't filter by devtype, and a full listing is required.
+        """
+        if self._nodedevs_loaded or not devtype or not self.is_active():
+            return None
+
+        capname = _NODEDEV_CAP_FLAGS.get(devtype)
+        flag = capname and getattr(libvirt,
+                "VIR_CONNECT_LIST_NODE_DEVICES_CAP_%s" % capname, None)
+        if not flag:
+            return None
+
+        keymap = dict((o.get_name(), o) for o in
+                      self._objects.get_objects_for_class(vmmNodeDevice))
+        def cb(obj, name):
+            return vmmNodeDevice(self, obj, name)
+        try:
+            dummy, new, master = pollhelpers.fetch_nodedevs(
+                    self._backend, keymap, cb, flags=flag)
+        except Exception as e:  # pragma: no cover
+            log.debug("Error listing nodedevs with cap=%s: %s", devtype, e)
+            return None
+
+        newids = set(id(o) for o in new)
+        return (self._track_nodedevs(new) +
+                [o for o in master if id(o) not in newids])
+
     def filter_nodedevs(self, devtype):
+        devs = self._list_nodedevs_by_cap(devtype)
+        self._request_nodedev_load()
+        if devs is None:
+            devs = self.list_nodedevs()
+
         retdevs = []
-        for dev in self.list_nodedevs():
+        for dev in devs:
             try:
                 xmlobj = dev.get_xmlobj()
             except libvirt.libvirtError as e:  # pragma: no cover
@@ -600,6 +763,12 @@ class vmmConnection(vmmGObject):
                 # Reinsert handle into new obj
                 obj.change_name_backend(newobj)
 
+    def object_renamed(self, obj):
+        """
+        Called after obj.get_name() changed, to update our lookup index
+        """
+        self._objects.rename(obj)
+
 
     #########################
     # Domain event handling #
@@ -623,6 +792,20 @@ class vmmConnection(vmmGObject):
         if obj:
             self.idle_add(obj.recache_from_event_loop)
 
+    def _domain_job_event(self, conn, domain, *args):
+        # Migration iteration and job completion events. Wake up the
+        # progress reporting for any job running on the domain
+        ignore = conn
+        args = list(args)
+        eventstr = args.pop(-1)
+
+        log.debug("domain job event: domain=%s event=%s",
+                domain.name(), eventstr)
+        # Jobs are looked up by UUID rather than through our vmmDomain,
+        # as migrate runs on a separate vmmDomain instance
+        poller = JobPoller.get_instance(self._backend)
+        poller.poke_key(domain.UUIDString())
+
     def _domain_lifecycle_event(self, conn, domain, state, reason, userdata):
         ignore = conn
         ignore = userdata
@@ -634,9 +817,9 @@ class vmmConnection(vmmGObject):
         obj = self.get_vm_by_name(name)
 
         if obj:
-            self.idle_add(obj.recache_from_event_loop)
+            self.idle_add(obj.recache_from_event_loop, force_signal=True)
         else:
-            self.schedule_priority_tick(pollvm=True, force=True)
+            self.schedule_delta_poll("pollvm", name)
 
     def _domain_agent_lifecycle_event(self, conn, domain, state, reason, userdata):
         ignore = conn
@@ -649,9 +832,9 @@ class vmmConnection(vmmGObject):
         obj = self.get_vm_by_name(name)
 
         if obj:
-            self.idle_add(obj.recache_from_event_loop)
+            self.idle_add(obj.recache_from_event_loop, force_signal=True)
         else:
-            self.schedule_priority_tick(pollvm=True, force=True)  # pragma: no cover
+            self.schedule_delta_poll("pollvm", name)  # pragma: no cover
 
     def _network_lifecycle_event(self, conn, network, state, reason, userdata):
         ignore = conn
@@ -663,9 +846,9 @@ class vmmConnection(vmmGObject):
         obj = self.get_net_by_name(name)
 
         if obj:
-            self.idle_add(obj.recache_from_event_loop)
+            self.idle_add(obj.recache_from_event_loop, force_signal=True)
         else:
-            self.schedule_priority_tick(pollnet=True, force=True)
+            self.schedule_delta_poll("pollnet", name)
 
     def _storage_pool_lifecycle_event(self, conn, pool,
                                       state, reason, userdata):
@@ -679,9 +862,9 @@ class vmmConnection(vmmGObject):
         obj = self.get_pool_by_name(name)
 
         if obj:
-            self.idle_add(obj.recache_from_event_loop)
+            self.idle_add(obj.recache_from_event_loop, force_signal=True)
         else:
-            self.schedule_priority_tick(pollpool=True, force=True)
+            self.schedule_delta_poll("pollpool", name)
 
     def _storage_pool_refresh_event(self, conn, pool, userdata):
         ignore = conn
@@ -706,7 +889,10 @@ class vmmConnection(vmmGObject):
         log.debug("node device lifecycle event: nodedev=%s %s",
             name, LibvirtEnumMap.nodedev_lifecycle_str(state, reason))
 
-        self.schedule_priority_tick(pollnodedev=True, force=True)
+        if not self._nodedevs_load_requested:
+            # Will be picked up when nodedevs are first loaded
+            return
+        self.schedule_delta_poll("pollnodedev", name)
 
     def _node_device_update_event(self, conn, dev, userdata):
         ignore = conn
@@ -715,7 +901,7 @@ class vmmConnection(vmmGObject):
         name = dev.name()
         log.debug("node device update event: nodedev=%s", name)
 
-        obj = self.get_nodedev_by_name(name)
+        obj = self._objects.lookup_object(vmmNodeDevice, name)
 
         if obj:
             self.idle_add(obj.recache_from_event_loop)
@@ -765,6 +951,10 @@ class vmmConnection(vmmGObject):
         _add_domain_xml_event("VIR_DOMAIN_EVENT_ID_DEVICE_ADDED", 19)
         _add_domain_xml_event("VIR_DOMAIN_EVENT_ID_AGENT_LIFECYCLE", 18,
                               self._domain_agent_lifecycle_event)
+        _add_domain_xml_event("VIR_DOMAIN_EVENT_ID_MIGRATION_ITERATION", 20,
+                              self._domain_job_event)
+        _add_domain_xml_event("VIR_DOMAIN_EVENT_ID_JOB_COMPLETED", 21,
+                              self._domain_job_event)
 
         try:
             _check_events_disabled()
@@ -856,8 +1046,13 @@ class vmmConnection(vmmGObject):
             self._storage_pool_cb_ids = []
             self._node_device_cb_ids = []
 
-        self._stats = []
+        self._stats.clear()
+        with self._poll_deltas_lock:
+            for deltas in self._poll_deltas.values():
+                deltas.clear()
 
+        with self._init_lock:
+            self._init_queue = []
         if self._init_object_event:
             self._init_object_event.clear()  # pragma: no cover
 
@@ -870,6 +1065,9 @@ class vmmConnection(vmmGObject):
                 log.debug("Failed to cleanup %s: %s", obj, e)
         self._objects.cleanup()
         self._objects = _ObjectList()
+        self._nodedevs_load_requested = False
+        self._nodedevs_loaded = False
+        self._backend.cb_fetch_all_nodedevs = None
 
         closeret = self._backend.close()
         if closeret == 1:
@@ -979,6 +1177,7 @@ class vmmConnection(vmmGObject):
 
         self._init_object_event = threading.Event()
         self._init_object_count = 0
+        self._init_object_total = 0
 
         self.schedule_priority_tick(stats_update=True,
             pollvm=True, pollnet=True,
@@ -988,6 +1187,7 @@ class vmmConnection(vmmGObject):
         self._init_object_event.wait()
         self._init_object_event = None
         self._init_object_count = None
+        self._init_object_total = None
 
         # Try to create the default storage pool
         # We need this after events setup so we can determine if the default
@@ -1086,6 +1286,10 @@ class vmmConnection(vmmGObject):
         finally:
             if self._init_object_event:
                 self._init_object_count -= 1
+                done = self._init_object_total - self._init_object_count
+                if done % 100 == 0 and self._init_object_count > 0:
+                    log.debug("Initialized %d/%d objects for %s",
+                            done, self._init_object_total, self.get_uri())
                 if self._init_object_count <= 0:
                     self._init_object_event.set()
 
@@ -1104,36 +1308,60 @@ class vmmConnection(vmmGObject):
                 objs = self.list_nets()
                 cls = vmmNetwork
                 pollcb = pollhelpers.fetch_nets
+                poll_param = "pollnet"
+                using_events = self.using_network_events
             elif ptype == "pools":
                 dopoll = pollpool
                 objs = self.list_pools()
                 cls = vmmStoragePool
                 pollcb = pollhelpers.fetch_pools
+                poll_param = "pollpool"
+                using_events = self.using_storage_pool_events
             elif ptype == "nodedevs":
-                dopoll = pollnodedev
-                objs = self.list_nodedevs()
+                # Until something asks for nodedevs, don't poll them
+                dopoll = pollnodedev and self._nodedevs_load_requested
+                objs = self._objects.get_objects_for_class(vmmNodeDevice)
                 cls = vmmNodeDevice
                 pollcb = pollhelpers.fetch_nodedevs
+                poll_param = "pollnodedev"
+                using_events = self.using_node_device_events
             else:
                 dopoll = pollvm
                 objs = self.list_vms()
                 cls = vmmDomain
                 pollcb = pollhelpers.fetch_vms
-
+                poll_param = "pollvm"
+                using_events = self.using_domain_events
+
+            # With events we only need to reconcile the objects we were
+            # told about, not list every object on the connection
+            deltas = None
+            if using_events and not initial_poll:
+                deltas = self._pop_poll_deltas(poll_param)
+            if cls is vmmNodeDevice and not self._nodedevs_loaded:
+                # The first nodedev poll must be a full listing, it
+                # covers any deltas we were sent before it
+                deltas = None
 
             keymap = dict((o.get_name(), o) for o in objs)
             def cb(obj, name):
                 return cls(self, obj, name)
             if dopoll:
-                gone, new, master = pollcb(self._backend, keymap, cb)
+                gone, new, master = pollcb(self._backend, keymap, cb,
+                                           deltas=deltas)
+                if cls is vmmNodeDevice and not self._nodedevs_loaded:
+                    self._nodedevs_load_finished()
             else:
                 gone, new, master = [], [], list(keymap.values())
 
             if initial_poll:
                 self._init_object_count += len(new)
+                self._init_object_total += len(new)
 
             gone_objects.extend(gone)
-            preexisting_objects.extend([o for o in master if o not in new])
+            newids = set(id(o) for o in new)
+            preexisting_objects.extend(
+                    [o for o in master if id(o) not in newids])
             new = [n for n in new if not self._objects.in_denylist(n)]
             return new
 
@@ -1142,10 +1370,6 @@ class vmmConnection(vmmGObject):
         new_pools = _process_objects("pools")
         new_nodedevs = _process_objects("nodedevs")
 
-        # Kick off one thread per object type to handle the initial
-        # XML fetching. Going any more fine grained then this probably
-        # won't be that useful due to libvirt's locking structure.
-        #
         # Would prefer to start refreshing some objects before all polling
         # is complete, but we need init_object_count to be fully accurate
         # before we start initializing objects
@@ -1155,20 +1379,66 @@ class vmmConnection(vmmGObject):
             # is never called and the event is never set, so let's do it here
             self._init_object_event.set()
 
-        for newlist in [new_vms, new_nets, new_pools, new_nodedevs]:
-            if not newlist:
-                continue
+        self._queue_object_init(
+                new_vms + new_nets + new_pools + new_nodedevs)
+
+        return gone_objects, preexisting_objects
 
-            def cb(lst):
-                for obj in lst:
-                    obj.connect_once("initialized", self._new_object_cb)
-                    obj.init_libvirt_state()
+    def get_init_concurrency(self):
+        """
+        Max number of threads used to fetch initial XML for new objects
+        """
+        return max(1, self.config.get_perconn(self.get_uri(),
+                                              "/init-concurrency"))
 
-            self._start_thread(cb,
-                "refreshing xml for new %s" % newlist[0].class_name(),
-                args=(newlist,))
+    def _init_priority(self, obj):
+        # Running VMs are what the manager window shows first, so
+        # initialize them before inactive VMs and other objects.
+        # ID() is cached on the handle, so this doesn't hit the wire
+        if obj.is_domain():
+            try:
+                if obj.get_backend().ID() != -1:
+                    return 0
+            except Exception:  # pragma: no cover
+                pass
+            return 1
+        if obj.is_network() or obj.is_pool():
+            return 2
+        return 3
+
+    def _queue_object_init(self, objs):
+        """
+        Queue new objects for their initial XML fetch. Workers are
+        started on demand up to get_init_concurrency(), so a
+        connection with hundreds of VMs doesn't fetch XML one object
+        at a time over a high latency link.
+        """
+        if not objs:
+            return
 
-        return gone_objects, preexisting_objects
+        with self._init_lock:
+            for obj in objs:
+                self._init_queue_seq += 1
+                heapq.heappush(self._init_queue,
+                        (self._init_priority(obj), self._init_queue_seq, obj))
+
+            nworkers = min(self.get_init_concurrency(),
+                           self._init_workers + len(objs))
+            while self._init_workers < nworkers:
+                self._init_workers += 1
+                self._start_thread(self._init_object_worker,
+                        "init objects %s" % self.get_uri())
+
+    def _init_object_worker(self):
+        while True:
+            with self._init_lock:
+                if not self._init_queue:
+                    self._init_workers -= 1
+                    return
+                obj = heapq.heappop(self._init_queue)[2]
+
+            obj.connect_once("initialized", self._new_object_cb)
+            obj.init_libvirt_state()
 
     def _tick(self, stats_update=False,
              pollvm=False, pollnet=False,
@@ -1244,19 +1514,19 @@ class vmmConnection(vmmGObject):
                             "Ignoring.")
 
         if stats_update:
-            self._recalculate_stats(
-                [o for o in preexisting_objects if o.reports_stats()])
-            self.idle_emit("resources-sampled")
+            sampled = [o for o in preexisting_objects if o.reports_stats()]
+            self._recalculate_stats(sampled)
+            # Listeners get the set of VMs sampled this tick in one
+            # signal, dispatched along with all the per VM signals
+            self.idle_emit_batched("vms-sampled", set(sampled))
+            self.idle_emit_batched("resources-sampled")
 
     def _recalculate_stats(self, vms):
         if not self._backend.is_open():
             return  # pragma: no cover
 
         now = time.time()
-        expected = self.config.get_stats_history_length()
-        current = len(self._stats)
-        if current > expected:
-            del self._stats[expected:current]  # pragma: no cover
+        self._stats.resize(self.config.get_stats_history_length() + 1)
 
         mem = 0
         cpuTime = 0
@@ -1285,7 +1555,7 @@ class vmmConnection(vmmGObject):
         pcentMem = mem * 100.0 / self.host_memory_size()
 
         if len(self._stats) > 0:
-            prevTimestamp = self._stats[0]["timestamp"]
+            prevTimestamp = self._stats.get_record("timestamp")
             host_cpus = self.host_active_processor_count()
 
             pcentHostCpu = ((cpuTime) * 100.0 /
@@ -1309,13 +1579,31 @@ class vmmConnection(vmmGObject):
             "netMaxRate": netMaxRate,
         }
 
-        self._stats.insert(0, newStats)
+        self._stats.append(newStats)
 
 
     def schedule_priority_tick(self, **kwargs):
         from .engine import vmmEngine
         vmmEngine.get_instance().schedule_priority_tick(self, kwargs)
 
+    def schedule_delta_poll(self, poll_param, name):
+        """
+        Record that object name may have appeared or disappeared, and
+        schedule a priority tick to reconcile it.
+
+        :param poll_param: tick() poll parameter for the object type,
+            like 'pollvm'
+        """
+        with self._poll_deltas_lock:
+            self._poll_deltas[poll_param].add(name)
+        self.schedule_priority_tick(**{poll_param: True, "force": True})
+
+    def _pop_poll_deltas(self, poll_param):
+        with self._poll_deltas_lock:
+            ret = self._poll_deltas[poll_param]
+            self._poll_deltas[poll_param] = set()
+        return ret
+
     def tick_from_engine(self, *args, **kwargs):
         try:
             self._tick(*args, **kwargs)
@@ -1329,23 +1617,13 @@ class vmmConnection(vmmGObject):
     ########################
 
     def _get_record_helper(self, record_name):
-        if len(self._stats) == 0:
-            return 0
-        return self._stats[0][record_name]
+        return self._stats.get_record(record_name)
 
     def _vector_helper(self, record_name, limit, ceil=100.0):
-        vector = []
         statslen = self.config.get_stats_history_length() + 1
         if limit is not None:
             statslen = min(statslen, limit)  # pragma: no cover
-
-        for i in range(statslen):
-            if i < len(self._stats):
-                vector.append(self._stats[i][record_name] / ceil)
-            else:
-                vector.append(0)
-
-        return vector
+        return self._stats.get_vector(record_name, statslen, ceil=ceil)
 
     def stats_memory_vector(self, limit=None):
         return self._vector_helper("memoryPercent", limit)
@@ -1859,11 +1859,21 @@ class vmmDetails(vmmGObjectUI):
             opts = {"received": rx, "transferred": tx, "units": unit}
             return _multi_color(_("%(received)d %(units)s in") % opts,
                                 _("%(transferred)d %(units)s out") % opts)
+        def _devices_tooltip(devices, fmt):
+            lines = []
+            for dev, rx, tx in devices:
+                opts = {"dev": dev,
+                        "received": uiutil.pretty_mem(rx // 1024),
+                        "transferred": uiutil.pretty_mem(tx // 1024)}
+                lines.append(fmt % opts)
+            return "\n".join(lines) or None
 
         cpu_txt = _("Disabled")
         mem_txt = _("Disabled")
         dsk_txt = _("Disabled")
         net_txt = _("Disabled")
+        dsk_tooltip = None
+        net_tooltip = None
 
         if self.config.get_stats_enable_cpu_poll():
             cpu_txt = "%d %%" % self.vm.guest_cpu_time_percentage()
@@ -1879,15 +1889,22 @@ class vmmDetails(vmmGObjectUI):
         if self.config.get_stats_enable_disk_poll():
             dsk_txt = _dsk_rx_tx_text(self.vm.disk_read_rate(),
                                       self.vm.disk_write_rate(), "KiB/s")
+            dsk_tooltip = _devices_tooltip(self.vm.disk_io_devices(),
+                _("%(dev)s: %(received)s read, %(transferred)s written"))
 
         if self.config.get_stats_enable_net_poll():
             net_txt = _net_rx_tx_text(self.vm.network_rx_rate(),
                                       self.vm.network_tx_rate(), "KiB/s")
+            net_tooltip = _devices_tooltip(self.vm.network_traffic_devices(),
+                _("%(dev)s: %(received)s in, %(transferred)s out"))
 
         self.widget("overview-cpu-usage-text").set_text(cpu_txt)
         self.widget("overview-memory-usage-text").set_text(mem_txt)
         self.widget("overview-network-traffic-text").set_markup(net_txt)
         self.widget("overview-disk-usage-text").set_markup(dsk_txt)
+        self.widget("overview-network-traffic-text").set_tooltip_text(
+                net_tooltip)
+        self.widget("overview-disk-usage-text").set_tooltip_text(dsk_tooltip)
 
         self._graph_cpu.set_property("data_array",
                                           self.vm.guest_cpu_time_vector())
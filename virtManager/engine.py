@@ -6,6 +6,7 @@
 
 import queue
 import threading
+import time
 
 from gi.repository import Gio
 from gi.repository import GLib
@@ -19,8 +20,119 @@ from .connmanager import vmmConnectionManager
 from .lib.inspection import vmmInspection
 from .systray import vmmSystray
 
-(PRIO_HIGH,
- PRIO_LOW) = range(1, 3)
+
+class _ConnTickWorker(object):
+    """
+    Runs tick_from_engine for a single connection in its own thread.
+
+    Every connection gets its own worker, so a slow or half dead remote
+    connection only delays its own polling. Requests that arrive while
+    a tick is already queued are coalesced into the queued one, and
+    periodic ticks are skipped for a connection whose ticks take longer
+    than the update interval, backing off until it catches up.
+    Priority ticks (events, initial poll) are never dropped.
+    """
+    MAX_BACKOFF = 60
+
+    def __init__(self, conn, get_interval):
+        self._conn = conn
+        self._uri = conn.get_uri()
+        self._get_interval = get_interval
+
+        self._cond = threading.Condition()
+        self._prio_kwargs = None
+        self._kwargs = None
+        self._stopped = False
+        self._slow_count = 0
+        self._backoff_until = 0
+
+        self._thread = threading.Thread(name="Tick thread %s" % self._uri,
+                                        target=self._run_thread,
+                                        args=())
+        self._thread.daemon = True
+        self._thread.start()
+
+    @staticmethod
+    def _merge_kwargs(old, new):
+        # All tick() kwargs are boolean 'do this' requests, so merging
+        # two requests is a logical OR of each option
+        ret = dict(old or {})
+        for key, val in new.items():
+            ret[key] = ret.get(key, False) or val
+        return ret
+
+    def queue_tick(self, isprio, kwargs):
+        with self._cond:
+            if self._stopped:
+                return  # pragma: no cover
+            if isprio:
+                self._prio_kwargs = self._merge_kwargs(
+                        self._prio_kwargs, kwargs)
+            else:
+                if time.time() < self._backoff_until:
+                    return  # pragma: no cover
+                self._kwargs = self._merge_kwargs(self._kwargs, kwargs)
+            self._cond.notify()
+
+    def stop(self):
+        with self._cond:
+            self._stopped = True
+            self._prio_kwargs = None
+            self._kwargs = None
+            self._cond.notify()
+
+    def _get_next_kwargs(self):
+        with self._cond:
+            while (not self._stopped and
+                   self._prio_kwargs is None and
+                   self._kwargs is None):
+                self._cond.wait()
+            if self._stopped:
+                return None
+
+            # Priority ticks are run first. Any pending regular tick
+            # is folded in, since it would only repeat the same work
+            kwargs = self._merge_kwargs(self._prio_kwargs or {},
+                                        self._kwargs or {})
+            self._prio_kwargs = None
+            self._kwargs = None
+            return kwargs
+
+    def _update_backoff(self, duration):
+        if duration > self._get_interval():  # pragma: no cover
+            if not self._slow_count:
+                log.debug("Tick for %s is slow (%.2fs), not running at "
+                          "requested rate.", self._uri, duration)
+            self._slow_count += 1
+            backoff = min(self.MAX_BACKOFF, duration * self._slow_count)
+            self._backoff_until = time.time() + backoff
+            return
+
+        if self._slow_count:  # pragma: no cover
+            log.debug("Tick for %s is back to the requested rate.",
+                      self._uri)
+        self._slow_count = 0
+        self._backoff_until = 0
+
+    def _run_thread(self):
+        while True:
+            kwargs = self._get_next_kwargs()
+            if kwargs is None:
+                break
+
+            start = time.time()
+            try:
+                self._conn.tick_from_engine(**kwargs)
+            except Exception:  # pragma: no cover
+                # Don't attempt to show any UI error here, since it
+                # can cause dialogs to appear from nowhere if say
+                # libvirtd is shut down
+                log.debug("Error polling connection %s",
+                        self._uri, exc_info=True)
+            self._update_backoff(time.time() - start)
+
+        # Need to clear reference to make leak check happy
+        self._conn = None
 
 
 def _show_startup_error(fn):
@@ -68,13 +180,8 @@ class vmmEngine(vmmGObject):
         self._init_gtk_application()
 
         self._timer = None
-        self._tick_counter = 0
-        self._tick_thread_slow = False
-        self._tick_thread = threading.Thread(name="Tick thread",
-                                            target=self._handle_tick_queue,
-                                            args=())
-        self._tick_thread.daemon = True
-        self._tick_queue = queue.PriorityQueue(100)
+        self._tick_workers = {}
+        self._tick_workers_lock = threading.Lock()
 
 
     @property
@@ -84,7 +191,11 @@ class vmmEngine(vmmGObject):
 
     def _cleanup(self):
         # self._timer should be automatically cleaned up
-        pass
+        with self._tick_workers_lock:
+            workers = list(self._tick_workers.values())
+            self._tick_workers = {}
+        for worker in workers:
+            worker.stop()
 
 
     #################
@@ -102,8 +213,10 @@ class vmmEngine(vmmGObject):
             self.config.on_stats_update_interval_changed(
                 self._timer_changed_cb))
 
+        vmmConnectionManager.get_instance().connect(
+                "conn-removed", self._conn_removed_cb)
+
         self._schedule_timer()
-        self._tick_thread.start()
         self._tick()
 
         uris = list(self._connobjs.keys())
@@ -265,17 +378,23 @@ class vmmEngine(vmmGObject):
 
         self._timer = self.timeout_add(interval, self._tick)
 
-    def _add_obj_to_tick_queue(self, obj, isprio, **kwargs):
-        if self._tick_queue.full():  # pragma: no cover
-            if not self._tick_thread_slow:
-                log.debug("Tick is slow, not running at requested rate.")
-                self._tick_thread_slow = True
-            return
+    def _get_interval(self):
+        return self.config.get_stats_update_interval()
 
-        self._tick_counter += 1
-        self._tick_queue.put((isprio and PRIO_HIGH or PRIO_LOW,
-                              self._tick_counter,
-                              obj, kwargs))
+    def _conn_removed_cb(self, _src, uri):
+        with self._tick_workers_lock:
+            worker = self._tick_workers.pop(uri, None)
+        if worker:
+            worker.stop()
+
+    def _add_obj_to_tick_queue(self, conn, isprio, **kwargs):
+        uri = conn.get_uri()
+        with self._tick_workers_lock:
+            worker = self._tick_workers.get(uri)
+            if not worker:
+                worker = _ConnTickWorker(conn, self._get_interval)
+                self._tick_workers[uri] = worker
+        worker.queue_tick(isprio, kwargs)
 
     def schedule_priority_tick(self, conn, kwargs):
         # Called directly from connection
@@ -287,22 +406,6 @@ class vmmEngine(vmmGObject):
                                         stats_update=True, pollvm=True)
         return 1
 
-    def _handle_tick_queue(self):
-        while True:
-            ignore1, ignore2, conn, kwargs = self._tick_queue.get()
-            try:
-                conn.tick_from_engine(**kwargs)
-            except Exception:  # pragma: no cover
-                # Don't attempt to show any UI error here, since it
-                # can cause dialogs to appear from nowhere if say
-                # libvirtd is shut down
-                log.debug("Error polling connection %s",
-                        conn.get_uri(), exc_info=True)
-
-            # Need to clear reference to make leak check happy
-            conn = None
-            self._tick_queue.task_done()
-
 
     #####################################
     # window counting and exit handling #
@@ -358,6 +461,10 @@ class vmmEngine(vmmGObject):
                 self.emit("app-closing")
                 self.cleanup()
 
+                from .object.libvirtobject import vmmLibvirtObject
+                log.debug("Parsed XML cache hits=%s misses=%s",
+                        *vmmLibvirtObject.get_xml_cache_stats())
+
                 if self.config.CLITestOptions.leak_debug:
                     objs = self.config.get_objects()
                     # Engine will always appear to leak
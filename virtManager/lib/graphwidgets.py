@@ -3,6 +3,10 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import collections
+
+import cairo
+
 from gi.repository import GObject
 from gi.repository import Gtk
 
@@ -84,6 +88,30 @@ def draw_fill(cairo_ct, x, y, w, h, points, taper=False):
     cairo_ct.fill()
 
 
+GRAPH_SURFACE_MARGIN = 2
+
+
+def _make_graph_surface(cr, width, height, draw_cb):
+    """
+    Render draw_cb(graph_cr) to a new surface compatible with cr's target.
+    Graphs are drawn into the surface offset by GRAPH_SURFACE_MARGIN,
+    since line caps and fills spill slightly outside the graph area.
+    """
+    surface = cr.get_target().create_similar(cairo.CONTENT_COLOR_ALPHA,
+            width + GRAPH_SURFACE_MARGIN * 2,
+            height + GRAPH_SURFACE_MARGIN * 2)
+    graph_cr = cairo.Context(surface)
+    graph_cr.translate(GRAPH_SURFACE_MARGIN, GRAPH_SURFACE_MARGIN)
+    draw_cb(graph_cr)
+    return surface
+
+
+def _paint_graph_surface(cr, surface, x, y):
+    cr.set_source_surface(surface,
+            x - GRAPH_SURFACE_MARGIN, y - GRAPH_SURFACE_MARGIN)
+    cr.paint()
+
+
 class CellRendererSparkline(Gtk.CellRenderer):
     __gproperties__ = {
         # 'name': (GObject.TYPE_*,
@@ -107,6 +135,58 @@ class CellRendererSparkline(Gtk.CellRenderer):
         self.reversed = False
         self.rgb = None
 
+        # One renderer draws every row, so keep the rendered graphs for
+        # the most recently drawn data. Rows are redrawn far more often
+        # than their stats change.
+        self._surface_cache = collections.OrderedDict()
+
+    # Enough for a full screen of rows
+    _SURFACE_CACHE_SIZE = 256
+
+    def _get_points(self, graph_height, pixels_per_point):
+        """
+        Graph points for data_array, relative to the graph origin
+        """
+        data = self.data_array
+        if self.reversed:
+            data = data[::-1]
+
+        points = []
+        for index, val in enumerate(data):
+            y = graph_height - (graph_height * val)
+            y = min(graph_height, max(0, y))
+            points.append((int(index * pixels_per_point), int(y)))
+        return points
+
+    def _get_graph_surface(self, cr, graph_width, graph_height,
+                           pixels_per_point):
+        key = (tuple(self.data_array), self.reversed,
+               graph_width, graph_height)
+        surface = self._surface_cache.get(key)
+        if surface:
+            self._surface_cache.move_to_end(key)
+            return surface
+
+        points = self._get_points(graph_height, pixels_per_point)
+
+        def _draw(graph_cr):
+            graph_cr.set_line_cap(cairo.LINE_CAP_ROUND)
+
+            # Set color to dark blue for the actual sparkline
+            graph_cr.set_line_width(2)
+            graph_cr.set_source_rgb(0.421875, 0.640625, 0.73046875)
+            draw_line(graph_cr, 0, graph_height, points)
+
+            # Set color to light blue for the fill
+            graph_cr.set_source_rgba(0.71484375, 0.84765625, 0.89453125, .5)
+            draw_fill(graph_cr, 0, 0, graph_width, graph_height, points)
+
+        surface = _make_graph_surface(cr, graph_width, graph_height, _draw)
+        self._surface_cache[key] = surface
+        if len(self._surface_cache) > self._SURFACE_CACHE_SIZE:
+            self._surface_cache.popitem(last=False)
+        return surface
+
     def do_render(self, cr, widget, background_area, cell_area,
                   flags):
         # cr                : Cairo context
@@ -172,45 +252,9 @@ class CellRendererSparkline(Gtk.CellRenderer):
                      cell_area.height - (BORDER_PADDING * 2))
         cr.fill()
 
-        def get_y(index):
-            baseline_y = graph_y + graph_height
-
-            n = index
-            if self.reversed:
-                n = (len(self.data_array) - index - 1)
-
-            val = self.data_array[n]
-            y = baseline_y - (graph_height * val)
-
-            y = max(graph_y, y)
-            y = min(graph_y + graph_height, y)
-            return y
-
-        points = []
-        for index in range(0, len(self.data_array)):
-            x = int(((index * pixels_per_point) + graph_x))
-            y = int(get_y(index))
-
-            points.append((x, y))
-
-
-        cell_area.x = graph_x
-        cell_area.y = graph_y
-        cell_area.width = graph_width
-        cell_area.height = graph_height
-
-        # Set color to dark blue for the actual sparkline
-        cr.set_line_width(2)
-        cr.set_source_rgb(0.421875, 0.640625, 0.73046875)
-        draw_line(cr, cell_area.y, cell_area.height, points)
-
-        # Set color to light blue for the fill
-        cr.set_source_rgba(0.71484375, 0.84765625, 0.89453125, .5)
-
-        draw_fill(cr,
-                  cell_area.x, cell_area.y,
-                  cell_area.width, cell_area.height,
-                  points)
+        surface = self._get_graph_surface(cr, graph_width, graph_height,
+                                          pixels_per_point)
+        _paint_graph_surface(cr, surface, graph_x, graph_y)
         return
 
     def do_get_size(self, widget, cell_area=None):
@@ -276,6 +320,11 @@ class Sparkline(Gtk.DrawingArea):
         self.reversed = False
         self.rgb = []
 
+        # (key, surface) of the last rendered graph. The widget is
+        # redrawn on every expose, but the data only changes once per
+        # stats update
+        self._surface_cache = (None, None)
+
         ctxt = self.get_style_context()
         ctxt.add_class(Gtk.STYLE_CLASS_ENTRY)
 
@@ -294,10 +343,6 @@ class Sparkline(Gtk.DrawingArea):
         w = window.get_width()
         h = window.get_height()
 
-        points_per_set = (len(self.data_array) // self.num_sets)
-        pixels_per_point = (float(w) /
-                            (float((points_per_set - 1) or 1)))
-
         widget = self
         ctx = widget.get_style_context()
 
@@ -317,17 +362,22 @@ class Sparkline(Gtk.DrawingArea):
         Gtk.render_frame(ctx, cr, 0, 0, w - 1, h - 1)
 
         # Draw the actual sparkline
-        def get_y(dataset, index):
-            baseline_y = h
+        key = (tuple(self.data_array), self.num_sets, self.filled,
+               self.reversed, tuple(self.rgb), w, h)
+        if self._surface_cache[0] != key:
+            self._surface_cache = (key,
+                    _make_graph_surface(cr, w, h,
+                        lambda graph_cr: self._draw_sets(graph_cr, w, h)))
+        _paint_graph_surface(cr, self._surface_cache[1], 0, 0)
 
-            n = dataset * points_per_set
-            if self.reversed:
-                n += (points_per_set - index - 1)
-            else:
-                n += index
+        cr.restore()
 
-            val = self.data_array[n]
-            return baseline_y - ((h - 1) * val)
+        return 0
+
+    def _draw_sets(self, cr, w, h):
+        points_per_set = (len(self.data_array) // self.num_sets)
+        pixels_per_point = (float(w) /
+                            (float((points_per_set - 1) or 1)))
 
         cr.set_line_width(2)
 
@@ -336,16 +386,14 @@ class Sparkline(Gtk.DrawingArea):
                 cr.set_source_rgb(self.rgb[(dataset * 3)],
                                         self.rgb[(dataset * 3) + 1],
                                         self.rgb[(dataset * 1) + 2])
-            points = []
-            for index in range(0, points_per_set):
-                x = index * pixels_per_point
-                y = get_y(dataset, index)
-
-                points.append((int(x), int(y)))
 
+            start = dataset * points_per_set
+            data = self.data_array[start:start + points_per_set]
+            if self.reversed:
+                data = data[::-1]
 
-            if self.num_sets == 1:
-                pass
+            points = [(int(index * pixels_per_point), int(h - ((h - 1) * val)))
+                      for index, val in enumerate(data)]
 
             draw_line(cr, 0, h, points)
             if self.filled:
@@ -355,10 +403,6 @@ class Sparkline(Gtk.DrawingArea):
                 points = [(0, h)] + points
                 draw_fill(cr, 0, 0, w, h, points, taper=True)
 
-        cr.restore()
-
-        return 0
-
     def do_size_request(self, requisition):  # pragma: no cover
         width = len(self.data_array) / self.num_sets
         height = 20
@@ -3,7 +3,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
-import re
+import array
+import threading
 import time
 
 import libvirt
@@ -42,13 +43,187 @@ class _VMStatsRecord(object):
         self.netTxRate = None
 
 
+class _DomainStatsSample(object):
+    """
+    Decoded getAllDomainStats record for a single domain
+    """
+    def __init__(self, timestamp):
+        self.timestamp = timestamp
+
+        self.state = 0
+        self.guestcpus = 0
+        self.cpuTimeAbs = 0
+
+        self.balloonCurrent = 1
+        self.balloonUnused = None
+
+        # Totals across all devices
+        self.diskRdBytes = 0
+        self.diskWrBytes = 0
+        self.netRxBytes = 0
+        self.netTxBytes = 0
+
+        # Per device lists of (name, rd/rx bytes, wr/tx bytes)
+        self.disks = []
+        self.nets = []
+
+
+def decode_domain_stats(rawstats, timestamp):
+    """
+    Convert a raw getAllDomainStats dict into a _DomainStatsSample.
+
+    Device stats are looked up by index using block.count/net.count,
+    so the record is never scanned key by key.
+    """
+    get = rawstats.get
+    sample = _DomainStatsSample(timestamp)
+
+    sample.state = get("state.state", 0)
+    sample.guestcpus = get("vcpu.current", 0)
+    sample.cpuTimeAbs = get("cpu.time", 0)
+
+    sample.balloonCurrent = get("balloon.current", 1)
+    sample.balloonUnused = get("balloon.unused", None)
+
+    for idx in range(get("block.count", 0)):
+        prefix = "block.%d." % idx
+        rd = get(prefix + "rd.bytes", 0)
+        wr = get(prefix + "wr.bytes", 0)
+        sample.disks.append((get(prefix + "name"), rd, wr))
+        sample.diskRdBytes += rd
+        sample.diskWrBytes += wr
+
+    for idx in range(get("net.count", 0)):
+        prefix = "net.%d." % idx
+        rx = get(prefix + "rx.bytes", 0)
+        tx = get(prefix + "tx.bytes", 0)
+        sample.nets.append((get(prefix + "name"), rx, tx))
+        sample.netRxBytes += rx
+        sample.netTxBytes += tx
+
+    return sample
+
+
+class StatsRingBuffer(object):
+    """
+    Fixed capacity, columnar history of numeric stats samples.
+
+    Every record name gets its own array('d') column. Each sample is
+    written twice, at pos and pos + capacity, so the newest N samples
+    of a column are always a single contiguous slice: appending is O(1)
+    and building a graph vector never walks per-sample objects.
+    """
+    def __init__(self, fields, capacity):
+        self._fields = tuple(fields)
+        self._capacity = 0
+        self._columns = {}
+        self._pos = 0
+        self._len = 0
+        self._lock = threading.Lock()
+        self.resize(capacity)
+
+    def __len__(self):
+        return self._len
+
+    def resize(self, capacity):
+        """
+        Change the number of samples retained, keeping the newest ones
+        """
+        capacity = max(1, int(capacity))
+        if capacity == self._capacity:
+            return
+
+        with self._lock:
+            keep = min(self._len, capacity)
+            columns = {}
+            for name in self._fields:
+                newest = list(self._get_slice(name, keep))
+                col = array.array("d", bytes(8 * capacity * 2))
+                for idx, val in enumerate(newest):
+                    col[idx] = val
+                    col[idx + capacity] = val
+                columns[name] = col
+
+            self._columns = columns
+            self._capacity = capacity
+            self._len = keep
+            self._pos = keep % capacity
+
+    def clear(self):
+        with self._lock:
+            self._pos = 0
+            self._len = 0
+
+    def append(self, sample):
+        """
+        Append a new sample. Any record name missing from the sample
+        is stored as 0
+
+        :param sample: dict mapping record name to value
+        """
+        with self._lock:
+            pos = self._pos
+            capacity = self._capacity
+            for name in self._fields:
+                val = sample.get(name) or 0
+                col = self._columns[name]
+                col[pos] = val
+                col[pos + capacity] = val
+
+            self._pos = (pos + 1) % capacity
+            self._len = min(self._len + 1, capacity)
+
+    def get_record(self, name, default=0):
+        """
+        Return the newest value for record name
+        """
+        with self._lock:
+            if not self._len:
+                return default
+            return self._columns[name][self._pos - 1 + self._capacity]
+
+    def _get_slice(self, name, count):
+        count = min(count, self._len)
+        end = self._pos + self._capacity
+        col = self._columns.get(name)
+        if col is None or not count:
+            return memoryview(array.array("d"))
+        return memoryview(col)[end - count:end]
+
+    def get_slice(self, name, count):
+        """
+        Return a zero copy memoryview of the newest count samples of
+        record name, ordered oldest to newest
+        """
+        with self._lock:
+            return self._get_slice(name, count)
+
+    def get_vector(self, name, length, ceil=100.0):
+        """
+        Return a list of length values for record name, newest first,
+        each divided by ceil and zero padded past the stored history
+        """
+        view = self.get_slice(name, length)
+        vector = [val / ceil for val in reversed(view)]
+        if len(vector) < length:
+            vector.extend([0] * (length - len(vector)))
+        return vector
+
+
 class _VMStatsList(vmmGObject):
     """
-    Tracks a list of VMStatsRecords for a single VM
+    Tracks the recent stats history of a single VM
     """
+    _FIELDS = ["timestamp", "cpuTime", "cpuTimeAbs",
+               "cpuHostPercent", "cpuGuestPercent",
+               "curmem", "currMemPercent",
+               "diskRdKiB", "diskWrKiB", "netRxKiB", "netTxKiB",
+               "diskRdRate", "diskWrRate", "netRxRate", "netTxRate"]
+
     def __init__(self):
         vmmGObject.__init__(self)
-        self._stats = []
+        self._stats = StatsRingBuffer(self._FIELDS,
+                self.config.get_stats_history_length() + 1)
 
         self.diskRdMaxRate = 10.0
         self.diskWrMaxRate = 10.0
@@ -59,22 +234,24 @@ class _VMStatsList(vmmGObject):
         self.stats_disk_skip = []
         self.stats_net_skip = []
 
+        # Latest per device (name, rd/rx bytes, wr/tx bytes) lists,
+        # only filled in when getAllDomainStats is available
+        self.disk_devices = []
+        self.net_devices = []
+
     def _cleanup(self):
         pass
 
     def append_stats(self, newstats):
-        expected = self.config.get_stats_history_length()
-        current = len(self._stats)
-        if current > expected:  # pragma: no cover
-            del(self._stats[expected:current])
+        self._stats.resize(self.config.get_stats_history_length() + 1)
 
         def _calculate_rate(record_name):
             ret = 0.0
-            if self._stats:
-                oldstats = self._stats[0]
+            if len(self._stats):
                 ratediff = (getattr(newstats, record_name) -
-                            getattr(oldstats, record_name))
-                timediff = newstats.timestamp - oldstats.timestamp
+                            self._stats.get_record(record_name))
+                timediff = (newstats.timestamp -
+                            self._stats.get_record("timestamp"))
                 ret = float(ratediff) / float(timediff)
             return max(ret, 0.0)
 
@@ -88,25 +265,16 @@ class _VMStatsList(vmmGObject):
         self.netRxMaxRate = max(newstats.netRxRate, self.netRxMaxRate)
         self.netTxMaxRate = max(newstats.netTxRate, self.netTxMaxRate)
 
-        self._stats.insert(0, newstats)
+        self._stats.append(vars(newstats))
 
     def get_record(self, record_name):
-        if not self._stats:
-            return 0
-        return getattr(self._stats[0], record_name)
+        return self._stats.get_record(record_name)
 
     def get_vector(self, record_name, limit, ceil=100.0):
-        vector = []
         statslen = self.config.get_stats_history_length() + 1
         if limit is not None:
             statslen = min(statslen, limit)
-
-        for i in range(statslen):
-            if i < len(self._stats):
-                vector.append(getattr(self._stats[i], record_name) / ceil)
-            else:
-                vector.append(0)
-        return vector
+        return self._stats.get_vector(record_name, statslen, ceil=ceil)
 
     def get_in_out_vector(self, name1, name2, limit, ceil):
         return (self.get_vector(name1, limit, ceil=ceil),
@@ -159,10 +327,10 @@ class vmmStatsManager(vmmGObject):
         prevCpuTime = self.get_vm_statslist(vm).get_record("cpuTimeAbs")
 
         if allstats:
-            state = allstats.get("state.state", 0)
-            guestcpus = allstats.get("vcpu.current", 0)
-            cpuTimeAbs = allstats.get("cpu.time", 0)
-            timestamp = allstats.get("virt-manager.timestamp")
+            state = allstats.state
+            guestcpus = allstats.guestcpus
+            cpuTimeAbs = allstats.cpuTimeAbs
+            timestamp = allstats.timestamp
         else:
             state, guestcpus, cpuTimeAbs = self._old_cpu_stats_helper(vm)
 
@@ -226,16 +394,14 @@ class vmmStatsManager(vmmGObject):
             not vm.is_active() or
             not self.config.get_stats_enable_net_poll()):
             statslist.stats_net_skip = []
+            statslist.net_devices = []
             return rx, tx
 
         if allstats:
-            for key in allstats.keys():  # pragma: no cover
-                if re.match(r"net.[0-9]+.rx.bytes", key):
-                    rx += allstats[key]
-                if re.match(r"net.[0-9]+.tx.bytes", key):
-                    tx += allstats[key]
-            return rx, tx
+            statslist.net_devices = allstats.nets
+            return allstats.netRxBytes, allstats.netTxBytes
 
+        devices = []
         for iface in vm.get_interface_devices_norefresh():
             dev = iface.target_dev
             if not dev:
@@ -244,9 +410,11 @@ class vmmStatsManager(vmmGObject):
                 continue  # pragma: no cover
 
             devrx, devtx = self._old_net_stats_helper(vm, dev)
+            devices.append((dev, devrx, devtx))
             rx += devrx
             tx += devtx
 
+        statslist.net_devices = devices
         return rx, tx
 
 
@@ -286,21 +454,19 @@ class vmmStatsManager(vmmGObject):
             not vm.is_active() or
             not self.config.get_stats_enable_disk_poll()):
             statslist.stats_disk_skip = []
+            statslist.disk_devices = []
             return rd, wr
 
         if allstats:
-            for key in allstats.keys():
-                if re.match(r"block.[0-9]+.rd.bytes", key):
-                    rd += allstats[key]
-                if re.match(r"block.[0-9]+.wr.bytes", key):
-                    wr += allstats[key]
-            return rd, wr
+            statslist.disk_devices = allstats.disks
+            return allstats.diskRdBytes, allstats.diskWrBytes
 
         # LXC has a special blockStats method
         if vm.conn.is_lxc() and self._disk_stats_lxc_supported:
             try:
                 io = vm.get_backend().blockStats('')
                 if io:
+                    statslist.disk_devices = []
                     rd = io[1]
                     wr = io[3]
                     return rd, wr
@@ -308,6 +474,7 @@ class vmmStatsManager(vmmGObject):
                 log.debug("LXC style disk stats not supported: %s", e)
                 self._disk_stats_lxc_supported = False
 
+        devices = []
         for disk in vm.get_disk_devices_norefresh():
             dev = disk.target
             if not dev:
@@ -316,9 +483,11 @@ class vmmStatsManager(vmmGObject):
                 continue  # pragma: no cover
 
             diskrd, diskwr = self._old_disk_stats_helper(vm, dev)
+            devices.append((dev, diskrd, diskwr))
             rd += diskrd
             wr += diskwr
 
+        statslist.disk_devices = devices
         return rd, wr
 
 
@@ -373,9 +542,11 @@ class vmmStatsManager(vmmGObject):
             statslist.mem_stats_period_is_set = True
 
         if allstats:
-            totalmem = allstats.get("balloon.current", 1)
-            curmem = max(0,
-                    totalmem - allstats.get("balloon.unused", totalmem))
+            totalmem = allstats.balloonCurrent
+            unused = allstats.balloonUnused
+            if unused is None:
+                unused = totalmem
+            curmem = max(0, totalmem - unused)
         else:
             totalmem, curmem = self._old_mem_stats_helper(vm)
 
@@ -412,10 +583,9 @@ class vmmStatsManager(vmmGObject):
             timestamp = time.time()
             rawallstats = conn.get_backend().getAllDomainStats(statflags, 0)
 
-            # Reformat the output to be a bit more friendly
             for dom, domallstats in rawallstats:
-                domallstats["virt-manager.timestamp"] = timestamp
-                ret[dom.UUIDString()] = domallstats
+                ret[dom.UUIDString()] = decode_domain_stats(
+                        domallstats, timestamp)
         except libvirt.libvirtError as err:
             if conn.support.is_error_nosupport(err):
                 log.debug("conn does not support getAllDomainStats()")
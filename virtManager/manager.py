@@ -101,6 +101,9 @@ class vmmManager(vmmGObjectUI):
         self.connmenu.get_accessible().set_name("conn-menu")
         self.connmenu_items = {}
 
+        # conn or vm handle -> Gtk.TreeRowReference of its vm-list row
+        self._rowrefs = {}
+
         self.builder.connect_signals({
             "on_menu_view_guest_cpu_usage_activate":
             self.toggle_stats_visible_guest_cpu,
@@ -215,6 +218,7 @@ class vmmManager(vmmGObjectUI):
         self.connmenu.destroy()
         self.connmenu = None
         self.connmenu_items = None
+        self._rowrefs = {}
 
         if self._window_size:
             self.config.set_manager_window_size(*self._window_size)
@@ -419,20 +423,25 @@ class vmmManager(vmmGObjectUI):
         return handle.conn
 
     def get_row(self, conn_or_vm):
-        def _walk(model, rowiter, obj):
-            while rowiter:
-                row = model[rowiter]
-                if row[ROW_HANDLE] == obj:
-                    return row
-                if model.iter_has_child(rowiter):
-                    ret = _walk(model, model.iter_nth_child(rowiter, 0), obj)
-                    if ret:
-                        return ret
-                rowiter = model.iter_next(rowiter)
-
-        if not len(self.model):
+        rowref = self._rowrefs.get(conn_or_vm)
+        if not rowref or not rowref.valid():
             return None
-        return _walk(self.model, self.model.get_iter_first(), conn_or_vm)
+        return self.model[rowref.get_path()]
+
+    def _append_row(self, parent_iter, row):
+        """
+        Append row to the vm-list, and index it by its handle. The
+        TreeRowReference tracks the row through sorting and removal of
+        its siblings, so get_row doesn't need to search the model.
+        """
+        rowiter = self.model.append(parent_iter, row)
+        self._rowrefs[row[ROW_HANDLE]] = Gtk.TreeRowReference.new(
+                self.model, self.model.get_path(rowiter))
+        return rowiter
+
+    def _remove_row(self, rowiter):
+        self._rowrefs.pop(self.model[rowiter][ROW_HANDLE], None)
+        self.model.remove(rowiter)
 
 
     ####################
@@ -552,22 +561,20 @@ class vmmManager(vmmGObjectUI):
     def vm_added(self, conn, vm):
         vm_row = self._build_row(None, vm)
         conn_row = self.get_row(conn)
-        self.model.append(conn_row.iter, vm_row)
+        self._append_row(conn_row.iter, vm_row)
 
         vm.connect("state-changed", self.vm_changed)
-        vm.connect("resources-sampled", self.vm_row_updated)
         vm.connect("inspection-changed", self.vm_inspection_changed)
 
         # Expand a connection when adding a vm to it
         self.widget("vm-list").expand_row(conn_row.path, False)
 
     def vm_removed(self, conn, vm):
-        parent = self.get_row(conn).iter
-        for rowidx in range(self.model.iter_n_children(parent)):
-            rowiter = self.model.iter_nth_child(parent, rowidx)
-            if self.model[rowiter][ROW_HANDLE] == vm:
-                self.model.remove(rowiter)
-                break
+        ignore = conn
+        row = self.get_row(vm)
+        if row is None:
+            return  # pragma: no cover
+        self._remove_row(row.iter)
 
     def _build_conn_hint(self, conn):
         hint = conn.get_uri()
@@ -640,11 +647,12 @@ class vmmManager(vmmGObjectUI):
             return  # pragma: no cover
 
         conn_row = self._build_row(conn, None)
-        self.model.append(None, conn_row)
+        self._append_row(None, conn_row)
 
         conn.connect("vm-added", self.vm_added)
         conn.connect("vm-removed", self.vm_removed)
         conn.connect("resources-sampled", self.conn_row_updated)
+        conn.connect("vms-sampled", self._vms_sampled_cb)
         conn.connect("state-changed", self.conn_state_changed)
 
         for vm in conn.list_vms():
@@ -655,7 +663,7 @@ class vmmManager(vmmGObjectUI):
         while child is not None:  # pragma: no cover
             # vm-removed signals should handle this, this is a fallback
             # in case something goes wrong
-            self.model.remove(child)
+            self._remove_row(child)
             child = self.model.iter_children(row.iter)
 
     def _conn_removed(self, _src, uri):
@@ -668,7 +676,7 @@ class vmmManager(vmmGObjectUI):
             return
 
         self._remove_child_rows(conn_row)
-        self.model.remove(conn_row.iter)
+        self._remove_row(conn_row.iter)
 
 
     #############################
@@ -681,6 +689,22 @@ class vmmManager(vmmGObjectUI):
             return
         self.model.row_changed(row.path, row.iter)
 
+    def _vms_sampled_cb(self, conn, vms):
+        """
+        Refresh the stats columns after a conn tick. Redrawing the list
+        once is enough, unless it is sorted by a stats column, which
+        needs row_changed for every row to re-sort.
+        """
+        ignore = conn
+        sortcol = self.model.get_sort_column_id()[0]
+        if sortcol not in [COL_GUEST_CPU, COL_HOST_CPU, COL_MEM,
+                           COL_DISK, COL_NETWORK]:
+            self.widget("vm-list").queue_draw()
+            return
+
+        for vm in vms:
+            self.vm_row_updated(vm)
+
     def vm_changed(self, vm):
         row = self.get_row(vm)
         if row is None:
@@ -17,6 +17,7 @@ from .asyncjob import vmmAsyncJob
 from .baseclass import vmmGObjectUI
 from .connmanager import vmmConnectionManager
 from .object.domain import vmmDomain
+from .object.domain import vmmMigrationQueue
 from .xmleditor import vmmXMLEditor
 
 
@@ -56,6 +57,7 @@ class vmmMigrateDialog(vmmGObjectUI):
             "on_migrate_set_address_toggled": self._set_address_toggled,
             "on_migrate_set_port_toggled": self._set_port_toggled,
             "on_migrate_mode_changed": self._mode_changed,
+            "on_migrate_batch_toggled": self._batch_toggled,
         })
         self.bind_escape_key_close()
         self._cleanup_on_app_close()
@@ -154,6 +156,11 @@ class vmmMigrateDialog(vmmGObjectUI):
             self.widget("migrate-unsafe-label").get_tooltip_text())
         self.widget("migrate-temporary").set_tooltip_text(
             self.widget("migrate-temporary-label").get_tooltip_text())
+        for name in ["migrate-bandwidth", "migrate-compressed",
+                     "migrate-parallel-connections", "migrate-batch",
+                     "migrate-max-parallel"]:
+            self.widget(name).set_tooltip_text(
+                self.widget(name + "-label").get_tooltip_text())
 
     def _reset_state(self):
         self._xmleditor.reset_state()
@@ -182,6 +189,12 @@ class vmmMigrateDialog(vmmGObjectUI):
         self.widget("migrate-mode").set_active(0)
         self.widget("migrate-unsafe").set_active(False)
         self.widget("migrate-temporary").set_active(False)
+        self.widget("migrate-bandwidth").set_value(0)
+        self.widget("migrate-compressed").set_active(False)
+        self.widget("migrate-parallel-connections").set_value(0)
+        self.widget("migrate-max-parallel").set_value(2)
+        self.widget("migrate-batch").set_active(False)
+        self.widget("migrate-batch").emit("toggled")
 
         if self.conn.is_xen():
             # Default xen port is 8002
@@ -274,6 +287,36 @@ class vmmMigrateDialog(vmmGObjectUI):
         self.widget("migrate-direct-box").set_visible(not is_tunnel)
         self.widget("migrate-tunnel-box").set_visible(is_tunnel)
 
+    def _get_batch_vms(self):
+        """
+        The VMs to migrate when 'Migrate all running VMs' is selected,
+        with the VM the dialog was opened for first
+        """
+        return [self.vm] + [vm for vm in self.conn.list_vms()
+                            if vm != self.vm and vm.is_stoppable()]
+
+    def _batch_toggled(self, src):
+        is_batch = src.get_active()
+        self.widget("migrate-max-parallel").set_sensitive(is_batch)
+
+        # Simultaneous migrations can't share one incoming port, so let
+        # libvirt pick a free one for each migration
+        tooltip = None
+        if is_batch:
+            self.widget("migrate-set-port").set_active(False)
+            self.widget("migrate-set-port").emit("toggled")
+            tooltip = _("Libvirt chooses a port for each migration "
+                        "when migrating all running VMs.")
+        self.widget("migrate-set-port").set_sensitive(not is_batch)
+        self.widget("migrate-set-port").set_tooltip_text(tooltip)
+
+        name = self.vm.get_name_or_title()
+        if is_batch:
+            count = len(self._get_batch_vms()) - 1
+            name = (_("%(vm)s and %(count)s other running VMs") %
+                    {"vm": name, "count": count})
+        self.widget("migrate-label-name").set_text(name)
+
 
     ###########################
     # destconn combo handling #
@@ -346,11 +389,14 @@ class vmmMigrateDialog(vmmGObjectUI):
             uri += ":%s" % port
         return uri
 
-    def _finish_cb(self, error, details, destconn):
+    def _finish_cb(self, error, details, destconn, is_batch):
         self.reset_finish_cursor()
 
         if error:
-            error = _("Unable to migrate guest: %s") % error
+            if is_batch:
+                error = _("Unable to migrate all guests: %s") % error
+            else:
+                error = _("Unable to migrate guest: %s") % error
             self.err.show_err(error, details=details)
         else:
             destconn.schedule_priority_tick(pollvm=True)
@@ -371,6 +417,12 @@ class vmmMigrateDialog(vmmGObjectUI):
             tunnel = self._is_tunnel_selected()
             unsafe = self.widget("migrate-unsafe").get_active()
             temporary = self.widget("migrate-temporary").get_active()
+            bandwidth = int(self.widget("migrate-bandwidth").get_value())
+            compressed = self.widget("migrate-compressed").get_active()
+            parallel_connections = int(
+                self.widget("migrate-parallel-connections").get_value())
+            is_batch = self.widget("migrate-batch").get_active()
+            max_parallel = int(self.widget("migrate-max-parallel").get_value())
 
             if tunnel:
                 uri = self.widget("migrate-tunnel-uri").get_text()
@@ -383,19 +435,54 @@ class vmmMigrateDialog(vmmGObjectUI):
                                details=details)
             return
 
+        if is_batch and xml:
+            self.err.val_err(
+                _("Custom XML can't be used when migrating all running VMs"))
+            return
+
         self.set_finish_cursor()
 
-        cancel_cb = None
-        if self.vm.supports_domain_job_info():
-            cancel_cb = (self._cancel_migration, self.vm)
+        migrate_kwargs = {
+            "dest_uri": uri,
+            "tunnel": tunnel,
+            "unsafe": unsafe,
+            "temporary": temporary,
+            "bandwidth": bandwidth,
+            "compressed": compressed,
+            "parallel_connections": parallel_connections,
+        }
 
         if uri:
             destlabel += " " + uri
 
+        if is_batch:
+            queue = vmmMigrationQueue(self._get_batch_vms(), destconn,
+                    max_parallel=max_parallel, **migrate_kwargs)
+            cancel_cb = None
+            if self.vm.supports_domain_job_info():
+                cancel_cb = (self._cancel_batch_migration, queue)
+
+            progWin = vmmAsyncJob(
+                self._async_batch_migrate, [queue],
+                self._finish_cb, [destconn, True],
+                _("Migrating %(count)s VMs") % {"count": len(queue.vms)},
+                (_("Migrating %(count)s VMs to %(host)s, %(parallel)s at a "
+                   "time. This may take a while.") %
+                    {"count": len(queue.vms), "host": destlabel,
+                     "parallel": max_parallel}),
+                self.topwin, cancel_cb=cancel_cb)
+            progWin.run()
+            return
+
+        cancel_cb = None
+        if self.vm.supports_domain_job_info():
+            cancel_cb = (self._cancel_migration, self.vm)
+
+        migrate_kwargs["xml"] = xml
         progWin = vmmAsyncJob(
             self._async_migrate,
-            [self.vm, destconn, uri, tunnel, unsafe, temporary, xml],
-            self._finish_cb, [destconn],
+            [self.vm, destconn, migrate_kwargs],
+            self._finish_cb, [destconn, False],
             _("Migrating VM '%s'") % self.vm.get_name(),
             (_("Migrating VM '%(name)s' to %(host)s. This may take a while.") %
                 {"name": self.vm.get_name(), "host": destlabel}),
@@ -413,8 +500,18 @@ class vmmMigrateDialog(vmmGObjectUI):
 
         asyncjob.job_canceled = True  # pragma: no cover
 
-    def _async_migrate(self, asyncjob,
-            origvm, origdconn, migrate_uri, tunnel, unsafe, temporary, xml):
+    def _cancel_batch_migration(self, asyncjob, queue):
+        log.debug("Cancelling batch migrate job")
+        try:
+            queue.cancel()
+        except Exception as e:
+            log.exception("Error cancelling batch migrate job")
+            asyncjob.show_warning(_("Error cancelling migrate job: %s") % e)
+            return
+
+        asyncjob.job_canceled = True  # pragma: no cover
+
+    def _async_migrate(self, asyncjob, origvm, origdconn, migrate_kwargs):
         meter = asyncjob.get_meter()
 
         srcconn = origvm.conn
@@ -426,8 +523,20 @@ class vmmMigrateDialog(vmmGObjectUI):
         log.debug("Migrating vm=%s from %s to %s", vm.get_name(),
                       srcconn.get_uri(), dstconn.get_uri())
 
-        vm.migrate(dstconn, migrate_uri, tunnel, unsafe, temporary, xml,
-            meter=meter)
+        vm.migrate(dstconn, meter=meter, **migrate_kwargs)
+
+    def _async_batch_migrate(self, asyncjob, queue):
+        errors = queue.run(asyncjob.get_meter())
+        if not errors or asyncjob.job_canceled:
+            return
+
+        names = ", ".join(vm.get_name() for vm, dummy1, dummy2 in errors)
+        error = (_("Failed to migrate %(count)s of %(total)s VMs: %(names)s") %
+                 {"count": len(errors), "total": len(queue.vms),
+                  "names": names})
+        details = "\n".join("%s: %s\n%s" % (vm.get_name(), errorstr, tb)
+                             for vm, errorstr, tb in errors)
+        asyncjob.set_error(error, details)
 
     ################
     # UI listeners #
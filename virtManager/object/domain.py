@@ -4,9 +4,11 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import concurrent.futures
 import os
 import time
 import threading
+import traceback
 
 import libvirt
 
@@ -16,6 +18,8 @@ from virtinst import DeviceDisk
 from virtinst import DomainSnapshot
 from virtinst import Guest
 from virtinst import log
+from virtinst.progress import JobPoller
+from virtinst.progress import Meter
 
 from .libvirtobject import vmmLibvirtObject
 from ..baseclass import vmmGObject
@@ -27,40 +31,225 @@ class _SENTINEL(object):
     pass
 
 
-def start_job_progress_thread(vm, meter, progtext):
-    current_thread = threading.currentThread()
+class _JobProgress:
+    """
+    Report the progress of a long running domain job, like save or
+    migrate, to a meter. Polling for all jobs on a connection is shared
+    by a single progress.JobPoller thread, and job events like
+    MIGRATION_ITERATION and JOB_COMPLETED trigger an immediate update,
+    so polling can back off while nothing changes.
+    """
+    def __init__(self, vm, meter, progtext):
+        self._vm = vm
+        self._meter = meter
+        self._progtext = progtext
+        self._poller = None
+        self._job = None
+        self._last_progress = None
+
+    def _poll(self):
+        jobinfo = self._vm.job_info()
+        data_total      = int(jobinfo[3])
+        data_remaining  = int(jobinfo[5])
+
+        # data_total is 0 if the job hasn't started yet
+        if not data_total:
+            return False  # pragma: no cover
 
-    def jobinfo_cb():
-        while True:
-            time.sleep(.5)
+        if not self._meter.is_started():
+            self._meter.start(self._progtext, data_total)
 
-            if not current_thread.is_alive():
-                return
+        progress = data_total - data_remaining
+        self._meter.update(progress)
+        progressed = progress != self._last_progress
+        self._last_progress = progress
+        return progressed
 
-            try:
-                jobinfo = vm.job_info()
-                data_total      = int(jobinfo[3])
-                data_remaining  = int(jobinfo[5])
+    def start(self):
+        if not self._vm.supports_domain_job_info():
+            return  # pragma: no cover
+        self._poller = JobPoller.get_instance(self._vm.conn.get_backend())
+        # Keyed by UUID, since the job may run on a vmmDomain other
+        # than the one the connection tracks, like the ones migrate
+        # creates. See vmmConnection._domain_job_event
+        self._job = self._poller.add(self._poll, min_interval=.5,
+                                     max_interval=4,
+                                     key=self._vm.get_uuid())
 
-                # data_total is 0 if the job hasn't started yet
-                if not data_total:
-                    continue  # pragma: no cover
+    def stop(self):
+        if self._job:
+            self._poller.remove(self._job)
+        self._job = None
 
-                if not meter.is_started():
-                    meter.start(progtext, data_total)
 
-                progress = data_total - data_remaining
-                meter.update(progress)
-            except Exception:  # pragma: no cover
-                log.exception("Error calling jobinfo")
-                return
+class _MigrationMeter:
+    """
+    Meter handed to each migration run by a vmmMigrationQueue
+    """
+    def __init__(self, progress, vm):
+        self._progress = progress
+        self._vm = vm
+        self._size = None
+
+    def is_started(self):
+        return self._size is not None
+
+    def start(self, text, size):
+        ignore = text
+        self._size = size
+        self._progress.vm_update(self._vm, 0, 0)
 
-    if vm.supports_domain_job_info():
-        t = threading.Thread(target=jobinfo_cb,
-                             name="job progress reporting",
-                             args=())
-        t.daemon = True
-        t.start()
+    def update(self, new_total):
+        fraction = min(new_total / self._size, 1)
+        self._progress.vm_update(self._vm, fraction, new_total)
+
+    def end(self):
+        pass
+
+
+class _MigrationProgress:
+    """
+    Combine the progress of every migration in a vmmMigrationQueue into
+    one meter. The amount of data a migration sends isn't known until
+    its job starts, so each VM's share of the total is weighted by its
+    memory size. The meter text reports how many VMs are done, and the
+    aggregate throughput.
+    """
+    def __init__(self, vms):
+        self._lock = threading.Lock()
+        self._meter = None
+        self._weights = dict((vm, max(int(vm.xmlobj.memory or 0), 1) * 1024)
+                             for vm in vms)
+        self._fractions = {}
+        self._transferred = {}
+        self._migrated = 0
+        self._start_time = None
+
+    def _get_text(self):
+        text = _("Migrated %(migrated)s of %(total)s VMs") % {
+            "migrated": self._migrated, "total": len(self._weights)}
+        elapsed = time.monotonic() - self._start_time
+        transferred = sum(self._transferred.values())
+        if transferred and elapsed > 0:
+            text += ", %sB/s" % Meter.format_number(transferred / elapsed)
+        return text
+
+    def _update(self):
+        done = sum(self._weights[vm] * fraction
+                   for vm, fraction in self._fractions.items())
+        self._meter.set_text(self._get_text())
+        self._meter.update(int(done))
+
+    def start(self, meter):
+        self._meter = meter
+        self._start_time = time.monotonic()
+        self._meter.start(self._get_text(), sum(self._weights.values()))
+
+    def get_sub_meter(self, vm):
+        return _MigrationMeter(self, vm)
+
+    def vm_update(self, vm, fraction, transferred):
+        with self._lock:
+            self._fractions[vm] = fraction
+            self._transferred[vm] = transferred
+            self._update()
+
+    def vm_finished(self, vm, migrated):
+        with self._lock:
+            self._fractions[vm] = 1
+            if migrated:
+                self._migrated += 1
+            self._update()
+
+    def end(self):
+        with self._lock:
+            self._meter.end()
+
+
+class vmmMigrationQueue:
+    """
+    Migrate a batch of VMs to one destination connection, for example
+    to evacuate a host for maintenance. At most max_parallel migrations
+    run at once, each with the same vmmDomain.migrate options, like a
+    per-migration bandwidth limit. A failed migration doesn't stop the
+    rest of the queue.
+    """
+    def __init__(self, vms, destconn, max_parallel=2, **migrate_kwargs):
+        self.vms = list(vms)
+        self._destconn = destconn
+        self._max_parallel = max(int(max_parallel), 1)
+        self._migrate_kwargs = migrate_kwargs
+        self._progress = _MigrationProgress(self.vms)
+
+        self._lock = threading.Lock()
+        self._running = []
+        self._canceled = False
+
+    def _migrate_vm(self, vm):
+        srcconn = vm.conn
+        vminst = srcconn.get_backend().lookupByName(vm.get_name())
+        migvm = vmmDomain(srcconn, vminst, vminst.UUID())
+
+        with self._lock:
+            if self._canceled:
+                return False
+            self._running.append(migvm)
+
+        try:
+            log.debug("Migrating vm=%s from %s to %s", vm.get_name(),
+                      srcconn.get_uri(), self._destconn.get_uri())
+            migvm.migrate(self._destconn,
+                          meter=self._progress.get_sub_meter(vm),
+                          **self._migrate_kwargs)
+        finally:
+            with self._lock:
+                self._running.remove(migvm)
+        return True
+
+    def _run_one(self, vm):
+        migrated = False
+        error = None
+        try:
+            migrated = self._migrate_vm(vm)
+        except Exception as e:
+            log.debug("Error migrating vm=%s", vm.get_name(), exc_info=True)
+            error = (vm, str(e), "".join(traceback.format_exc()))
+        self._progress.vm_finished(vm, migrated)
+        return error
+
+    def run(self, meter):
+        """
+        Migrate every VM, blocking until they have all finished or the
+        queue is canceled
+
+        :returns: List of (vm, errorstr, details) for failed migrations
+        """
+        self._progress.start(meter)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._max_parallel,
+                thread_name_prefix="Migrating VM") as executor:
+            results = list(executor.map(self._run_one, self.vms))
+        self._progress.end()
+        return [error for error in results if error]
+
+    def cancel(self):
+        """
+        Don't start any more migrations, and abort the running ones
+        """
+        with self._lock:
+            self._canceled = True
+            running = self._running[:]
+
+        error = None
+        for migvm in running:
+            try:
+                migvm.abort_job()
+            except Exception as e:
+                log.debug("Error aborting migration of vm=%s",
+                          migvm.get_name(), exc_info=True)
+                error = e
+        if error:
+            raise error
 
 
 class _IPFetcher:
@@ -349,6 +538,7 @@ class vmmDomain(vmmLibvirtObject):
         self.cloning = False
 
         self._install_abort = False
+        self._job_progress = None
         self._id = None
         self._uuid = None
         self._has_managed_save = None
@@ -1370,11 +1560,14 @@ class vmmDomain(vmmLibvirtObject):
         self._install_abort = True
 
         if meter:
-            start_job_progress_thread(self, meter, _("Saving domain to disk"))
+            self._start_job_progress(meter, _("Saving domain to disk"))
 
-        if self.config.CLITestOptions.test_managed_save:
-            time.sleep(1.2)
-        self._backend.managedSave(0)
+        try:
+            if self.config.CLITestOptions.test_managed_save:
+                time.sleep(1.2)
+            self._backend.managedSave(0)
+        finally:
+            self._stop_job_progress()
 
     def has_managed_save(self):
         if not self.managedsave_supported:
@@ -1398,7 +1591,14 @@ class vmmDomain(vmmLibvirtObject):
 
 
     def migrate(self, destconn, dest_uri=None,
-            tunnel=False, unsafe=False, temporary=False, xml=None, meter=None):
+            tunnel=False, unsafe=False, temporary=False, xml=None, meter=None,
+            bandwidth=None, compressed=False, parallel_connections=None):
+        """
+        :param bandwidth: Max migration bandwidth in MiB/s
+        :param compressed: Compress the migration data stream
+        :param parallel_connections: Send the data over this many
+            connections at once (multi-fd)
+        """
         self._cancel_set_time()
         self._install_abort = True
 
@@ -1416,35 +1616,59 @@ class vmmDomain(vmmLibvirtObject):
         if unsafe:
             flags |= libvirt.VIR_MIGRATE_UNSAFE
 
+        if compressed:
+            flags |= libvirt.VIR_MIGRATE_COMPRESSED
+
+        if parallel_connections:
+            flags |= getattr(libvirt, "VIR_MIGRATE_PARALLEL", 131072)
+
         libvirt_destconn = destconn.get_backend().get_conn_for_api_arg()
         log.debug("Migrating: conn=%s flags=%s uri=%s tunnel=%s "
-            "unsafe=%s temporary=%s",
-            destconn, flags, dest_uri, tunnel, unsafe, temporary)
+            "unsafe=%s temporary=%s bandwidth=%s parallel_connections=%s",
+            destconn, flags, dest_uri, tunnel, unsafe, temporary,
+            bandwidth, parallel_connections)
 
         if meter:
-            start_job_progress_thread(self, meter, _("Migrating domain"))
+            self._start_job_progress(meter, _("Migrating domain"))
 
         params = {}
         if dest_uri and not tunnel:
             params[libvirt.VIR_MIGRATE_PARAM_URI] = dest_uri
         if xml:
             params[libvirt.VIR_MIGRATE_PARAM_DEST_XML] = xml
+        if bandwidth:
+            params[libvirt.VIR_MIGRATE_PARAM_BANDWIDTH] = int(bandwidth)
+        if parallel_connections:
+            params[getattr(libvirt, "VIR_MIGRATE_PARAM_PARALLEL_CONNECTIONS",
+                           "parallel.connections")] = int(parallel_connections)
 
-        if self.conn.is_test() and "TESTSUITE-FAKE" in (dest_uri or ""):
-            # If using the test driver and a special URI, fake successful
-            # migration so we can test more of the migration wizard
-            time.sleep(1.2)
-            if not xml:
-                xml = self.get_xml_to_define()
-            destconn.define_domain(xml).create()
-            self.delete()
-        elif tunnel:
-            self._backend.migrateToURI3(dest_uri, params, flags)
-        else:
-            self._backend.migrate3(libvirt_destconn, params, flags)
+        try:
+            if self.conn.is_test() and "TESTSUITE-FAKE" in (dest_uri or ""):
+                # If using the test driver and a special URI, fake successful
+                # migration so we can test more of the migration wizard
+                time.sleep(1.2)
+                if not xml:
+                    xml = self.get_xml_to_define()
+                destconn.define_domain(xml).create()
+                self.delete()
+            elif tunnel:
+                self._backend.migrateToURI3(dest_uri, params, flags)
+            else:
+                self._backend.migrate3(libvirt_destconn, params, flags)
+        finally:
+            self._stop_job_progress()
 
         # Don't schedule any conn update, migrate dialog handles it for us
 
+    def _start_job_progress(self, meter, progtext):
+        self._job_progress = _JobProgress(self, meter, progtext)
+        self._job_progress.start()
+
+    def _stop_job_progress(self):
+        if self._job_progress:
+            self._job_progress.stop()
+        self._job_progress = None
+
 
     ###################
     # Stats accessors #
@@ -1497,6 +1721,18 @@ class vmmDomain(vmmLibvirtObject):
         return self._get_stats().get_in_out_vector(
                 "diskRdRate", "diskWrRate", limit, ceil)
 
+    def disk_io_devices(self):
+        """
+        List of (target, read bytes, write bytes) from the latest sample
+        """
+        return self._get_stats().disk_devices
+
+    def network_traffic_devices(self):
+        """
+        List of (target, rx bytes, tx bytes) from the latest sample
+        """
+        return self._get_stats().net_devices
+
 
     ###################
     # Status helpers ##
@@ -1633,9 +1869,9 @@ class vmmDomain(vmmLibvirtObject):
         if stats_update:
             self.conn.statsmanager.refresh_vm_stats(self)
         if dosignal:
-            self.idle_emit("state-changed")
+            self.idle_emit_batched("state-changed")
         if stats_update:
-            self.idle_emit("resources-sampled")
+            self.idle_emit_batched("resources-sampled")
 
 
 ########################
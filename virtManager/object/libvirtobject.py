@@ -4,6 +4,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import hashlib
+
 from virtinst import log
 from virtinst import xmlutil
 
@@ -19,6 +21,11 @@ class vmmLibvirtObject(vmmGObject):
     _STATUS_ACTIVE = 1
     _STATUS_INACTIVE = 2
 
+    # Hit/miss counts for the parsed XML cache, across all objects.
+    # See get_xml_cache_stats
+    _xml_cache_hits = 0
+    _xml_cache_misses = 0
+
     def __init__(self, conn, backend, name, parseclass):
         vmmGObject.__init__(self)
         self._conn = conn
@@ -30,6 +37,7 @@ class vmmLibvirtObject(vmmGObject):
         self.__status = None
 
         self._xmlobj = None
+        self._xml_digest = None
         self._xmlobj_to_define = None
         self._is_xml_valid = False
 
@@ -37,6 +45,14 @@ class vmmLibvirtObject(vmmGObject):
         self._inactive_xml_flags = 0
         self._active_xml_flags = 0
 
+    @staticmethod
+    def get_xml_cache_stats():
+        """
+        Return (hits, misses) of the parsed XML cache, for debugging
+        """
+        return (vmmLibvirtObject._xml_cache_hits,
+                vmmLibvirtObject._xml_cache_misses)
+
     @staticmethod
     def log_redefine_xml_diff(obj, origxml, newxml):
         if origxml == newxml:
@@ -128,6 +144,7 @@ class vmmLibvirtObject(vmmGObject):
             self._name = oldname
             raise
         finally:
+            self.conn.object_renamed(self)
             self.__force_refresh_xml()
 
         self.set_autostart(oldautostart)
@@ -242,7 +259,7 @@ class vmmLibvirtObject(vmmGObject):
     # Public XML API #
     ##################
 
-    def recache_from_event_loop(self):
+    def recache_from_event_loop(self, force_signal=False):
         """
         Updates the VM status and XML, because we received an event from
         libvirt's event implementations. That's the only time this should
@@ -250,21 +267,31 @@ class vmmLibvirtObject(vmmGObject):
 
         We refresh status and XML because they are tied together in subtle
         ways, like runtime XML changing when a VM is started.
+
+        :param force_signal: Always emit state-changed. Lifecycle events
+            pass this, since they can carry changes we don't compare
+            here, like a new state reason. Otherwise state-changed is
+            only emitted if the XML or status changed, so event storms
+            (balloon changes, metadata, ...) don't redraw for nothing
         """
         try:
-            self.__force_refresh_xml(nosignal=True)
-            # status = None forces a signal to be emitted
+            xml_changed = self.__force_refresh_xml(nosignal=True)
+            oldstatus = self.__status
+            # status = None forces the status to be refetched
             self.__status = None
-            self._refresh_status()
+            self._refresh_status(cansignal=False)
+
+            if force_signal or xml_changed or self.__status != oldstatus:
+                self.idle_emit("state-changed")
         except Exception as e:
             # If we hit an exception here, it's often that the object
             # disappeared, so request the poll loop to be updated
             log.debug("Error refreshing %s from events: %s", self, e)
             poll_param = self._conn_tick_poll_param()
             if poll_param:
-                kwargs = {"force": True, poll_param: True}
-                log.debug("Scheduling priority tick with: %s", kwargs)
-                self.conn.schedule_priority_tick(**kwargs)
+                log.debug("Scheduling %s delta poll for %s",
+                        poll_param, self.get_name())
+                self.conn.schedule_delta_poll(poll_param, self.get_name())
 
     def ensure_latest_xml(self, nosignal=False):
         """
@@ -282,21 +309,31 @@ class vmmLibvirtObject(vmmGObject):
         Force an xml update. Signal 'state-changed' if domain xml has
         changed since last refresh
 
+        If the XML is byte identical to what we last parsed, the
+        existing xmlobj is kept rather than parsing it all over again.
+
         :param nosignal: If true, don't send state-changed. Used by
             callers that are going to send it anyways.
+        :returns: True if the XML changed
         """
-        origxml = None
-        if self._xmlobj:
-            origxml = self._xmlobj.get_xml()
-
         self._invalidate_xml()
         active_xml = self._XMLDesc(self._active_xml_flags)
+        digest = hashlib.sha256(active_xml.encode("utf-8")).digest()
+
+        if self._xmlobj and digest == self._xml_digest:
+            vmmLibvirtObject._xml_cache_hits += 1
+            self._is_xml_valid = True
+            return False
+
+        vmmLibvirtObject._xml_cache_misses += 1
         self._xmlobj = self._parseclass(self.conn.get_backend(),
             parsexml=active_xml)
+        self._xml_digest = digest
         self._is_xml_valid = True
 
-        if not nosignal and origxml != active_xml:
+        if not nosignal:
             self.idle_emit("state-changed")
+        return True
 
     def get_xmlobj(self, inactive=False, refresh_if_nec=True):
         """
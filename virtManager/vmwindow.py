@@ -135,7 +135,7 @@ class vmmVMWindow(vmmGObjectUI):
 
         # Deliberately keep all this after signal connection
         self.vm.connect("state-changed", self._vm_state_changed_cb)
-        self.vm.connect("resources-sampled", self._resources_sampled_cb)
+        self.conn.connect("vms-sampled", self._vms_sampled_cb)
 
         self._sync_console_page_menu_state()
         self._console_refresh_scaling_from_settings()
@@ -700,8 +700,8 @@ class vmmVMWindow(vmmGObjectUI):
         if self.is_visible():
             self._refresh_vm_state()
 
-    def _resources_sampled_cb(self, src):
-        if self.is_visible():
+    def _vms_sampled_cb(self, src, vms):
+        if self.vm in vms and self.is_visible():
             self._refresh_resources()
 
     def _console_page_changed_cb(self, src):
@@ -1787,6 +1787,7 @@ class ParserLocation(VirtCLIParser):
         cls.add_arg("location", "location", can_comma=True)
         cls.add_arg("kernel", "kernel", can_comma=True)
         cls.add_arg("initrd", "initrd", can_comma=True)
+        cls.add_arg("cache", "cache", is_onoff=True)
 
 
 def parse_location(optstr):
@@ -1795,11 +1796,13 @@ def parse_location(optstr):
             self.location = None
             self.kernel = None
             self.initrd = None
+            self.cache = True
     parsedata = LocationData()
     parser = ParserLocation(optstr or None)
     parser.parse(parsedata)
 
-    return parsedata.location, parsedata.kernel, parsedata.initrd
+    return (parsedata.location, parsedata.kernel, parsedata.initrd,
+            parsedata.cache)
 
 
 ########################
@@ -7,6 +7,7 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import concurrent.futures
 import re
 import os
 
@@ -46,7 +47,7 @@ def _replace_vm(conn, name):
         raise RuntimeError(msg) from None
 
 
-def _generate_clone_name(conn, basename):
+def _generate_clone_names(conn, basename, count):
     """
     If the orig name is "foo-clone", we don't want the clone to be
     "foo-clone-clone", we want "foo-clone1"
@@ -66,14 +67,43 @@ def _generate_clone_name(conn, basename):
         return generatename.check_libvirt_collision(
             conn.lookupByName, n)
     basename = basename + "-clone"
-    return generatename.generate_name(basename, cb,
-            sep="", start_num=start_num, force_num=force_num)
+    return generatename.generate_names(basename, cb, count,
+            sep="", start_num=start_num, force_num=force_num,
+            existing_names=generatename.libvirt_name_set(
+                conn.listAllDomains))
+
+
+def _generate_clone_name(conn, basename):
+    return _generate_clone_names(conn, basename, 1)[0]
+
+
+def _generate_template_names(conn, template, count):
+    """
+    Generate count names from a user template. '%d' in the template is
+    replaced with a number, otherwise '-NUM' is appended
+    """
+    prefix, suffix, sep = template, "", "-"
+    if "%d" in template:
+        prefix, suffix = template.split("%d", 1)
+        sep = ""
+
+    def cb(n):
+        return generatename.check_libvirt_collision(
+            conn.lookupByName, n)
+    return generatename.generate_names(prefix, cb, count,
+            suffix=suffix, sep=sep, force_num=True,
+            existing_names=generatename.libvirt_name_set(
+                conn.listAllDomains))
 
 
-def _generate_clone_disk_path(conn, origname, newname, origpath):
+def _generate_clone_disk_path(conn, origname, newname, origpath,
+                              reserved_paths=None):
     """
     Generate desired cloned disk path name, derived from the
     original path, original VM name, and proposed new VM name
+
+    :param reserved_paths: Paths already handed out to other clones
+        that don't exist yet, and must not be reused
     """
     if origpath is None:
         return None
@@ -99,8 +129,10 @@ def _generate_clone_disk_path(conn, origname, newname, origpath):
         clonebase = newname
 
     clonebase = os.path.join(dirname, clonebase)
+    reserved_paths = reserved_paths or ()
     def cb(p):
-        return DeviceDisk.path_definitely_exists(conn, p)
+        return (p in reserved_paths or
+                DeviceDisk.path_definitely_exists(conn, p))
     return generatename.generate_name(clonebase, cb, suffix=suffix)
 
 
@@ -289,34 +321,68 @@ class Cloner(object):
         return _generate_clone_name(conn, basename)
 
     @staticmethod
-    def generate_clone_disk_path(conn, origname, newname, origpath):
-        return _generate_clone_disk_path(conn, origname, newname, origpath)
+    def generate_clone_disk_path(conn, origname, newname, origpath,
+                                 reserved_paths=None):
+        return _generate_clone_disk_path(conn, origname, newname, origpath,
+                                         reserved_paths=reserved_paths)
 
     @staticmethod
     def build_clone_disk(orig_disk, clonepath, allow_create, sparse):
         return _build_clone_disk(orig_disk, clonepath, allow_create, sparse)
 
-    def __init__(self, conn, src_name=None, src_xml=None):
+    @staticmethod
+    def build_bulk(conn, count, src_name=None, src_xml=None,
+                   name_template=None):
+        """
+        Build a list of count Cloner instances for the same source VM.
+        The source is only looked up once, all the clone names are
+        generated in a single pass, and the cloners share the disk
+        paths they generate so they don't collide with each other.
+        Use start_bulk_duplicate to create them.
+
+        :param name_template: Template for the clone names, see
+            _generate_template_names. Default is to generate names
+            from the source VM name
+        """
+        first = Cloner(conn, src_name=src_name, src_xml=src_xml)
+        if name_template:
+            names = _generate_template_names(conn, name_template, count)
+        else:
+            names = _generate_clone_names(conn, first.src_name, count)
+        log.debug("Generated bulk clone names %s", names)
+
+        first.set_clone_name(names[0])
+        cloners = [first]
+        src_xml = first._src_guest.get_xml()
+        for name in names[1:]:
+            cloner = Cloner(conn, src_xml=src_xml, clone_name=name)
+            cloner._reserved_paths = first._reserved_paths
+            cloners.append(cloner)
+        return cloners
+
+    def __init__(self, conn, src_name=None, src_xml=None, clone_name=None):
         self.conn = conn
 
         self._src_guest = None
         self._new_guest = None
         self._diskinfos = []
         self._nvram_diskinfo = None
-        self._init_src(src_name, src_xml)
+        self._reserved_paths = set()
+        self._init_src(src_name, src_xml, clone_name)
 
         self._new_nvram_path = None
 
         self._sparse = True
         self._replace = False
         self._reflink = False
+        self._parallel = 1
 
 
     #################
     # Init routines #
     #################
 
-    def _init_src(self, src_name, src_xml):
+    def _init_src(self, src_name, src_xml, clone_name):
         """
         Set up the source VM info we are cloning, from passed in VM name
         or full XML
@@ -333,7 +399,7 @@ class Cloner(object):
 
         self._src_guest = Guest(self.conn, parsexml=src_xml)
         self._new_guest = Guest(self.conn, parsexml=src_xml)
-        self._init_new_guest()
+        self._init_new_guest(clone_name)
 
         # Collect disk info for every disk to determine if we will
         # default to cloning or not
@@ -349,7 +415,7 @@ class Cloner(object):
             old_nvram.set_source_path(self._new_guest.os.nvram)
             self._nvram_diskinfo = _CloneDiskInfo(old_nvram)
 
-    def _init_new_guest(self):
+    def _init_new_guest(self, clone_name):
         """
         Perform the series of unconditional new VM changes we always make
         """
@@ -376,9 +442,10 @@ class Cloner(object):
                 channel.target_name in channel.source.path):
                 channel.source.path = None
 
-        new_name = Cloner.generate_clone_name(self.conn, self.src_name)
-        log.debug("Auto-generated clone name '%s'", new_name)
-        self.set_clone_name(new_name)
+        if not clone_name:
+            clone_name = Cloner.generate_clone_name(self.conn, self.src_name)
+            log.debug("Auto-generated clone name '%s'", clone_name)
+        self.set_clone_name(clone_name)
 
 
     ##############
@@ -431,6 +498,12 @@ class Cloner(object):
         """
         self._sparse = flg
 
+    def set_parallel(self, count):
+        """
+        Clone up to this many disks concurrently
+        """
+        self._parallel = max(1, int(count))
+
     def get_diskinfos(self):
         """
         Return the list of _CloneDiskInfo instances
@@ -508,8 +581,11 @@ class Cloner(object):
                 newpath = Cloner.generate_clone_disk_path(
                          self.conn, self.src_name,
                          self.new_guest.name,
-                         orig_disk.get_source_path())
+                         orig_disk.get_source_path(),
+                         reserved_paths=self._reserved_paths)
                 diskinfo.set_new_path(newpath, self._sparse)
+                if newpath:
+                    self._reserved_paths.add(newpath)
                 if not diskinfo.new_disk:
                     # We hit an error, clients will raise it later
                     continue
@@ -541,6 +617,84 @@ class Cloner(object):
                 self._new_guest.get_xml())
         log.debug("Clone guest xml diff:\n%s", diff)
 
+    def _build_storage_parallel(self, new_disks, meter):
+        """
+        Build storage for new_disks with up to self._parallel workers,
+        reporting their combined progress to meter. If any worker fails,
+        no further copies are started, and the first error is raised
+        once the running ones finish.
+        """
+        size = sum(int((d.get_size() or 0) * 1024 * 1024 * 1024)
+                   for d in new_disks)
+        aggmeter = progress.AggregateMeter(meter,
+                _("Cloning %(count)s disks") % {"count": len(new_disks)},
+                size)
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._parallel,
+                thread_name_prefix="Cloning disk") as executor:
+            futures = [executor.submit(d.build_storage,
+                                       aggmeter.get_sub_meter())
+                       for d in new_disks]
+            dummy, notdone = concurrent.futures.wait(futures,
+                    return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in notdone:
+                future.cancel()
+
+        aggmeter.end()
+        for future in futures:
+            if not future.cancelled():
+                future.result()
+
+    def _remove_new_storage(self, new_disks, local_paths):
+        """
+        Best effort cleanup of storage created by a failed duplicate
+
+        :param local_paths: Paths of manually cloned files that didn't
+            exist before cloning started, and may be partially written
+        """
+        for new_disk in new_disks:
+            path = new_disk.get_source_path()
+            try:
+                vol = new_disk.get_vol_object()
+                if new_disk.storage_was_created and vol:
+                    log.debug("Removing cloned volume %s", path)
+                    vol.delete(0)
+                elif path in local_paths and os.path.exists(path):
+                    log.debug("Removing cloned file %s", path)
+                    os.unlink(path)
+            except Exception:  # pragma: no cover
+                log.debug("Error removing cloned storage %s",
+                        path, exc_info=True)
+
+    def _collect_new_disks(self, new_disks, local_paths):
+        """
+        Append the disks start_duplicate needs to build to new_disks,
+        and the local paths they will newly create to local_paths
+        """
+        diskinfos = self.get_diskinfos()
+        if self._nvram_diskinfo:
+            diskinfos.append(self._nvram_diskinfo)
+
+        for diskinfo in diskinfos:
+            if not diskinfo.is_clone_requested():
+                continue
+            new_disk = diskinfo.new_disk
+            path = new_disk.get_source_path()
+            if (path and new_disk.wants_storage_creation() and
+                not new_disk.get_vol_install() and
+                not os.path.exists(path)):
+                local_paths.append(path)
+            new_disks.append(new_disk)
+
+    def _define(self):
+        # Replace orig VM if required
+        if self._replace:
+            _replace_vm(self.conn, self._new_guest.name)
+
+        # Define domain early to catch any xml errors before duping storage
+        return self.conn.defineXML(self._new_guest.get_xml())
+
     def start_duplicate(self, meter=None):
         """
         Actually perform the duplication: cloning disks if needed and defining
@@ -550,26 +704,50 @@ class Cloner(object):
         meter = progress.ensure_meter(meter)
 
         dom = None
+        new_disks = []
+        local_paths = []
         try:
-            # Replace orig VM if required
-            if self._replace:
-                _replace_vm(self.conn, self._new_guest.name)
-
-            # Define domain early to catch any xml errors before duping storage
-            dom = self.conn.defineXML(self._new_guest.get_xml())
-
-            diskinfos = self.get_diskinfos()
-            if self._nvram_diskinfo:
-                diskinfos.append(self._nvram_diskinfo)
-
-            for diskinfo in diskinfos:
-                if not diskinfo.is_clone_requested():
-                    continue
-                diskinfo.new_disk.build_storage(meter)
+            dom = self._define()
+            self._collect_new_disks(new_disks, local_paths)
+
+            if self._parallel > 1 and len(new_disks) > 1:
+                self._build_storage_parallel(new_disks, meter)
+            else:
+                for new_disk in new_disks:
+                    new_disk.build_storage(meter)
         except Exception as e:
             log.debug("Duplicate failed: %s", str(e))
+            self._remove_new_storage(new_disks, local_paths)
             if dom:
                 dom.undefine()
             raise
 
         log.debug("Duplicating finished.")
+
+    @staticmethod
+    def start_bulk_duplicate(cloners, meter=None):
+        """
+        start_duplicate for a list of prepared cloners, like those from
+        build_bulk. Every clone is defined first, then all the storage
+        is built together, so each local source disk is read only once
+        for all the clones. If anything fails, every clone is removed.
+        """
+        log.debug("Starting bulk duplicate of %d clones.", len(cloners))
+        meter = progress.ensure_meter(meter)
+
+        doms = []
+        new_disks = []
+        local_paths = []
+        try:
+            for cloner in cloners:
+                doms.append(cloner._define())
+                cloner._collect_new_disks(new_disks, local_paths)
+            DeviceDisk.build_storage_many(new_disks, meter)
+        except Exception as e:
+            log.debug("Bulk duplicate failed: %s", str(e))
+            cloners[0]._remove_new_storage(new_disks, local_paths)
+            for dom in doms:
+                dom.undefine()
+            raise
+
+        log.debug("Bulk duplicating finished.")
@@ -31,6 +31,67 @@ def _real_local_libvirt_version():
     return getattr(libvirt, key)
 
 
+def _index_vols_by_path(vols):
+    ret = {}
+    for vol in vols:
+        if vol.target_path:
+            ret.setdefault(vol.target_path, vol)
+    return ret
+
+
+def _index_vols_by_backing_store(vols):
+    return dict((vol.backing_store, vol)
+                for vol in vols if vol.backing_store)
+
+
+def _index_domains_by_path(domains):
+    """
+    Map every path a domain references to a list of
+    (domain index, Guest, DeviceDisk) tuples. Kernel, initrd and dtb
+    paths are listed with a DeviceDisk of None
+    """
+    ret = {}
+    for idx, guest in enumerate(domains):
+        for path in [guest.os.kernel, guest.os.initrd, guest.os.dtb]:
+            if path:
+                ret.setdefault(path, []).append((idx, guest, None))
+        for disk in guest.devices.disk:
+            path = disk.get_source_path()
+            if path:
+                ret.setdefault(path, []).append((idx, guest, disk))
+    return ret
+
+
+def _index_pools_by_name(pools):
+    ret = {}
+    for pool in pools:
+        ret.setdefault(pool.name, pool)
+    return ret
+
+
+def _index_pools_by_target_path(pools):
+    ret = {}
+    for pool in pools:
+        if pool.target_path is not None:
+            ret.setdefault(os.path.abspath(pool.target_path), pool)
+    return ret
+
+
+def _index_nodedevs_by_name(nodedevs):
+    ret = {}
+    for nodedev in nodedevs:
+        ret.setdefault(nodedev.name, nodedev)
+    return ret
+
+
+def _index_nodedevs_by_address(nodedevs):
+    ret = {}
+    for nodedev in nodedevs:
+        for key in nodedev.get_address_keys():
+            ret.setdefault(key, []).append(nodedev)
+    return ret
+
+
 class VirtinstConnection(object):
     """
     Wrapper for libvirt connection that provides various bits like
@@ -77,6 +138,7 @@ class VirtinstConnection(object):
         self._caps = None
 
         self._fetch_cache = {}
+        self._fetch_index_cache = {}
 
         # These let virt-manager register a callback which provides its
         # own cached object lists, rather than doing fresh calls
@@ -124,6 +186,7 @@ class VirtinstConnection(object):
         self._libvirtconn = None
         self._uri = None
         self._fetch_cache = {}
+        self._fetch_index_cache = {}
         return ret
 
     def fake_conn_predictable(self):
@@ -176,8 +239,27 @@ class VirtinstConnection(object):
         if override_cb:
             return override_cb()  # pragma: no cover
         if key not in self._fetch_cache:
-            self._fetch_cache[key] = raw_cb()
-        return self._fetch_cache[key][:]
+            self._fetch_cache[key] = tuple(raw_cb())
+        return self._fetch_cache[key]
+
+    def _fetch_index(self, indexname, objs, build_cb):
+        """
+        Return a secondary index over the fetched objs, as built by
+        build_cb. The index is only rebuilt when objs doesn't hold the
+        exact objects the cached index was built from, which happens
+        when the fetch cache is refilled or extended. virt-manager's
+        fetch callbacks return a new list on every call, but of the same
+        cached objects, so those are compared by identity too.
+        """
+        objs = tuple(objs)
+        cached = self._fetch_index_cache.get(indexname)
+        if cached and (cached[0] is objs or
+                       (len(cached[0]) == len(objs) and
+                        all(a is b for a, b in zip(cached[0], objs)))):
+            return cached[1]
+        index = build_cb(objs)
+        self._fetch_index_cache[indexname] = (objs, index)
+        return index
 
     def _fetch_all_domains_raw(self):
         dummy1, dummy2, ret = pollhelpers.fetch_vms(
@@ -252,14 +334,13 @@ class VirtinstConnection(object):
             # so there's nothing to do
             return
 
-        poollist = self._fetch_cache[self._FETCH_KEY_POOLS]
         poolxmlobj = self._build_pool_raw(poolobj)
-        poollist.append(poolxmlobj)
+        self._fetch_cache[self._FETCH_KEY_POOLS] += (poolxmlobj,)
 
         if self._FETCH_KEY_VOLS not in self._fetch_cache:
             return
-        vollist = self._fetch_cache[self._FETCH_KEY_VOLS]
-        vollist.extend(self._fetch_vols_raw(poolxmlobj))
+        self._fetch_cache[self._FETCH_KEY_VOLS] += tuple(
+                self._fetch_vols_raw(poolxmlobj))
 
     def cache_new_pool(self, poolobj):
         """
@@ -272,7 +353,7 @@ class VirtinstConnection(object):
 
     def fetch_all_domains(self):
         """
-        Returns a list of Guest() objects
+        Returns a sequence of Guest() objects
         """
         return self._fetch_helper(
                 self._FETCH_KEY_DOMAINS,
@@ -281,7 +362,7 @@ class VirtinstConnection(object):
 
     def fetch_all_pools(self):
         """
-        Returns a list of StoragePool objects
+        Returns a sequence of StoragePool objects
         """
         return self._fetch_helper(
                 self._FETCH_KEY_POOLS,
@@ -290,7 +371,7 @@ class VirtinstConnection(object):
 
     def fetch_all_vols(self):
         """
-        Returns a list of StorageVolume objects
+        Returns a sequence of StorageVolume objects
         """
         return self._fetch_helper(
                 self._FETCH_KEY_VOLS,
@@ -299,7 +380,7 @@ class VirtinstConnection(object):
 
     def fetch_all_nodedevs(self):
         """
-        Returns a list of NodeDevice() objects
+        Returns a sequence of NodeDevice() objects
         """
         return self._fetch_helper(
                 self._FETCH_KEY_NODEDEVS,
@@ -307,6 +388,70 @@ class VirtinstConnection(object):
                 self.cb_fetch_all_nodedevs)
 
 
+    #######################
+    # Fetch cache lookups #
+    #######################
+
+    def lookup_vol_by_path(self, path):
+        """
+        Return the StorageVolume with target path=path, or None
+        """
+        index = self._fetch_index("vols-by-path",
+                self.fetch_all_vols(), _index_vols_by_path)
+        return index.get(path)
+
+    def lookup_vol_by_backing_store(self, path):
+        """
+        Return a StorageVolume whose backing store is path, or None
+        """
+        index = self._fetch_index("vols-by-backing-store",
+                self.fetch_all_vols(), _index_vols_by_backing_store)
+        return index.get(path)
+
+    def lookup_domains_by_path(self, path):
+        """
+        Return a list of (domain index, Guest, DeviceDisk) tuples for
+        every domain referencing path. DeviceDisk is None if the path
+        is the domain's kernel, initrd or dtb
+        """
+        index = self._fetch_index("domains-by-path",
+                self.fetch_all_domains(), _index_domains_by_path)
+        return index.get(path, [])
+
+    def lookup_pool_by_name(self, name):
+        """
+        Return the StoragePool named name, or None
+        """
+        index = self._fetch_index("pools-by-name",
+                self.fetch_all_pools(), _index_pools_by_name)
+        return index.get(name)
+
+    def lookup_pool_by_target_path(self, path):
+        """
+        Return the StoragePool with the absolute target path=path, or None
+        """
+        index = self._fetch_index("pools-by-target-path",
+                self.fetch_all_pools(), _index_pools_by_target_path)
+        return index.get(path)
+
+    def lookup_nodedev_by_name(self, name):
+        """
+        Return the NodeDevice named name, or None
+        """
+        index = self._fetch_index("nodedevs-by-name",
+                self.fetch_all_nodedevs(), _index_nodedevs_by_name)
+        return index.get(name)
+
+    def lookup_nodedevs_by_address(self, key):
+        """
+        Return a list of NodeDevices matching the passed address key,
+        see NodeDevice.get_address_keys
+        """
+        index = self._fetch_index("nodedevs-by-address",
+                self.fetch_all_nodedevs(), _index_nodedevs_by_address)
+        return index.get(key, [])
+
+
     #########################
     # Libvirt API overrides #
     #########################
@@ -300,43 +300,37 @@ class DeviceDisk(Device):
 
         # Find all volumes that have 'path' somewhere in their backing chain
         vols = []
-        volmap = dict((vol.backing_store, vol)
-                      for vol in conn.fetch_all_vols() if vol.backing_store)
         backpath = path
-        while backpath in volmap:
-            vol = volmap[backpath]
-            if vol in vols:
+        while True:
+            vol = conn.lookup_vol_by_backing_store(backpath)
+            if not vol:
+                break
+            if vol.target_path in vols:
                 break  # pragma: no cover
             backpath = vol.target_path
             vols.append(backpath)
 
-        ret = []
-        vms = conn.fetch_all_domains()
-        for vm in vms:
-            if not read_only:
-                if path in [vm.os.kernel, vm.os.initrd, vm.os.dtb]:
-                    ret.append(vm.name)
-                    continue
-
-            for disk in vm.devices.disk:
-                checkpath = disk.get_source_path()
-                if checkpath in vols and vm.name not in ret:
-                    # VM uses the path indirectly via backing store
-                    ret.append(vm.name)
-                    break
-
-                if checkpath != path:
-                    continue
-
-                if shareable and disk.shareable:
-                    continue
-                if read_only and disk.read_only:
-                    continue
+        # Maps domain index in fetch_all_domains() -> domain name, so
+        # the result keeps the order of the domain list
+        found = {}
+        for idx, vm, disk in conn.lookup_domains_by_path(path):
+            if not disk:
+                if not read_only:
+                    found[idx] = vm.name
+                continue
+            if shareable and disk.shareable:
+                continue
+            if read_only and disk.read_only:
+                continue
+            found[idx] = vm.name
 
-                ret.append(vm.name)
-                break
+        for volpath in vols:
+            # VM uses the path indirectly via backing store
+            for idx, vm, disk in conn.lookup_domains_by_path(volpath):
+                if disk:
+                    found[idx] = vm.name
 
-        return ret
+        return [found[idx] for idx in sorted(found)]
 
     @staticmethod
     def build_vol_install(conn, volname, poolobj, size, sparse,
@@ -788,6 +782,31 @@ class DeviceDisk(Device):
         parent_pool = self.get_vol_install().pool
         self._change_backend(None, vol_object, parent_pool)
 
+    @staticmethod
+    def build_storage_many(disks, meter):
+        """
+        build_storage for a list of disks. Disks manually cloning the
+        same local file (see set_local_disk_to_clone) are cloned in a
+        single pass that reads the source only once
+        """
+        meter = progress.ensure_meter(meter)
+        clonegroups = {}
+        for disk in disks:
+            # pylint: disable=protected-access
+            backend = disk._storage_backend
+            if not isinstance(backend, diskbackend.CloneStorageCreator):
+                disk.build_storage(meter)
+                continue
+            key = (backend.get_input_path(), backend.get_size())
+            clonegroups.setdefault(key, []).append(disk)
+
+        for group in clonegroups.values():
+            # pylint: disable=protected-access
+            diskbackend.CloneStorageCreator.create_many(
+                    [d._storage_backend for d in group], meter)
+            for disk in group:
+                disk.storage_was_created = True
+
 
     ######################
     # validation helpers #
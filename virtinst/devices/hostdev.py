@@ -31,24 +31,16 @@ class DeviceHostdev(Device):
             self.vendor = nodedev.vendor_id
             self.product = nodedev.product_id
 
-            count = 0
-            for dev in self.conn.fetch_all_nodedevs():
-                if (dev.device_type == NodeDevice.CAPABILITY_TYPE_USBDEV and
-                    dev.vendor_id == self.vendor and
-                    dev.product_id == self.product):
-                    count += 1
+            # Only bake in the bus address if vendor:product is ambiguous
+            count = len(self.conn.lookup_nodedevs_by_address(
+                nodedev.get_usb_id_key()))
 
             if count > 1:
                 self.bus = nodedev.bus
                 self.device = nodedev.device
 
         elif nodedev.device_type == nodedev.CAPABILITY_TYPE_NET:
-            founddev = None
-            for checkdev in self.conn.fetch_all_nodedevs():
-                if checkdev.name == nodedev.parent:
-                    founddev = checkdev
-                    break
-
+            founddev = self.conn.lookup_nodedev_by_name(nodedev.parent)
             self.set_from_nodedev(founddev)
 
         elif nodedev.device_type == nodedev.CAPABILITY_TYPE_SCSIDEV:
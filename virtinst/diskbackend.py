@@ -6,6 +6,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import errno
+import fcntl
 import os
 import re
 import stat
@@ -181,9 +183,9 @@ def path_is_network_vol(conn, path):
     """
     Detect if path is a network volume such as rbd, gluster, etc
     """
-    for volxml in conn.fetch_all_vols():
-        if path and volxml.target_path == path:
-            return volxml.type == "network"
+    volxml = path and conn.lookup_vol_by_path(path)
+    if volxml:
+        return volxml.type == "network"
     return False
 
 
@@ -505,6 +507,207 @@ class ManagedStorageCreator(_StorageCreator):
         return float(self._vol_install.capacity) / 1024.0 / 1024.0 / 1024.0
 
 
+# FICLONE ioctl request number, from linux/fs.h
+_FICLONE = 0x40049409
+
+# errnos meaning a fast copy method isn't supported for the passed
+# files, and we should fall back to something simpler
+_COPY_UNSUPPORTED_ERRNOS = [errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                            errno.EOPNOTSUPP, errno.ENOTTY, errno.EBADF]
+
+
+class _LocalFileCopier(object):
+    """
+    Copy data from one open file descriptor to one or more destination
+    descriptors as cheaply as the host allows, reporting progress
+    through progress_cb(offset). With several destinations, data that
+    has to pass through userspace is read once and written to all of them.
+
+    :param bufsize: Size of the buffer used when data has to pass
+        through userspace. It's allocated once per copier
+    """
+    # Granularity at which sparse copies look for zeroed data
+    SPARSE_BLOCK_SIZE = 4096
+
+    def __init__(self, src_fd, dst_fds, progress_cb, bufsize):
+        self._src_fd = src_fd
+        self._dst_fds = list(dst_fds)
+        self._progress_cb = progress_cb
+        self._buf = bytearray(bufsize)
+        self._zeros = bytes(self.SPARSE_BLOCK_SIZE)
+
+    def _get_src_size(self):
+        return os.lseek(self._src_fd, 0, os.SEEK_END)
+
+    def _pwrite_all(self, dst_fds, data, offset):
+        for dst_fd in dst_fds:
+            pos = offset
+            remaining = data
+            while remaining:
+                written = os.pwrite(dst_fd, remaining, pos)
+                remaining = remaining[written:]
+                pos += written
+
+    def _reflink(self, dst_fd):
+        """
+        Share the source's extents with the destination via FICLONE.
+        Only works within a single btrfs/xfs/... filesystem
+        """
+        try:
+            fcntl.ioctl(dst_fd, _FICLONE, self._src_fd)
+            return True
+        except OSError as e:
+            log.debug("FICLONE not available: %s", e)
+            return False
+
+    def _get_data_extents(self, size):
+        """
+        Return a list of (start, end) ranges that contain data, using
+        SEEK_DATA/SEEK_HOLE. Filesystems without hole tracking report
+        the whole file as a single data extent.
+        """
+        if not hasattr(os, "SEEK_DATA"):
+            return [(0, size)]
+
+        extents = []
+        offset = 0
+        while offset < size:
+            try:
+                start = os.lseek(self._src_fd, offset, os.SEEK_DATA)
+            except OSError as e:
+                if e.errno == errno.ENXIO:
+                    # No data past offset
+                    break
+                if e.errno in _COPY_UNSUPPORTED_ERRNOS:
+                    return [(0, size)]
+                raise  # pragma: no cover
+            end = os.lseek(self._src_fd, start, os.SEEK_HOLE)
+            extents.append((start, min(end, size)))
+            offset = end
+        return extents
+
+    def _copy_in_kernel(self, copyfunc, dst_fd, offset, end):
+        """
+        Copy [offset, end) with copyfunc(dst_fd, offset, count), a wrapper
+        around copy_file_range or sendfile. Returns the offset reached,
+        which is short of end if copyfunc isn't supported here.
+        """
+        while offset < end:
+            try:
+                count = copyfunc(dst_fd, offset, min(end - offset, 1 << 30))
+            except OSError as e:
+                if e.errno not in _COPY_UNSUPPORTED_ERRNOS:
+                    raise  # pragma: no cover
+                log.debug("In kernel copy not available: %s", e)
+                break
+            if count == 0:
+                break  # pragma: no cover
+            offset += count
+            self._progress_cb(offset)
+        return offset
+
+    def _copy_file_range(self, dst_fd, offset, count):
+        return os.copy_file_range(self._src_fd, dst_fd, count,
+                                  offset, offset)
+
+    def _sendfile(self, dst_fd, offset, count):
+        # sendfile writes at the current destination file offset
+        os.lseek(dst_fd, offset, os.SEEK_SET)
+        return os.sendfile(dst_fd, self._src_fd, offset, count)
+
+    def _write_sparse(self, dst_fds, view, offset):
+        """
+        Write out view at offset, skipping SPARSE_BLOCK_SIZE blocks
+        that are entirely zero. Runs of data blocks are coalesced into
+        a single write.
+        """
+        # view is always the head of self._buf, so compare slices of the
+        # bytearray directly, which is much quicker than memoryview ==
+        blocksize = self.SPARSE_BLOCK_SIZE
+        runstart = None
+        for pos in range(0, len(view), blocksize):
+            iszero = self._buf[pos:pos + blocksize] == self._zeros
+            if iszero and runstart is not None:
+                self._pwrite_all(dst_fds, view[runstart:pos],
+                                 offset + runstart)
+                runstart = None
+            elif not iszero and runstart is None:
+                runstart = pos
+        if runstart is not None:
+            self._pwrite_all(dst_fds, view[runstart:], offset + runstart)
+
+    def _copy_buffered(self, dst_fds, offset, end, sparse):
+        """
+        Copy [offset, end) through our reused buffer. If end is None,
+        copy until EOF
+        """
+        view = memoryview(self._buf)
+        while end is None or offset < end:
+            want = len(self._buf)
+            if end is not None:
+                want = min(want, end - offset)
+            count = os.preadv(self._src_fd, [view[:want]], offset)
+            if count == 0:
+                break
+            if sparse:
+                self._write_sparse(dst_fds, view[:count], offset)
+            else:
+                self._pwrite_all(dst_fds, view[:count], offset)
+            offset += count
+            self._progress_cb(offset)
+        return offset
+
+    def copy_sparse(self, min_size):
+        """
+        Copy only the data of the source, leaving holes in the
+        destinations wherever the source has holes or zeroed blocks
+
+        :param min_size: Extend the destinations to at least this size
+        """
+        size = self._get_src_size()
+        dst_fds = [fd for fd in self._dst_fds if not self._reflink(fd)]
+        if dst_fds:
+            self._copy_data_extents(dst_fds, size)
+        else:
+            self._progress_cb(size)
+
+        min_size = max(min_size, size)
+        for dst_fd in self._dst_fds:
+            if os.fstat(dst_fd).st_size < min_size:
+                os.ftruncate(dst_fd, min_size)
+
+    def _copy_data_extents(self, dst_fds, size):
+        extents = self._get_data_extents(size)
+
+        # If the filesystem reported holes, trust them and let the
+        # kernel copy the data extents. Otherwise we need to look for
+        # zeroed blocks ourselves, like a preallocated raw image.
+        # With several destinations, reading the source once beats
+        # one in kernel copy per destination.
+        use_kernel = (hasattr(os, "copy_file_range") and
+                      len(dst_fds) == 1 and
+                      extents != [(0, size)])
+        for start, end in extents:
+            self._progress_cb(start)
+            if use_kernel:
+                start = self._copy_in_kernel(self._copy_file_range,
+                                             dst_fds[0], start, end)
+            self._copy_buffered(dst_fds, start, end, True)
+
+    def copy_full(self):
+        """
+        Copy every byte of the source, fully allocating the destinations
+        """
+        # Not copy_file_range here: it can reflink, which would
+        # preserve holes in the destination
+        offset = 0
+        size = self._get_src_size()
+        if size and len(self._dst_fds) == 1:
+            offset = self._copy_in_kernel(self._sendfile,
+                                          self._dst_fds[0], offset, size)
+        self._copy_buffered(self._dst_fds, offset, None, False)
+
+
 class CloneStorageCreator(_StorageCreator):
     """
     Handles manually copying local files for Cloner
@@ -512,6 +715,9 @@ class CloneStorageCreator(_StorageCreator):
     Many clone scenarios will use libvirt storage APIs, which will use
     the ManagedStorageCreator
     """
+    # Buffer size used when cloned data has to pass through userspace
+    CLONE_BUFFER_SIZE = 1024 * 1024 * 16
+
     def __init__(self, conn, output_path, input_path, size, sparse):
         _StorageCreator.__init__(self, conn)
 
@@ -561,87 +767,84 @@ class CloneStorageCreator(_StorageCreator):
         if msg:
             log.warning(msg)  # pragma: no cover
 
+    def get_input_path(self):
+        return self._input_path
+
     def create(self, meter):
+        CloneStorageCreator.create_many([self], meter)
+
+    @staticmethod
+    def create_many(creators, meter):
+        """
+        Run several CloneStorageCreators with the same input path and
+        size, reading the input only once and writing every output
+        from the same pass
+        """
+        first = creators[0]
         text = (_("Cloning %(srcfile)s") %
-                {'srcfile': os.path.basename(self._input_path)})
+                {'srcfile': os.path.basename(first.get_input_path())})
 
-        size_bytes = int(self.get_size() * 1024 * 1024 * 1024)
+        size_bytes = int(first.get_size() * 1024 * 1024 * 1024)
         meter.start(text, size_bytes)
 
         # Plain file clone
-        self._clone_local(meter, size_bytes)
+        first._clone_local(meter, size_bytes,
+                           [c._output_path for c in creators],
+                           all(c._sparse for c in creators))
 
-    def _clone_local(self, meter, size_bytes):
+    def _clone_local(self, meter, size_bytes, output_paths, sparse):
         if self._input_path == "/dev/null":  # pragma: no cover
             # Not really sure why this check is here,
             # but keeping for compat
             log.debug("Source dev was /dev/null. Skipping")
             return
-        if self._input_path == self._output_path:
+        if self._input_path in output_paths:
             log.debug("Source and destination are the same. Skipping.")
-            return
+            output_paths = [p for p in output_paths
+                            if p != self._input_path]
+            if not output_paths:
+                return
 
         # If a destination file exists and sparse flag is True,
         # this priority takes an existing file.
+        sparse = (sparse and
+                  not any(os.path.exists(p) for p in output_paths))
 
-        if (not os.path.exists(self._output_path) and self._sparse):
-            clone_block_size = 4096
-            sparse = True
-            fd = None
-            try:
-                fd = os.open(self._output_path, os.O_WRONLY | os.O_CREAT,
-                             0o640)
-                os.ftruncate(fd, size_bytes)
-            finally:
-                if fd:
-                    os.close(fd)
-        else:
-            clone_block_size = 1024 * 1024 * 10
-            sparse = False
-
-        log.debug("Local Cloning %s to %s, sparse=%s, block_size=%s",
-                      self._input_path, self._output_path,
-                      sparse, clone_block_size)
+        log.debug("Local Cloning %s to %s, sparse=%s, buffer_size=%s",
+                      self._input_path, ", ".join(output_paths),
+                      sparse, self.CLONE_BUFFER_SIZE)
 
-        zeros = b'\0' * 4096
+        def _progress_cb(offset):
+            if offset < size_bytes:
+                meter.update(offset)
 
-        src_fd, dst_fd = None, None
+        src_fd, dst_fds = None, []
         try:
             try:
                 src_fd = os.open(self._input_path, os.O_RDONLY)
-                dst_fd = os.open(self._output_path,
-                                 os.O_WRONLY | os.O_CREAT, 0o640)
-
-                i = 0
-                while 1:
-                    l = os.read(src_fd, clone_block_size)
-                    s = len(l)
-                    if s == 0:
-                        meter.end()
-                        break
-                    # check sequence of zeros
-                    if sparse and zeros == l:
-                        os.lseek(dst_fd, s, 1)
-                    else:
-                        b = os.write(dst_fd, l)
-                        if s != b:  # pragma: no cover
-                            meter.end()
-                            break
-                    i += s
-                    if i < size_bytes:
-                        meter.update(i)
+                for path in output_paths:
+                    dst_fds.append(os.open(path,
+                                   os.O_WRONLY | os.O_CREAT, 0o640))
+
+                copier = _LocalFileCopier(src_fd, dst_fds, _progress_cb,
+                                          self.CLONE_BUFFER_SIZE)
+                if sparse:
+                    copier.copy_sparse(size_bytes)
+                else:
+                    copier.copy_full()
+                meter.end()
             except OSError as e:  # pragma: no cover
                 log.debug("Error while cloning", exc_info=True)
                 msg = (_("Error cloning diskimage "
                          "%(inputpath)s to %(outputpath)s: %(error)s") %
                          {"inputpath": self._input_path,
-                          "outputpath": self._output_path,
+                          "outputpath": ", ".join(output_paths),
                           "error": str(e)})
                 raise RuntimeError(msg) from None
         finally:
             if src_fd is not None:
                 os.close(src_fd)
-            if dst_fd is not None:
+            for dst_fd in dst_fds:
                 os.close(dst_fd)
 
 
@@ -7,6 +7,8 @@
 
 import libvirt
 
+from .logger import log
+
 
 def check_libvirt_collision(collision_cb, val):
     """
@@ -24,8 +26,23 @@ def check_libvirt_collision(collision_cb, val):
     return check
 
 
+def libvirt_name_set(list_cb):
+    """
+    Return the set of names of all objects returned by list_cb, a
+    listAll* style libvirt API, for passing to generate_name as
+    existing_names. Returns None if listing fails, so callers fall
+    back to their per name collision_cb
+    """
+    try:
+        return set(obj.name() for obj in list_cb())
+    except libvirt.libvirtError as e:
+        log.debug("Error listing names, falling back to lookups: %s", e)
+        return None
+
+
 def generate_name(base, collision_cb, suffix="",
-                  start_num=1, sep="-", force_num=False):
+                  start_num=1, sep="-", force_num=False,
+                  existing_names=None):
     """
     Generate a new name from the passed base string, verifying it doesn't
     collide with the collision callback.
@@ -46,14 +63,68 @@ def generate_name(base, collision_cb, suffix="",
     :param sep: The separator to use between the basename and the
         generated number (default is "-")
     :param force_num: Force the generated name to always end with a number
+    :param existing_names: Collection of all names already in use, like
+        from libvirt_name_set. If passed, collision_cb isn't used, and
+        the free name is computed locally rather than checking every
+        candidate with a callback
+    """
+    return generate_names(base, collision_cb, 1, suffix=suffix,
+            start_num=start_num, sep=sep, force_num=force_num,
+            existing_names=existing_names)[0]
+
+
+def _generate_names_from_set(base, existing_names, count, suffix,
+                             start_num, sep, force_num):
+    """
+    Set based generate_names. Collect the numbers already used
+    with this base/sep/suffix, then hand out the lowest free ones,
+    so the work is linear in the number of existing names
+    """
+    ret = []
+    if not force_num and base + suffix not in existing_names:
+        ret.append(base + suffix)
+
+    prefix = base + sep
+    usednums = set()
+    for name in existing_names:
+        if (len(name) <= len(prefix) + len(suffix) or
+            not name.startswith(prefix) or
+            not name.endswith(suffix)):
+            continue
+        numstr = name[len(prefix):len(name) - len(suffix)]
+        # Only canonical numbers collide: 'foo-01' isn't 'foo-1'.
+        # isdigit() also accepts things like '\u00b2' that int() rejects
+        if numstr.isdecimal() and str(int(numstr)) == numstr:
+            usednums.add(int(numstr))
+
+    num = start_num
+    while len(ret) < count:
+        if num not in usednums:
+            ret.append("%s%s%d%s" % (base, sep, num, suffix))
+        num += 1
+    return ret
+
+
+def generate_names(base, collision_cb, count, suffix="",
+                   start_num=1, sep="-", force_num=False,
+                   existing_names=None):
+    """
+    Like generate_name, but return a list of count distinct names,
+    found in a single pass over the candidates. Used when creating
+    several objects at once, before any of them exist.
+
+    :param count: Number of names to generate
     """
     base = str(base)
+    if existing_names is not None:
+        return _generate_names_from_set(base, set(existing_names), count,
+                suffix, start_num, sep, force_num)
 
     numrange = list(range(start_num, start_num + 100000))
     if not force_num:
         numrange = [None] + numrange
 
-    ret = None
+    ret = []
     for i in numrange:
         tryname = base
         if i is not None:
@@ -61,8 +132,9 @@ def generate_name(base, collision_cb, suffix="",
         tryname += suffix
 
         if not collision_cb(tryname):
-            ret = tryname
-            break
+            ret.append(tryname)
+            if len(ret) == count:
+                break
 
-    assert ret
+    assert len(ret) == count
     return ret
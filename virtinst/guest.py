@@ -136,7 +136,9 @@ class Guest(XMLBuilder):
                 guest.conn.lookupByName, n)
         return generatename.generate_name(basename, cb,
             start_num=force_num and 1 or 2, force_num=force_num,
-            sep=not force_num and "-" or "")
+            sep=not force_num and "-" or "",
+            existing_names=generatename.libvirt_name_set(
+                guest.conn.listAllDomains))
 
 
     @staticmethod
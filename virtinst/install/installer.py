@@ -41,6 +41,8 @@ class Installer(object):
     :param location_kernel: URL pointing to a kernel to fetch, or a relative
         path to indicate where the kernel is stored in location
     :param location_initrd: location_kernel, but pointing to an initrd
+    :param location_cache: If False, don't use the persistent cache of
+        files fetched from an install tree URL
     :param install_kernel: Kernel to install off of
     :param install_initrd: Initrd to install off of
     :param install_kernel_args: Kernel args <cmdline> to use. This overwrites
@@ -50,7 +52,7 @@ class Installer(object):
         an install phase. We are just using it to create the initial XML.
     """
     def __init__(self, conn, cdrom=None, location=None, install_bootdev=None,
-            location_kernel=None, location_initrd=None,
+            location_kernel=None, location_initrd=None, location_cache=True,
             install_kernel=None, install_initrd=None, install_kernel_args=None,
             no_install=None, is_reinstall=False):
         self.conn = conn
@@ -82,7 +84,8 @@ class Installer(object):
               install_kernel or install_initrd):
             self._treemedia = InstallerTreeMedia(self.conn, location,
                     location_kernel, location_initrd,
-                    install_kernel, install_initrd, install_kernel_args)
+                    install_kernel, install_initrd, install_kernel_args,
+                    location_cache=location_cache)
 
 
     ##################
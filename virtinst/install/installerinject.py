@@ -4,44 +4,112 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import lzma
 import os
 import shutil
+import stat
 import subprocess
 import tempfile
+import time
+import zlib
 
 from ..logger import log
 
 
-def _run_initrd_commands(initrd, tempdir):
-    log.debug("Appending to the initrd.")
+class _CpioWriter:
+    """
+    Minimal writer for the 'newc' cpio format the kernel expects for
+    initramfs archives, streaming through a compressor to fileobj.
+
+    :param compressor: Object with compress() and flush() methods, like
+        zlib.compressobj
+    """
+    _MAGIC = b"070701"
+    _BLOCK_SIZE = 1024 * 1024
+
+    def __init__(self, fileobj, compressor):
+        self._fileobj = fileobj
+        self._compressor = compressor
+        self._offset = 0
+        self._ino = 0
+
+    def _write(self, data):
+        self._offset += len(data)
+        self._fileobj.write(self._compressor.compress(data))
+
+    def _pad(self):
+        self._write(b"\0" * (-self._offset % 4))
+
+    def _write_header(self, name, mode, size, mtime, nlink):
+        namebytes = name.encode("utf-8") + b"\0"
+        self._ino += 1
+        fields = [self._ino, mode, 0, 0, nlink, int(mtime), size,
+                  0, 0, 0, 0, len(namebytes), 0]
+        self._write(self._MAGIC +
+                    b"".join(b"%08X" % f for f in fields) +
+                    namebytes)
+        self._pad()
+
+    def add_dir(self, name, mode, mtime):
+        self._write_header(name, stat.S_IFDIR | mode, 0, mtime, 2)
+
+    def add_file(self, name, srcpath):
+        """
+        Add the contents of srcpath as regular file 'name', keeping its
+        permissions and mtime, but owned by root
+        """
+        with open(srcpath, "rb") as src:
+            st = os.fstat(src.fileno())
+            self._write_header(name, stat.S_IFREG | stat.S_IMODE(st.st_mode),
+                               st.st_size, st.st_mtime, 1)
+            while True:
+                data = src.read(self._BLOCK_SIZE)
+                if not data:
+                    break
+                self._write(data)
+        self._pad()
+
+    def finish(self):
+        self._write_header("TRAILER!!!", 0, 0, 0, 1)
+        self._fileobj.write(self._compressor.flush())
+
+
+def _make_compressor(compression):
+    """
+    Return a streaming compressor for the passed initrd compression
+    format: 'gzip', 'xz', or 'zstd'. zstd needs the optional python
+    zstandard module, and falls back to gzip if it is missing.
+    """
+    if compression == "zstd":
+        try:
+            import zstandard
+            # threads=-1 compresses on all CPUs
+            return zstandard.ZstdCompressor(threads=-1).compressobj()
+        except ImportError:  # pragma: no cover
+            log.debug("python zstandard is not installed, using gzip")
+            compression = "gzip"
+
+    if compression == "xz":
+        # The kernel's xz decompressor only supports CRC32 checks
+        return lzma.LZMACompressor(format=lzma.FORMAT_XZ,
+                                   check=lzma.CHECK_CRC32)
+    if compression == "gzip":
+        return zlib.compressobj(wbits=16 + zlib.MAX_WBITS)
+    raise ValueError(  # pragma: no cover
+            "Unknown initrd compression '%s'" % compression)
+
+
+def _write_initrd_archive(fileobj, injections, compression="gzip"):
+    """
+    Write a compressed cpio archive containing injections to fileobj
 
-    find_proc = subprocess.Popen(['find', '.', '-print0'],
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE,
-                                 cwd=tempdir)
-    cpio_proc = subprocess.Popen(['cpio', '--create', '--null', '--quiet',
-                                  '--format=newc', '--owner=+0:+0'],
-                                 stdin=find_proc.stdout,
-                                 stdout=subprocess.PIPE,
-                                 stderr=subprocess.PIPE,
-                                 cwd=tempdir)
-    f = open(initrd, 'ab')
-    gzip_proc = subprocess.Popen(['gzip'], stdin=cpio_proc.stdout,
-                                 stdout=f, stderr=subprocess.PIPE)
-    cpio_proc.wait()
-    find_proc.wait()
-    gzip_proc.wait()
-    f.close()
-
-    finderr = find_proc.stderr.read()
-    cpioerr = cpio_proc.stderr.read()
-    gziperr = gzip_proc.stderr.read()
-    if finderr:  # pragma: no cover
-        log.debug("find stderr=%s", finderr)
-    if cpioerr:  # pragma: no cover
-        log.debug("cpio stderr=%s", cpioerr)
-    if gziperr:  # pragma: no cover
-        log.debug("gzip stderr=%s", gziperr)
+    :param injections: List of (source path, destination name) tuples
+    """
+    writer = _CpioWriter(fileobj, _make_compressor(compression))
+    writer.add_dir(".", 0o755, time.time())
+    for filename, dst in injections:
+        writer.add_file(dst, filename)
+    writer.finish()
 
 
 def _run_iso_commands(iso, tempdir, cloudinit=False):
@@ -91,12 +159,33 @@ def _perform_generic_injections(injections, scratchdir, media, cb, **kwargs):
         shutil.rmtree(tempdir)
 
 
-def perform_initrd_injections(initrd, injections, scratchdir):
+def perform_initrd_injections(initrd, injections, scratchdir,
+                              compression="gzip"):
     """
-    Insert files into the root directory of the initial ram disk
+    Insert files into the root directory of the initial ram disk, by
+    appending a compressed cpio archive which the kernel unpacks on
+    top of the original contents
+
+    :param compression: 'gzip', 'xz', or 'zstd'. The installer kernel
+        needs to support it.
     """
-    _perform_generic_injections(injections, scratchdir, initrd,
-            _run_initrd_commands)
+    ignore = scratchdir
+    if not injections:
+        return
+
+    pairs = []
+    for filename in injections:
+        if type(filename) is tuple:
+            filename, dst = filename
+        else:
+            dst = os.path.basename(filename)
+        log.debug("Injecting src=%s dst=%s into media=%s",
+                filename, dst, initrd)
+        pairs.append((filename, dst))
+
+    log.debug("Appending to the initrd.")
+    with open(initrd, "ab") as f:
+        _write_initrd_archive(f, pairs, compression=compression)
 
 
 def perform_cdrom_injections(injections, scratchdir, cloudinit=False):
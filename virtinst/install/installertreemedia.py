@@ -100,9 +100,11 @@ class InstallerTreeMedia(object):
         return system_scratchdir  # pragma: no cover
 
     def __init__(self, conn, location, location_kernel, location_initrd,
-                install_kernel, install_initrd, install_kernel_args):
+                install_kernel, install_initrd, install_kernel_args,
+                location_cache=True):
         self.conn = conn
         self.location = location
+        self._location_cache = location_cache
         self._location_kernel = location_kernel
         self._location_initrd = location_initrd
         self._install_kernel = install_kernel
@@ -155,13 +157,19 @@ class InstallerTreeMedia(object):
 
         if not self._cached_fetcher:
             scratchdir = InstallerTreeMedia.make_scratchdir(guest)
+            # Persistent cache of files fetched over HTTP, so
+            # repeated installs from one tree don't download them again
+            cachedir = None
+            if self._location_cache:
+                cachedir = os.path.join(guest.conn.get_app_cache_dir(),
+                                        "urlcache")
 
             if self._media_type == MEDIA_KERNEL:
                 self._cached_fetcher = urlfetcher.DirectFetcher(
-                    None, scratchdir, meter)
+                    None, scratchdir, meter, cachedir=cachedir)
             else:
                 self._cached_fetcher = urlfetcher.fetcherForURI(
-                    self.location, scratchdir, meter)
+                    self.location, scratchdir, meter, cachedir=cachedir)
 
         self._cached_fetcher.meter = meter
         return self._cached_fetcher
@@ -0,0 +1,164 @@
+#
+# Persistent cache of files fetched from install trees
+#
+# This work is licensed under the GNU GPLv2 or later.
+# See the COPYING file in the top-level directory.
+
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+from ..logger import log
+
+
+class _URLCacheEntry(object):
+    """
+    A single cached file, and the HTTP validators it was fetched with
+    """
+    def __init__(self, datapath, meta):
+        self._datapath = datapath
+        self.url = meta.get("url")
+        self.etag = meta.get("etag")
+        self.last_modified = meta.get("last_modified")
+        self.size = meta.get("size")
+
+    def get_validators(self):
+        """
+        Return the request headers for a conditional GET, which the
+        server answers with '304 Not Modified' if our copy is current
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    def open(self):
+        """
+        Return a file object for the cached content, and mark the
+        entry as recently used
+        """
+        fileobj = open(self._datapath, "rb")
+        try:
+            os.utime(self._datapath)
+        except OSError:  # pragma: no cover
+            pass
+        return fileobj
+
+
+class URLCache(object):
+    """
+    Cache of install tree files like kernels, initrds and .treeinfo,
+    keyed by URL and validated against the server's ETag and
+    Last-Modified headers.
+
+    Each entry is a $hash.data file with the content, and a $hash.json
+    file with the URL and validators. Entries are evicted least
+    recently used first once the total size exceeds max_size.
+    Several virt-install processes can share the cache, every file is
+    written to a temporary name and renamed into place.
+    """
+    DEFAULT_MAX_SIZE = 2 * 1024 * 1024 * 1024
+
+    def __init__(self, cachedir, max_size=DEFAULT_MAX_SIZE):
+        self._cachedir = cachedir
+        self._max_size = max_size
+
+    def _get_paths(self, url):
+        key = hashlib.sha256(url.encode("utf-8")).hexdigest()
+        base = os.path.join(self._cachedir, key)
+        return base + ".data", base + ".json"
+
+    def _write_atomic(self, path, writefunc):
+        fd, tmppath = tempfile.mkstemp(dir=self._cachedir, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as fileobj:
+                writefunc(fileobj)
+            os.replace(tmppath, path)
+        except BaseException:
+            os.unlink(tmppath)
+            raise
+
+    def lookup(self, url):
+        """
+        Return the _URLCacheEntry for url, or None if it isn't cached
+        """
+        datapath, metapath = self._get_paths(url)
+        try:
+            with open(metapath) as f:
+                meta = json.load(f)
+            if (meta.get("url") != url or
+                os.path.getsize(datapath) != meta.get("size")):
+                return None
+        except (OSError, ValueError):
+            return None
+        return _URLCacheEntry(datapath, meta)
+
+    def store(self, url, headers, srcpath=None, data=None):
+        """
+        Add the content fetched from url to the cache, from either the
+        file srcpath or the bytes data. Responses without an ETag or
+        Last-Modified header can't be validated later, so they aren't
+        cached.
+
+        :param headers: The response headers
+        """
+        etag = headers.get("etag")
+        last_modified = headers.get("last-modified")
+        if not etag and not last_modified:
+            return
+
+        datapath, metapath = self._get_paths(url)
+        try:
+            os.makedirs(self._cachedir, 0o700, exist_ok=True)
+            if srcpath is not None:
+                def _write_data(fileobj):
+                    with open(srcpath, "rb") as src:
+                        shutil.copyfileobj(src, fileobj)
+            else:
+                def _write_data(fileobj):
+                    fileobj.write(data)
+            self._write_atomic(datapath, _write_data)
+
+            meta = {"url": url, "etag": etag,
+                    "last_modified": last_modified,
+                    "size": os.path.getsize(datapath)}
+            self._write_atomic(metapath,
+                    lambda f: f.write(json.dumps(meta).encode("utf-8")))
+            log.debug("Cached %s in %s", url, datapath)
+        except OSError as e:  # pragma: no cover
+            log.debug("Error caching %s: %s", url, e)
+            return
+
+        self._evict()
+
+    def _evict(self):
+        """
+        Remove least recently used entries until we are under max_size
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self._cachedir):
+            if not name.endswith(".data"):
+                continue
+            path = os.path.join(self._cachedir, name)
+            try:
+                st = os.stat(path)
+            except OSError:  # pragma: no cover
+                continue
+            entries.append((st.st_mtime, st.st_size, path))
+            total += st.st_size
+
+        for dummy, size, path in sorted(entries):
+            if total <= self._max_size:
+                break
+            log.debug("Evicting %s from the url cache", path)
+            for rmpath in [path, path[:-len(".data")] + ".json"]:
+                try:
+                    os.unlink(rmpath)
+                except OSError:  # pragma: no cover
+                    pass
+            total -= size
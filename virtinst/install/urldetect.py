@@ -16,6 +16,15 @@ from ..osdict import OSDB
 # Helpers for detecting distro from given URL #
 ###############################################
 
+# Files the distro classes probe for. Fetchers that support it
+# download these concurrently before detection starts
+_PROBE_FILES = [
+    ".treeinfo", "treeinfo", "content", "VERSION", ".disk/info",
+    "current/images/MANIFEST", "current/legacy-images/MANIFEST",
+    "daily/MANIFEST",
+]
+
+
 class _DistroCache(object):
     def __init__(self, fetcher):
         self._fetcher = fetcher
@@ -46,6 +55,14 @@ class _DistroCache(object):
             self._filecache[path] = content
         return self._filecache[path]
 
+    def prefetch(self, paths):
+        """
+        Fill the file cache with any paths the fetcher can download
+        concurrently
+        """
+        paths = [p for p in paths if p not in self._filecache]
+        self._filecache.update(self._fetcher.prefetchFileContents(paths))
+
     @property
     def treeinfo(self):
         if self._treeinfo:
@@ -288,6 +305,7 @@ def getDistroStore(guest, fetcher, skip_error):
     osobj = guest.osinfo
     stores = _build_distro_list(osobj)
     cache = _DistroCache(fetcher)
+    cache.prefetch(_PROBE_FILES)
 
     for sclass in stores:
         if not sclass.is_valid(cache):
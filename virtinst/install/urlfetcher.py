@@ -6,15 +6,20 @@
 #
 # Backends for the various URL types we support (http, https, ftp, local)
 
+import concurrent.futures
 import ftplib
 import io
+import mmap
 import os
+import struct
 import subprocess
 import tempfile
+import threading
 import urllib
 
 import requests
 
+from .urlcache import URLCache
 from ..logger import log
 
 
@@ -27,6 +32,9 @@ class _XorrisoReader():
         self._location = location
         self._cache_file_list = self._make_file_list()
 
+    def close(self):
+        pass
+
     def _make_file_list(self):
         delim = "VIRTINST_BEGINLIST"
         cmd = ["xorriso", "-indev", self._location, "-print", delim, "-find"]
@@ -51,6 +59,251 @@ class _XorrisoReader():
         return ("'.%s'" % url) in self._cache_file_list
 
 
+class _ISOReaderError(Exception):
+    """
+    Raised for images _ISO9660Reader can't handle
+    """
+
+
+class _ISO9660Reader():
+    """
+    Pure python ISO9660 reader. The image is mmap'd and its directory
+    tree indexed once, then files are served straight from the mapping.
+
+    Names come from Rock Ridge NM entries if the image has them, else
+    from the Joliet tree, else the plain ISO9660 names as xorriso shows
+    them: case preserved, with ';1' versions and trailing dots stripped,
+    so lookups behave the same with either reader. Layouts we don't
+    handle, like no ISO9660 volume at all (UDF only) or Rock Ridge deep
+    directory relocation, raise _ISOReaderError.
+    """
+    _SECTOR_SIZE = 2048
+    _JOLIET_ESCAPES = [b"%/@", b"%/C", b"%/E"]
+
+    def __init__(self, location):
+        self._location = location
+        self._mmap = None
+        self._blocksize = self._SECTOR_SIZE
+        self._susp_skip = 0
+
+        # path -> list of (offset, size) extents
+        self._files = {}
+        self._dirs = set()
+
+        with open(location, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            self._index()
+        except (struct.error, IndexError, UnicodeDecodeError) as e:
+            self.close()
+            raise _ISOReaderError("Error parsing iso: %s" % e) from None
+        except BaseException:
+            self.close()
+            raise
+        log.debug("Indexed iso %s: %d files, %d dirs",
+                location, len(self._files), len(self._dirs))
+
+    def close(self):
+        if self._mmap:
+            self._mmap.close()
+        self._mmap = None
+
+
+    ####################
+    # Image structures #
+    ####################
+
+    def _read_extent(self, lba, size):
+        start = lba * self._blocksize
+        if start + size > len(self._mmap):
+            raise _ISOReaderError("Extent past end of image")
+        return self._mmap[start:start + size]
+
+    def _parse_record(self, data, pos):
+        """
+        Parse the directory record at data[pos]. Returns a tuple of
+        (lba, size, flags, raw name, system use area)
+        """
+        reclen = data[pos]
+        if reclen < 34 or pos + reclen > len(data):
+            raise _ISOReaderError("Bad directory record")
+        lba, = struct.unpack_from("<I", data, pos + 2)
+        size, = struct.unpack_from("<I", data, pos + 10)
+        flags = data[pos + 25]
+        namelen = data[pos + 32]
+        name = data[pos + 33:pos + 33 + namelen]
+        # There's a padding byte after even length names
+        sustart = pos + 33 + namelen + (1 - namelen % 2)
+        return lba, size, flags, name, data[sustart:pos + reclen]
+
+    def _iter_records(self, lba, size):
+        data = self._read_extent(lba, size)
+        pos = 0
+        while pos < size:
+            if data[pos] == 0:
+                # Records don't cross sectors, the rest of this
+                # one is padding
+                pos = (pos // self._SECTOR_SIZE + 1) * self._SECTOR_SIZE
+                continue
+            yield self._parse_record(data, pos)
+            pos += data[pos]
+
+    def _parse_susp(self, su):
+        """
+        Return the list of (signature, data) System Use Sharing Protocol
+        entries in the system use area su, following continuation areas
+        """
+        entries = []
+        areas = [su[self._susp_skip:]]
+        while areas:
+            if len(entries) > 4096:
+                raise _ISOReaderError("Too many system use entries")
+            area = areas.pop(0)
+            pos = 0
+            while pos + 4 <= len(area):
+                sig = bytes(area[pos:pos + 2])
+                length = area[pos + 2]
+                if length < 4:
+                    break
+                body = area[pos + 4:pos + length]
+                if sig == b"ST":
+                    break
+                if sig == b"CE":
+                    celba, = struct.unpack_from("<I", body, 0)
+                    ceoff, = struct.unpack_from("<I", body, 8)
+                    celen, = struct.unpack_from("<I", body, 16)
+                    extent = self._read_extent(celba, ceoff + celen)
+                    areas.append(extent[ceoff:])
+                else:
+                    entries.append((sig, body))
+                pos += length
+        return entries
+
+    def _get_rockridge_name(self, su):
+        name = b""
+        for sig, body in self._parse_susp(su):
+            if sig in [b"CL", b"PL", b"RE"]:
+                raise _ISOReaderError("Rock Ridge directory relocation "
+                                      "is not supported")
+            if sig == b"NM" and not body[0] & 0x6:
+                # Flags 0x2 and 0x4 are the current and parent dir
+                name += body[1:]
+        return name and name.decode("utf-8", "surrogateescape") or None
+
+    def _read_volume_descriptors(self):
+        """
+        Return the primary and Joliet volume descriptors
+        """
+        primary = None
+        joliet = None
+        for idx in range(16, 16 + 64):
+            start = idx * self._SECTOR_SIZE
+            desc = self._mmap[start:start + self._SECTOR_SIZE]
+            if len(desc) < self._SECTOR_SIZE or desc[1:6] != b"CD001":
+                break
+            if desc[0] == 255:
+                break
+            if desc[0] == 1 and not primary:
+                primary = desc
+            if (desc[0] == 2 and not joliet and
+                desc[88:91] in self._JOLIET_ESCAPES):
+                joliet = desc
+
+        if not primary:
+            raise _ISOReaderError("No ISO9660 primary volume descriptor")
+        return primary, joliet
+
+
+    ############
+    # Indexing #
+    ############
+
+    def _index(self):
+        primary, joliet = self._read_volume_descriptors()
+        self._blocksize, = struct.unpack_from("<H", primary, 128)
+
+        # Root directory records are embedded in the descriptors
+        rootlba, rootsize = self._parse_record(primary, 156)[0:2]
+        firstsu = next(self._iter_records(rootlba, rootsize))[4]
+
+        if firstsu[0:2] == b"SP" and firstsu[4:6] == b"\xbe\xef":
+            # The root '.' entry has the SUSP marker: use Rock Ridge
+            self._susp_skip = firstsu[6]
+            namefunc = self._rockridge_name
+        elif joliet:
+            rootlba, rootsize = self._parse_record(joliet, 156)[0:2]
+            namefunc = self._joliet_name
+        else:
+            namefunc = self._iso9660_name
+
+        self._walk(rootlba, rootsize, namefunc)
+
+    def _rockridge_name(self, name, su):
+        return self._get_rockridge_name(su) or self._iso9660_name(name, su)
+
+    def _joliet_name(self, name, su):
+        ignore = su
+        return self._strip_version(name.decode("utf-16-be"))
+
+    def _iso9660_name(self, name, su):
+        ignore = su
+        name = self._strip_version(name.decode("latin-1"))
+        return name.rstrip(".")
+
+    def _strip_version(self, name):
+        if ";" in name:
+            name = name.rsplit(";", 1)[0]
+        return name
+
+    def _walk(self, rootlba, rootsize, namefunc):
+        self._dirs.add("/")
+        visited = set()
+        dirstack = [("", rootlba, rootsize)]
+        while dirstack:
+            dirpath, lba, size = dirstack.pop()
+            if lba in visited:
+                continue
+            visited.add(lba)
+
+            multiextent = None
+            for reclba, recsize, flags, rawname, su in self._iter_records(
+                    lba, size):
+                if rawname in [b"\x00", b"\x01"]:
+                    continue
+                path = dirpath + "/" + namefunc(rawname, su)
+
+                if flags & 0x02:
+                    self._dirs.add(path)
+                    dirstack.append((path, reclba, recsize))
+                    continue
+
+                # Files over 4GiB are split over multiple records,
+                # all but the last flagged 'multi-extent'
+                extent = (reclba * self._blocksize, recsize)
+                if multiextent and multiextent[0] == path:
+                    multiextent[1].append(extent)
+                    extents = multiextent[1]
+                else:
+                    extents = [extent]
+                multiextent = (flags & 0x80) and (path, extents) or None
+                self._files[path] = extents
+
+
+    ##############
+    # Public API #
+    ##############
+
+    def grabFile(self, url, scratchdir):
+        ignore = scratchdir
+        extents = self._files[os.path.normpath(url)]
+        return b"".join(self._mmap[offset:offset + size]
+                        for offset, size in extents)
+
+    def hasFile(self, url):
+        path = os.path.normpath(url)
+        return path in self._files or path in self._dirs
+
+
 ###########################
 # Fetcher implementations #
 ###########################
@@ -63,10 +316,14 @@ class _URLFetcher(object):
     _block_size = 16384
     _is_iso = False
 
-    def __init__(self, location, scratchdir, meter):
+    def __init__(self, location, scratchdir, meter, cachedir=None):
         self.location = location
         self.scratchdir = scratchdir
         self.meter = meter
+        self.cachedir = cachedir
+        self._cache = None
+        if cachedir:
+            self._cache = URLCache(cachedir)
 
         log.debug("Using scratchdir=%s", scratchdir)
         self._prepare()
@@ -203,10 +460,59 @@ class _URLFetcher(object):
         self._grabURL(filename, fileobj)
         return fileobj.getvalue().decode("utf-8")
 
+    def prefetchFileContents(self, filenames):
+        """
+        Fetch the content of several files at once, for fetchers where
+        that's quicker than acquireFileContent one by one. Returns a dict
+        of filename -> content string, or None if the file couldn't be
+        acquired. Files that weren't prefetched are left out of the dict,
+        callers should use acquireFileContent for those.
+        """
+        ignore = filenames
+        return {}
+
+
+def _has_fileno(fileobj):
+    """
+    If fileobj is backed by a real file, like a temporary file, rather
+    than an in memory buffer
+    """
+    try:
+        fileobj.fileno()
+        return True
+    except (AttributeError, io.UnsupportedOperation):
+        return False
+
+
+class _HTTPRangeError(Exception):
+    """
+    Raised when the server doesn't honor a byte range request
+    """
+
 
 class _HTTPURLFetcher(_URLFetcher):
     _session = None
 
+    # Bigger than the default, file downloads can be hundreds of MiB
+    _block_size = 1024 * 1024
+
+    # Files at least this big are downloaded as _segments concurrent
+    # byte range requests, if the server supports ranges
+    _segment_min_size = 64 * 1024 * 1024
+    _segments = 4
+
+    # How many times an interrupted transfer is resumed from where it
+    # stopped, with a byte range request
+    _resume_retries = 3
+
+    # Max concurrent requests for prefetchFileContents. Stays below
+    # the connection pool size of a default requests.Session
+    _prefetch_workers = 8
+
+    _RESUMABLE_ERRORS = (requests.exceptions.ConnectionError,
+                         requests.exceptions.ChunkedEncodingError,
+                         requests.exceptions.Timeout)
+
     def _prepare(self):
         self._session = requests.Session()
 
@@ -235,9 +541,18 @@ class _HTTPURLFetcher(_URLFetcher):
 
     def _grabber(self, url):
         """
-        Use requests for this
+        Use requests for this. If url is in our persistent cache, the
+        request is conditional, and if the server reports our copy is
+        still current, we return a file object for the cached copy
         """
-        response = self._session.get(url, stream=True)
+        cached = self._cache and self._cache.lookup(url)
+        headers = cached and cached.get_validators() or {}
+        response = self._session.get(url, stream=True, headers=headers)
+        if cached and response.status_code == 304:
+            response.close()
+            log.debug("Using cached copy of %s", url)
+            return cached.open(), cached.size
+
         response.raise_for_status()
         try:
             size = int(response.headers.get('content-length'))
@@ -245,19 +560,212 @@ class _HTTPURLFetcher(_URLFetcher):
             size = None
         return response, size
 
+    def _cache_store(self, response, fileobj):
+        """
+        Add the completed download of response, stored in fileobj, to
+        our persistent cache, if the server gave us validators for it
+        """
+        headers = response.headers
+        if (not self._cache or
+            not (headers.get("etag") or headers.get("last-modified"))):
+            return
+
+        # Key on the URL we requested, not where it redirected to
+        url = response.history and response.history[0].url or response.url
+        if _has_fileno(fileobj):
+            self._cache.store(url, headers, srcpath=fileobj.name)
+        else:
+            self._cache.store(url, headers, data=fileobj.getvalue())
+
+    def _get_range(self, url, start, end):
+        """
+        Return a streaming response for bytes [start, end] of url
+        """
+        byterange = "bytes=%d-%d" % (start, end)
+        response = self._session.get(url, stream=True,
+                headers={"Range": byterange})
+        response.raise_for_status()
+        contentrange = response.headers.get("content-range") or ""
+        if (response.status_code != 206 or
+            not contentrange.startswith("bytes %d-" % start)):
+            response.close()
+            raise _HTTPRangeError(
+                    "Server ignored range request '%s' for %s" %
+                    (byterange, url))
+        return response
+
+    def _stream(self, url, response, write_cb, offset, end, progress_cb):
+        """
+        Pass the response body to write_cb(offset, data) until end,
+        resuming with a range request if the transfer is interrupted.
+        Returns the final offset.
+
+        :param end: Expected final offset, or None if unknown. If None,
+            interrupted transfers can't be resumed
+        """
+        retries = self._resume_retries
+        while True:
+            try:
+                for data in response.iter_content(
+                        chunk_size=self._block_size):
+                    write_cb(offset, data)
+                    offset += len(data)
+                    progress_cb(len(data))
+                err = None
+            except self._RESUMABLE_ERRORS as e:
+                err = e
+
+            if end is None:
+                if err:
+                    raise err
+                return offset
+            if offset >= end:
+                return offset
+
+            err = err or ValueError(
+                    _("Transfer of %(url)s ended early at byte %(offset)s") %
+                    {"url": url, "offset": offset})
+            if not retries:
+                raise err
+            retries -= 1
+            log.debug("Transfer of %s interrupted at byte %d (%s), resuming",
+                      url, offset, err)
+            try:
+                response = self._get_range(url, offset, end - 1)
+            except _HTTPRangeError as e:  # pragma: no cover
+                log.debug("Can't resume: %s", e)
+                raise err from None
+
+    def _write_segments(self, url, fileobj, size, progress_cb):
+        """
+        Download url into fileobj as self._segments concurrent byte
+        range requests, each writing to its own region of the file
+        """
+        fileobj.flush()
+        fd = fileobj.fileno()
+        os.ftruncate(fd, size)
+
+        def _write_cb(offset, data):
+            view = memoryview(data)
+            while view:
+                written = os.pwrite(fd, view, offset)
+                view = view[written:]
+                offset += written
+
+        def _fetch_segment(start, end):
+            response = self._get_range(url, start, end - 1)
+            return self._stream(url, response, _write_cb,
+                                start, end, progress_cb)
+
+        segsize = -(-size // self._segments)
+        bounds = [(start, min(start + segsize, size))
+                  for start in range(0, size, segsize)]
+        log.debug("Downloading %s in %d segments", url, len(bounds))
+
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=len(bounds),
+                thread_name_prefix="HTTP segment") as executor:
+            futures = [executor.submit(_fetch_segment, start, end)
+                       for start, end in bounds]
+            for future in futures:
+                future.result()
+        fileobj.seek(size)
+        return size
+
     def _write(self, urlobj, fileobj):
         """
         The requests object doesn't have a file-like read() option, so
-        we need to implement it ourselves
+        we need to implement it ourselves. Big files are fetched as
+        concurrent byte ranges when the server allows it, and
+        interrupted transfers are resumed.
         """
+        if not hasattr(urlobj, "iter_content"):
+            # Our cached copy is current
+            with urlobj:
+                return _URLFetcher._write(self, urlobj, fileobj)
+
+        response = urlobj
+        try:
+            size = int(urlobj.headers.get('content-length'))
+        except Exception:  # pragma: no cover
+            size = None
+        ranges_ok = bool(size and
+                urlobj.headers.get("accept-ranges") == "bytes" and
+                not urlobj.headers.get("content-encoding"))
+
         total = 0
-        for data in urlobj.iter_content(chunk_size=self._block_size):
+        lock = threading.Lock()
+        def _progress_cb(count):
+            nonlocal total
+            with lock:
+                total += count
+                self.meter.update(total)
+
+        if (ranges_ok and self._segments > 1 and
+            size >= self._segment_min_size and
+            _has_fileno(fileobj)):
+            url = urlobj.url
+            urlobj.close()
+            try:
+                self._write_segments(url, fileobj, size, _progress_cb)
+                self._cache_store(response, fileobj)
+                return size
+            except _HTTPRangeError as e:
+                log.debug("%s, downloading as a single stream", e)
+                urlobj, dummy = self._grabber(url)
+                fileobj.seek(0)
+                fileobj.truncate()
+                total = 0
+
+        def _write_cb(offset, data):
+            ignore = offset
             fileobj.write(data)
-            total += len(data)
-            self.meter.update(total)
+
+        self._stream(getattr(urlobj, "url", None), urlobj, _write_cb,
+                     0, ranges_ok and size or None, _progress_cb)
         fileobj.flush()
+        self._cache_store(response, fileobj)
         return total
 
+    def prefetchFileContents(self, filenames):
+        """
+        Fetch all the files concurrently over the session's pooled
+        connections. No progress is reported, this is meant for small
+        files like the ones used for distro detection
+        """
+        def _fetch(filename):
+            url = self._make_full_url(filename)
+            try:
+                urlobj, dummy = self._grabber(url)
+            except Exception as e:
+                log.debug("Prefetching %s failed: %s", url, e)
+                return None
+            if not hasattr(urlobj, "iter_content"):
+                with urlobj:
+                    return urlobj.read().decode("utf-8")
+
+            fileobj = io.BytesIO()
+            for data in urlobj.iter_content(chunk_size=self._block_size):
+                fileobj.write(data)
+            self._cache_store(urlobj, fileobj)
+            return fileobj.getvalue().decode("utf-8")
+
+        ret = {}
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self._prefetch_workers,
+                thread_name_prefix="HTTP prefetch") as executor:
+            futures = dict((filename, executor.submit(_fetch, filename))
+                           for filename in filenames)
+        for filename, future in futures.items():
+            try:
+                ret[filename] = future.result()
+            except Exception as e:  # pragma: no cover
+                # Leave it for acquireFileContent to report
+                log.debug("Prefetching %s failed: %s", filename, e)
+        log.debug("Prefetched files: %s",
+                [f for f in ret if ret[f] is not None])
+        return ret
+
 
 class _FTPURLFetcher(_URLFetcher):
     _ftp = None
@@ -343,9 +851,19 @@ class _ISOURLFetcher(_URLFetcher):
 
     def _get_isoreader(self):
         if not self._isoreader:
-            self._isoreader = _XorrisoReader(self.location)
+            try:
+                self._isoreader = _ISO9660Reader(self.location)
+            except (_ISOReaderError, OSError, ValueError) as e:
+                log.debug("Can't read iso %s natively, using xorriso: %s",
+                          self.location, e)
+                self._isoreader = _XorrisoReader(self.location)
         return self._isoreader
 
+    def _cleanup(self):
+        if self._isoreader:
+            self._isoreader.close()
+        self._isoreader = None
+
     def _grabber(self, url):
         if not self._hasFile(url):
             raise RuntimeError("iso doesn't have file=%s" % url)
@@ -365,7 +883,8 @@ class DirectFetcher(_URLFetcher):
         if not fullurl:
             fullurl = filename
         filename = os.path.basename(filename)
-        fetcher = fetcherForURI(fullurl, self.scratchdir, self.meter, direct=True)
+        fetcher = fetcherForURI(fullurl, self.scratchdir, self.meter,
+                                direct=True, cachedir=self.cachedir)
         return fetcher.acquireFile(filename, fullurl)  # pylint: disable=protected-access
 
     def _hasFile(self, url):
@@ -376,7 +895,7 @@ class DirectFetcher(_URLFetcher):
                 "DirectFetcher shouldn't be used for file access.")
 
 
-def fetcherForURI(uri, scratchdir, meter, direct=False):
+def fetcherForURI(uri, scratchdir, meter, direct=False, cachedir=None):
     if uri.startswith("http://") or uri.startswith("https://"):
         fclass = _HTTPURLFetcher
     elif uri.startswith("ftp://"):
@@ -387,4 +906,4 @@ def fetcherForURI(uri, scratchdir, meter, direct=False):
     else:
         # Pointing to a path (e.g. iso), or a block device (e.g. /dev/cdrom)
         fclass = _ISOURLFetcher
-    return fclass(uri, scratchdir, meter)
+    return fclass(uri, scratchdir, meter, cachedir=cachedir)
@@ -4,7 +4,13 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import concurrent.futures
+import errno
 import os
+import queue
+import threading
+
+import libvirt
 
 from .. import progress
 from ..devices import DeviceDisk
@@ -53,27 +59,137 @@ class _MockStream:
         pass
 
 
-def _upload_file(conn, meter, destpool, src):
+class _BlockReader:
     """
-    Helper for uploading a file to a pool, via libvirt. Used for
-    kernel/initrd upload when we can't access the system scratchdir
+    Read a file in a background thread, into a small pool of reusable
+    buffers, so disk reads overlap with sending over the stream and we
+    don't allocate a new bytes object for every block.
     """
-    # Build stream object
-    if conn.in_testsuite():
-        stream = _MockStream()
-    else:
-        stream = conn.newStream(0)  # pragma: no cover
+    _BLOCK_SIZE = 1024 * 1024  # 1 MiB
+    _NUM_BUFFERS = 3
 
-    def safe_send(data):
-        while True:
-            ret = stream.send(data)
-            if ret == 0 or ret == len(data):
-                break
-            data = data[ret:]
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+        self._free = queue.Queue()
+        self._filled = queue.Queue()
+        self._stop = threading.Event()
+        for dummy in range(self._NUM_BUFFERS):
+            self._free.put(bytearray(self._BLOCK_SIZE))
+        self._thread = threading.Thread(target=self._read_thread,
+                                        name="Reading upload", daemon=True)
+
+    def _read_thread(self):
+        try:
+            while not self._stop.is_set():
+                try:
+                    buf = self._free.get(timeout=1)
+                except queue.Empty:  # pragma: no cover
+                    continue
+                count = self._fileobj.readinto(buf)
+                if not count:
+                    break
+                self._filled.put((buf, count))
+        except Exception as e:  # pragma: no cover
+            self._filled.put(e)
+            return
+        self._filled.put(None)
+
+    def blocks(self):
+        """
+        Yield a read only memoryview of each block in the file. The
+        view is only valid until the next block is requested.
+        """
+        self._thread.start()
+        try:
+            while True:
+                item = self._filled.get()
+                if item is None:
+                    break
+                if isinstance(item, Exception):
+                    raise item  # pragma: no cover
+
+                buf, count = item
+                yield memoryview(buf)[:count].toreadonly()
+                self._free.put(buf)
+        finally:
+            self._stop.set()
+
+
+def _send_all(stream, data):
+    """
+    Send all of data, retrying partial sends without copying
+    """
+    while True:
+        ret = stream.send(data)
+        if ret == 0 or ret == len(data):
+            break
+        data = data[ret:]
+
+
+def _is_sparse(src):
+    st = os.stat(src)
+    return st.st_blocks * 512 < st.st_size
+
+
+def _make_sparse_callbacks(fd, progress_cb):
+    """
+    Build the data, hole and skip callbacks for virStream.sparseSendAll,
+    reading from fd and reporting the bytes handled to progress_cb
+    """
+    total = [0]
+
+    def _data_cb(_stream, nbytes, _opaque):
+        data = os.read(fd, nbytes)
+        total[0] += len(data)
+        progress_cb(total[0])
+        return data
+
+    def _hole_cb(_stream, _opaque):
+        cur = os.lseek(fd, 0, os.SEEK_CUR)
+        size = os.fstat(fd).st_size
+        if cur >= size:
+            # [False, 0] tells sparseSendAll we hit EOF
+            return [False, 0]
+
+        try:
+            data = os.lseek(fd, cur, os.SEEK_DATA)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                raise  # pragma: no cover
+            # ENXIO means we are in a trailing hole
+            data = size
+
+        if data > cur:
+            ret = [False, data - cur]
+        else:
+            hole = os.lseek(fd, cur, os.SEEK_HOLE)
+            ret = [True, hole - cur]
+        os.lseek(fd, cur, os.SEEK_SET)
+        return ret
+
+    def _skip_cb(_stream, length, _opaque):
+        os.lseek(fd, length, os.SEEK_CUR)
+        total[0] += length
+        progress_cb(total[0])
+        return 0
+
+    return _data_cb, _hole_cb, _skip_cb
 
-    meter = progress.ensure_meter(meter)
 
-    # Build placeholder volume
+def _send_sparse(stream, fileobj, progress_cb):  # pragma: no cover
+    """
+    Send fileobj over stream, skipping holes with the libvirt sparse
+    stream APIs instead of transferring blocks of zeroes
+    """
+    data_cb, hole_cb, skip_cb = _make_sparse_callbacks(
+            fileobj.fileno(), progress_cb)
+    stream.sparseSendAll(data_cb, hole_cb, skip_cb, None)
+
+
+def _build_upload_volume(conn, meter, destpool, src):
+    """
+    Build a placeholder volume in destpool for uploading src
+    """
     size = os.path.getsize(src)
     basename = os.path.basename(src)
     name = StorageVolume.find_free_name(conn, destpool, basename)
@@ -91,61 +207,88 @@ def _upload_file(conn, meter, destpool, src):
     if not vol:
         raise RuntimeError(  # pragma: no cover
                 "Failed to lookup scratch media volume")
+    return vol
 
-    try:
-        # Register upload
-        offset = 0
-        length = size
-        flags = 0
-        if not conn.in_testsuite():
-            vol.upload(stream, offset, length, flags)  # pragma: no cover
-
-        # Open source file
-        fileobj = open(src, "rb")
-
-        # Start transfer
-        total = 0
-        msg = _("Transferring '%(filename)s'") % {
-                "filename": os.path.basename(src)}
-        meter.start(msg, size)
-        while True:
-            blocksize = 1024 * 1024  # 1 MiB
-            data = fileobj.read(blocksize)
-            if not data:
-                break
-
-            safe_send(data)
-            total += len(data)
-            meter.update(total)
-
-        # Cleanup
-        stream.finish()
-        meter.end()
-    except Exception:  # pragma: no cover
-        vol.delete(0)
-        raise
 
-    return vol
+def _upload_file(conn, meter, vol, src):
+    """
+    Helper for uploading a file to a volume, via libvirt. Used for
+    kernel/initrd upload when we can't access the system scratchdir
+    """
+    # Build stream object
+    if conn.in_testsuite():
+        stream = _MockStream()
+    else:
+        stream = conn.newStream(0)  # pragma: no cover
+
+    meter = progress.ensure_meter(meter)
+    size = os.path.getsize(src)
+    sparse = (not conn.in_testsuite() and
+              conn.support.conn_stream_sparse() and
+              _is_sparse(src))
+
+    # Register upload
+    offset = 0
+    length = size
+    flags = 0
+    if sparse:  # pragma: no cover
+        flags |= libvirt.VIR_STORAGE_VOL_UPLOAD_SPARSE_STREAM
+    if not conn.in_testsuite():
+        vol.upload(stream, offset, length, flags)  # pragma: no cover
+
+    # Start transfer
+    msg = _("Transferring '%(filename)s'") % {
+            "filename": os.path.basename(src)}
+    meter.start(msg, size)
+    with open(src, "rb") as fileobj:
+        if sparse:  # pragma: no cover
+            log.debug("Uploading %s as a sparse stream", src)
+            _send_sparse(stream, fileobj, meter.update)
+        else:
+            total = 0
+            for data in _BlockReader(fileobj).blocks():
+                _send_all(stream, data)
+                total += len(data)
+                meter.update(total)
+
+    # Cleanup
+    stream.finish()
+    meter.end()
 
 
 def upload_paths(conn, system_scratchdir, meter, pathlist):
     """
-    Upload passed paths to the connection scratchdir
+    Upload passed paths to the connection scratchdir. The volumes are
+    created one at a time, then the files are all transferred
+    concurrently, each over its own stream.
     """
     # Build pool
     log.debug("Uploading kernel/initrd media")
     pool = _build_pool(conn, meter, system_scratchdir)
+    meter = progress.ensure_meter(meter)
 
     tmpvols = []
-    newpaths = []
     try:
         for path in pathlist:
-            vol = _upload_file(conn, meter, pool, path)
-            newpaths.append(vol.path())
-            tmpvols.append(vol)
+            tmpvols.append(_build_upload_volume(conn, meter, pool, path))
+
+        size = sum(os.path.getsize(path) for path in pathlist)
+        aggmeter = progress.AggregateMeter(meter,
+                _("Transferring %(count)s files") % {"count": len(pathlist)},
+                size)
+        with concurrent.futures.ThreadPoolExecutor(
+                max_workers=max(1, len(pathlist)),
+                thread_name_prefix="Uploading") as executor:
+            futures = [executor.submit(_upload_file, conn,
+                                       aggmeter.get_sub_meter(), vol, path)
+                       for vol, path in zip(tmpvols, pathlist)]
+        aggmeter.end()
+        for future in futures:
+            future.result()
     except Exception:  # pragma: no cover
         for vol in tmpvols:
             vol.delete(0)
         raise
 
+    newpaths = [vol.path() for vol in tmpvols]
     return newpaths, tmpvols
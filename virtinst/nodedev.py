@@ -11,16 +11,21 @@ from .logger import log
 from .xmlbuilder import XMLBuilder, XMLProperty, XMLChildProperty
 
 
-def _compare_int(nodedev_val, hostdev_val):
-    def _intify(val):
-        try:
-            if "0x" in str(val):
-                return int(val or '0x00', 16)
-            else:
-                return int(val)
-        except Exception:
-            return -1
+def _intify(val):
+    try:
+        if "0x" in str(val):
+            return int(val or '0x00', 16)
+        else:
+            return int(val)
+    except Exception:
+        return -1
+
 
+def _usb_id_key(vendor, product):
+    return ("usb-id", _intify(vendor), _intify(product))
+
+
+def _compare_int(nodedev_val, hostdev_val):
     nodedev_val = _intify(nodedev_val)
     hostdev_val = _intify(hostdev_val)
     return (nodedev_val == hostdev_val or hostdev_val == -1)
@@ -71,9 +76,9 @@ class NodeDevice(XMLBuilder):
         :returns: NodeDevice instance
         """
         # First try and see if this is a libvirt nodedev name
-        for nodedev in conn.fetch_all_nodedevs():
-            if nodedev.name == idstring:
-                return nodedev
+        nodedev = conn.lookup_nodedev_by_name(idstring)
+        if nodedev:
+            return nodedev
 
         try:
             return _AddressStringToNodedev(conn, idstring)
@@ -123,6 +128,27 @@ class NodeDevice(XMLBuilder):
 
         return False
 
+    def get_address_keys(self):
+        """
+        Return a list of hashable keys identifying this device by its
+        bus address, for indexed lookups. These match the key built
+        by _hostdev_address_key for a hostdev that compare_to_hostdev
+        would consider equal.
+        """
+        if self.device_type == "pci":
+            return [("pci", _intify(self.domain), _intify(self.bus),
+                     _intify(self.slot), _intify(self.function))]
+        if self.device_type == "usb_device":
+            return [("usb", _intify(self.bus), _intify(self.device)),
+                    self.get_usb_id_key()]
+        return []
+
+    def get_usb_id_key(self):
+        """
+        The get_address_keys entry matching on USB vendor:product
+        """
+        return _usb_id_key(self.vendor_id, self.product_id)
+
 
     ########################
     # XML helper functions #
@@ -236,20 +262,41 @@ def _AddressStringToHostdev(conn, addrstr):
     return hostdev
 
 
+def _hostdev_address_key(hostdev):
+    """
+    Build the NodeDevice.get_address_keys style key for the passed
+    hostdev, or None if it doesn't specify a full address
+    """
+    if hostdev.type == "pci":
+        key = ("pci", _intify(hostdev.domain), _intify(hostdev.bus),
+               _intify(hostdev.slot), _intify(hostdev.function))
+    elif hostdev.type == "usb" and hostdev.vendor is None:
+        key = ("usb", _intify(hostdev.bus), _intify(hostdev.device))
+    elif hostdev.type == "usb" and hostdev.bus is None:
+        key = _usb_id_key(hostdev.vendor, hostdev.product)
+    else:
+        return None  # pragma: no cover
+
+    if -1 in key:
+        # compare_to_hostdev treats this as a wildcard
+        return None  # pragma: no cover
+    return key
+
+
 def _AddressStringToNodedev(conn, addrstr):
     hostdev = _AddressStringToHostdev(conn, addrstr)
 
-    # Iterate over node devices and compare
-    count = 0
-    nodedev = None
-
-    for xmlobj in conn.fetch_all_nodedevs():
-        if xmlobj.compare_to_hostdev(hostdev):
-            nodedev = xmlobj
-            count += 1
+    key = _hostdev_address_key(hostdev)
+    if key:
+        matches = conn.lookup_nodedevs_by_address(key)
+    else:  # pragma: no cover
+        # Iterate over node devices and compare
+        matches = [xmlobj for xmlobj in conn.fetch_all_nodedevs()
+                   if xmlobj.compare_to_hostdev(hostdev)]
 
+    count = len(matches)
     if count == 1:
-        return nodedev
+        return matches[0]
     elif count > 1:
         raise ValueError(_("%s corresponds to multiple node devices") %
                          addrstr)
@@ -7,8 +7,11 @@
 # See the COPYING file in the top-level directory.
 
 import datetime
+import json
+import locale
 import os
 import re
+import tempfile
 
 from gi.repository import Libosinfo
 
@@ -99,6 +102,139 @@ def _sort(tosort):
     return retlist
 
 
+###########################
+# Persistent osinfo index #
+###########################
+
+# Bump this when the format of index entries changes
+_INDEX_VERSION = 1
+
+# Device IDs backing the _OsVariant supports_* checks. Whether each OS
+# has them is precomputed into the index
+_DEVICE_IDS = {
+    "usbtablet": ["http://usb.org/usb/80ee/0021"],
+    # virtio-block and virtio1.0-block
+    "virtiodisk": ["http://pcisig.com/pci/1af4/1001",
+                   "http://pcisig.com/pci/1af4/1042"],
+    # virtio-scsi and virtio1.0-scsi
+    "virtioscsi": ["http://pcisig.com/pci/1af4/1004",
+                   "http://pcisig.com/pci/1af4/1048"],
+    # virtio-net and virtio1.0-net
+    "virtionet": ["http://pcisig.com/pci/1af4/1000",
+                  "http://pcisig.com/pci/1af4/1041"],
+    # virtio-rng and virtio1.0-rng
+    "virtiorng": ["http://pcisig.com/pci/1af4/1005",
+                  "http://pcisig.com/pci/1af4/1044"],
+    # virtio-balloon and virtio1.0-balloon
+    "virtioballoon": ["http://pcisig.com/pci/1af4/1002",
+                      "http://pcisig.com/pci/1af4/1045"],
+    "virtioserial": ["http://pcisig.com/pci/1af4/1003",
+                     "http://pcisig.com/pci/1af4/1043"],
+    # virtio1.0-input
+    "virtioinput": ["http://pcisig.com/pci/1af4/1052"],
+    # qemu-xhci
+    "usb3": ["http://pcisig.com/pci/1b36/0004"],
+    # Use virtio1.0-net device as a proxy for virtio1.0 as a whole
+    "virtio1": ["http://pcisig.com/pci/1af4/1041"],
+    "q35": ["http://qemu.org/chipset/x86/q35"],
+}
+
+
+def _get_osinfo_dirs():
+    """
+    Directories libosinfo's process_default_path reads the DB from
+    """
+    userdir = os.environ.get("XDG_CONFIG_HOME",
+            os.path.expanduser("~/.config"))
+    return [
+        os.environ.get("OSINFO_SYSTEM_DIR", "/usr/share/osinfo"),
+        os.environ.get("OSINFO_DATA_DIR", "/usr/share/libosinfo/db"),
+        os.environ.get("OSINFO_LOCAL_DIR", "/etc/osinfo"),
+        os.environ.get("OSINFO_USER_DIR", os.path.join(userdir, "osinfo")),
+    ]
+
+
+def _get_libosinfo_version():
+    if not hasattr(Libosinfo, "get_major_version"):  # pragma: no cover
+        return None
+    return "%s.%s.%s" % (Libosinfo.get_major_version(),
+                         Libosinfo.get_minor_version(),
+                         Libosinfo.get_micro_version())
+
+
+def _get_messages_locale():
+    """
+    Return what decides the language of translated osinfo strings
+    like the OS name
+    """
+    try:
+        lcmessages = locale.setlocale(locale.LC_MESSAGES, None)
+    except (locale.Error, AttributeError):  # pragma: no cover
+        lcmessages = None
+    return [lcmessages, os.environ.get("LANGUAGE")]
+
+
+def _get_osinfo_fingerprint():
+    """
+    Return what the index contents depend on: the libosinfo version,
+    since entries use its APIs, the messages locale, since the OS label
+    is translated, and (dirpath, mtime) for every directory in the
+    osinfo DB. Package updates add, remove, or rename files, which
+    changes the mtime of the containing directory, so this is enough
+    to tell if the DB changed without parsing any XML.
+    """
+    dirs = []
+    for topdir in _get_osinfo_dirs():
+        for dirpath, dirnames, dummy in os.walk(topdir):
+            dirnames.sort()
+            try:
+                dirs.append([dirpath, os.stat(dirpath).st_mtime_ns])
+            except OSError:  # pragma: no cover
+                continue
+    return {"libosinfo": _get_libosinfo_version(),
+            "locale": _get_messages_locale(),
+            "dirs": dirs}
+
+
+def _glib_date_to_str(glibdate):
+    if glibdate is None:
+        return None
+    return "%s-%s" % (glibdate.get_year(), glibdate.get_day_of_year())
+
+
+def _make_index_entry(o):
+    """
+    Build the index entry for the Libosinfo.Os o: everything needed
+    for lookups, sorting, listing, and the common device checks
+    """
+    short_ids = [o.get_short_id()]
+    if hasattr(o, "get_short_id_list"):
+        short_ids = o.get_short_id_list()
+
+    devids = [dev.get_id() for dev in _OsinfoIter(o.get_all_devices())]
+    devices = [key for key, checkids in _DEVICE_IDS.items() if
+               any(devid in checkids for devid in devids)]
+
+    # We can use os.get_release_status() & osinfo.ReleaseStatus.ROLLING
+    # if we require libosinfo >= 1.4.0.
+    release_status = o.get_param_value(
+            Libosinfo.OS_PROP_RELEASE_STATUS) or None
+
+    return {
+        "short_ids": short_ids,
+        "full_id": o.get_id(),
+        "label": o.get_name(),
+        "codename": o.get_codename() or "",
+        "family": o.get_family(),
+        "distro": o.get_distro() or "",
+        "version": o.get_version(),
+        "eol_date": _glib_date_to_str(o.get_eol_date()),
+        "release_date": _glib_date_to_str(o.get_release_date()),
+        "release_status": release_status,
+        "devices": devices,
+    }
+
+
 class _OsinfoIter:
     """
     Helper to turn osinfo style get_length/get_nth lists into python
@@ -125,9 +261,12 @@ class _OSDB(object):
     """
     Entry point for the public API
     """
-    def __init__(self):
+    def __init__(self, cachedir=None):
         self.__os_loader = None
         self.__all_variants = None
+        self.__full_id_variants = None
+        self.__sorted_variants = None
+        self._cachedir = cachedir
 
     # This is only for back compatibility with pre-libosinfo support.
     # This should never change.
@@ -188,9 +327,74 @@ class _OSDB(object):
         o = Libosinfo.Os()
         o.set_param("short-id", "generic")
         o.set_param("name", _("Generic OS"))
-        v = _OsVariant(o)
+        v = _OsVariant(self, _make_index_entry(o), o)
         allvariants[v.name] = v
 
+    def _get_index_path(self):
+        cachedir = self._cachedir
+        if cachedir is None:
+            if xmlutil.in_testsuite():
+                return None
+            from .connection import VirtinstConnection
+            cachedir = VirtinstConnection.get_app_cache_dir()
+        return os.path.join(cachedir, "osinfo-index.json")
+
+    def _read_index(self, path, fingerprint):
+        try:
+            with open(path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (index.get("version") != _INDEX_VERSION or
+            index.get("fingerprint") != fingerprint):
+            log.debug("osinfo index %s is stale", path)
+            return None
+        return index["entries"]
+
+    def _write_index(self, path, fingerprint, entries):
+        index = {"version": _INDEX_VERSION,
+                 "fingerprint": fingerprint,
+                 "entries": entries}
+        try:
+            os.makedirs(os.path.dirname(path), 0o700, exist_ok=True)
+            fd, tmppath = tempfile.mkstemp(dir=os.path.dirname(path),
+                                           prefix=".tmp-osinfo-")
+            with os.fdopen(fd, "w") as f:
+                json.dump(index, f)
+            os.replace(tmppath, path)
+        except OSError as e:  # pragma: no cover
+            log.debug("Error writing osinfo index %s: %s", path, e)
+
+    def _load_entries(self):
+        """
+        Return index entries for every OS in the osinfo DB, from the
+        on disk index if it is current, otherwise by loading the DB
+        and regenerating the index
+        """
+        path = self._get_index_path()
+        fingerprint = None
+        if path:
+            fingerprint = _get_osinfo_fingerprint()
+            entries = self._read_index(path, fingerprint)
+            if entries is not None:
+                return entries
+
+        db = self._os_loader.get_db()
+        entries = [_make_index_entry(o) for o in
+                   _OsinfoIter(db.get_os_list())]
+        if path:
+            log.debug("Writing osinfo index to %s", path)
+            self._write_index(path, fingerprint, entries)
+        return entries
+
+    def _lookup_handle(self, full_id):
+        """
+        Return the Libosinfo.Os for full_id. This is only needed for
+        the less common _OsVariant APIs, so the first call loads the
+        whole DB.
+        """
+        return self._os_loader.get_db().get_os(full_id)
+
     @property
     def _os_loader(self):
         if not self.__os_loader:
@@ -203,12 +407,9 @@ class _OSDB(object):
     @property
     def _all_variants(self):
         if not self.__all_variants:
-            loader = self._os_loader
             allvariants = {}
-            db = loader.get_db()
-            oslist = db.get_os_list()
-            for o in _OsinfoIter(oslist):
-                osi = _OsVariant(o)
+            for entry in self._load_entries():
+                osi = _OsVariant(self, entry)
                 for name in osi.get_short_ids():
                     allvariants[name] = osi
 
@@ -216,15 +417,22 @@ class _OSDB(object):
             self.__all_variants = allvariants
         return self.__all_variants
 
+    @property
+    def _full_id_variants(self):
+        if not self.__full_id_variants:
+            self.__full_id_variants = dict((osobj.full_id, osobj) for
+                    osobj in self._all_variants.values())
+        return self.__full_id_variants
+
 
     ###############
     # Public APIs #
     ###############
 
     def lookup_os_by_full_id(self, full_id, raise_error=False):
-        for osobj in self._all_variants.values():
-            if osobj.full_id == full_id:
-                return osobj
+        osobj = self._full_id_variants.get(full_id)
+        if osobj:
+            return osobj
         if raise_error:
             raise ValueError(_("Unknown libosinfo ID '%s'") % full_id)
 
@@ -287,12 +495,13 @@ class _OSDB(object):
         """
         List all OSes in the DB
         """
-        sortmap = {}
-
-        for osobj in self._all_variants.values():
-            sortmap[osobj.name] = osobj
+        if not self.__sorted_variants:
+            sortmap = {}
+            for osobj in self._all_variants.values():
+                sortmap[osobj.name] = osobj
+            self.__sorted_variants = _sort(sortmap)
 
-        return _sort(sortmap)
+        return self.__sorted_variants[:]
 
 
 OSDB = _OSDB()
@@ -364,22 +573,30 @@ class _OsResources:
 #####################
 
 class _OsVariant(object):
-    def __init__(self, o):
-        self._os = o
+    """
+    An OS from the osinfo DB. The common properties come from the
+    index entry, the Libosinfo.Os is only looked up when needed.
+
+    :param osdb: _OSDB we belong to
+    :param entry: Index entry from _make_index_entry
+    :param o: Libosinfo.Os, if already available
+    """
+    def __init__(self, osdb, entry, o=None):
+        self._osdb = osdb
+        self.__os = o
 
-        self._short_ids = [self._os.get_short_id()]
-        if hasattr(self._os, "get_short_id_list"):
-            self._short_ids = self._os.get_short_id_list()
+        self._short_ids = entry["short_ids"]
         self.name = self._short_ids[0]
 
-        self._family = self._os.get_family()
-        self.full_id = self._os.get_id()
-        self.label = self._os.get_name()
-        self.codename = self._os.get_codename() or ""
-        self.distro = self._os.get_distro() or ""
-        self.version = self._os.get_version()
+        self._family = entry["family"]
+        self.full_id = entry["full_id"]
+        self.label = entry["label"]
+        self.codename = entry["codename"]
+        self.distro = entry["distro"]
+        self.version = entry["version"]
+        self._devices = entry["devices"]
 
-        self.eol = self._get_eol()
+        self.eol = self._get_eol(entry)
 
     def __repr__(self):
         return "<%s name=%s>" % (self.__class__.__name__, self.name)
@@ -421,6 +638,13 @@ class _OsVariant(object):
 
         return False
 
+    @property
+    def _os(self):
+        if not self.__os:
+            self.__os = self._osdb._lookup_handle(  # pylint: disable=protected-access
+                    self.full_id)
+        return self.__os
+
     def _get_all_devices(self):
         return list(_OsinfoIter(self._os.get_all_devices()))
 
@@ -443,34 +667,35 @@ class _OsVariant(object):
         return ret
 
 
+    def _has_device(self, key, extra_devs=None):
+        if key in self._devices:
+            return True
+        devids = _DEVICE_IDS[key]
+        return any(dev.get_id() in devids for dev in (extra_devs or []))
+
+
     ###############
     # Cached APIs #
     ###############
 
-    def _get_eol(self):
-        eol = self._os.get_eol_date()
-        rel = self._os.get_release_date()
-
-        # We can use os.get_release_status() & osinfo.ReleaseStatus.ROLLING
-        # if we require libosinfo >= 1.4.0.
-        release_status = self._os.get_param_value(
-                Libosinfo.OS_PROP_RELEASE_STATUS) or None
+    def _get_eol(self, entry):
+        eol = entry["eol_date"]
+        rel = entry["release_date"]
 
-        def _glib_to_datetime(glibdate):
-            date = "%s-%s" % (glibdate.get_year(), glibdate.get_day_of_year())
+        def _str_to_datetime(date):
             return datetime.datetime.strptime(date, "%Y-%j")
 
         now = datetime.datetime.today()
         if eol is not None:
-            return now > _glib_to_datetime(eol)
+            return now > _str_to_datetime(eol)
 
         # Rolling distributions are never EOL.
-        if release_status == "rolling":
+        if entry["release_status"] == "rolling":
             return False
 
         # If no EOL is present, assume EOL if release was > 10 years ago
         if rel is not None:
-            rel5 = _glib_to_datetime(rel) + datetime.timedelta(days=365 * 10)
+            rel5 = _str_to_datetime(rel) + datetime.timedelta(days=365 * 10)
             return now > rel5
         return False
 
@@ -510,70 +735,45 @@ class _OsVariant(object):
         if self.is_generic():
             return True
 
-        devids = ["http://usb.org/usb/80ee/0021"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("usbtablet", extra_devs)
 
     def supports_virtiodisk(self, extra_devs=None):
-        # virtio-block and virtio1.0-block
-        devids = ["http://pcisig.com/pci/1af4/1001",
-                  "http://pcisig.com/pci/1af4/1042"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtiodisk", extra_devs)
 
     def supports_virtioscsi(self, extra_devs=None):
-        # virtio-scsi and virtio1.0-scsi
-        devids = ["http://pcisig.com/pci/1af4/1004",
-                  "http://pcisig.com/pci/1af4/1048"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtioscsi", extra_devs)
 
     def supports_virtionet(self, extra_devs=None):
-        # virtio-net and virtio1.0-net
-        devids = ["http://pcisig.com/pci/1af4/1000",
-                  "http://pcisig.com/pci/1af4/1041"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtionet", extra_devs)
 
     def supports_virtiorng(self, extra_devs=None):
-        # virtio-rng and virtio1.0-rng
-        devids = ["http://pcisig.com/pci/1af4/1005",
-                  "http://pcisig.com/pci/1af4/1044"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtiorng", extra_devs)
 
     def supports_virtioballoon(self, extra_devs=None):
-        # virtio-balloon and virtio1.0-balloon
-        devids = ["http://pcisig.com/pci/1af4/1002",
-                  "http://pcisig.com/pci/1af4/1045"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtioballoon", extra_devs)
 
     def supports_virtioserial(self, extra_devs=None):
-        devids = ["http://pcisig.com/pci/1af4/1003",
-                  "http://pcisig.com/pci/1af4/1043"]
-        if self._device_filter(devids=devids, extra_devs=extra_devs):
+        if self._has_device("virtioserial", extra_devs):
             return True
         # osinfo data was wrong for RHEL/centos here until Oct 2018
         # Remove this hack after 6 months or so
         return self._is_related_to("rhel6.0")
 
     def supports_virtioinput(self, extra_devs=None):
-        # virtio1.0-input
-        devids = ["http://pcisig.com/pci/1af4/1052"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtioinput", extra_devs)
 
     def supports_usb3(self, extra_devs=None):
-        # qemu-xhci
-        devids = ["http://pcisig.com/pci/1b36/0004"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("usb3", extra_devs)
 
     def supports_virtio1(self, extra_devs=None):
-        # Use virtio1.0-net device as a proxy for virtio1.0 as a whole
-        devids = ["http://pcisig.com/pci/1af4/1041"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("virtio1", extra_devs)
 
     def supports_chipset_q35(self, extra_devs=None):
         # For our purposes, check for the union of q35 + virtio1.0 support
         if (self.supports_virtionet(extra_devs=extra_devs) and
             not self.supports_virtio1(extra_devs=extra_devs)):
             return False
-        devids = ["http://qemu.org/chipset/x86/q35"]
-        return bool(self._device_filter(devids=devids, extra_devs=extra_devs))
+        return self._has_device("q35", extra_devs)
 
     def get_recommended_resources(self):
         minimum = self._os.get_minimum_resources()
@@ -37,18 +37,59 @@ def _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb):
     return (list(origmap.values()), list(new.values()), list(current.values()))
 
 
-def fetch_nets(backend, origmap, build_cb):
+def _delta_poll_helper(origmap, typename, lookup_cb, build_cb, deltas):
+    """
+    Event driven alternative to _new_poll_helper. Rather than listing
+    every object, only the names we received events for are looked up
+    and reconciled against origmap.
+
+    :param deltas: iterable of object names that may have appeared
+        or disappeared since the last poll
+    """
+    gone = []
+    new = []
+
+    for name in deltas:
+        obj = None
+        try:
+            obj = lookup_cb(name)
+        except Exception as e:
+            log.debug("Unable to lookup %s=%s: %s", typename, name, e)
+
+        if obj is None:
+            if name in origmap:
+                gone.append(origmap.pop(name))
+        elif name not in origmap:
+            origmap[name] = build_cb(obj, name)
+            new.append(origmap[name])
+
+    return gone, new, list(origmap.values())
+
+
+def _poll_helper(origmap, typename, list_cb, lookup_cb,
+                 build_cb, support_cb, deltas):
+    if deltas is not None:
+        return _delta_poll_helper(origmap, typename,
+                lookup_cb, build_cb, deltas)
+    return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
+
+
+def fetch_nets(backend, origmap, build_cb, deltas=None):
     typename = "network"
     list_cb = backend.listAllNetworks
+    lookup_cb = backend.networkLookupByName
     support_cb = backend.support.conn_network
-    return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
+    return _poll_helper(origmap, typename, list_cb, lookup_cb,
+            build_cb, support_cb, deltas)
 
 
-def fetch_pools(backend, origmap, build_cb):
+def fetch_pools(backend, origmap, build_cb, deltas=None):
     typename = "pool"
     list_cb = backend.listAllStoragePools
+    lookup_cb = backend.storagePoolLookupByName
     support_cb = backend.support.conn_storage
-    return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
+    return _poll_helper(origmap, typename, list_cb, lookup_cb,
+            build_cb, support_cb, deltas)
 
 
 def fetch_volumes(backend, pool, origmap, build_cb):
@@ -58,15 +99,20 @@ def fetch_volumes(backend, pool, origmap, build_cb):
     return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
 
 
-def fetch_nodedevs(backend, origmap, build_cb):
+def fetch_nodedevs(backend, origmap, build_cb, deltas=None, flags=0):
     typename = "nodedev"
-    list_cb = backend.listAllDevices
+    def list_cb():
+        return backend.listAllDevices(flags)
+    lookup_cb = backend.nodeDeviceLookupByName
     support_cb = backend.support.conn_nodedev
-    return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
+    return _poll_helper(origmap, typename, list_cb, lookup_cb,
+            build_cb, support_cb, deltas)
 
 
-def fetch_vms(backend, origmap, build_cb):
+def fetch_vms(backend, origmap, build_cb, deltas=None):
     typename = "domain"
     list_cb = backend.listAllDomains
+    lookup_cb = backend.lookupByName
     support_cb = backend.support.conn_domain
-    return _new_poll_helper(origmap, typename, list_cb, build_cb, support_cb)
+    return _poll_helper(origmap, typename, list_cb, lookup_cb,
+            build_cb, support_cb, deltas)
@@ -6,8 +6,12 @@
 #
 
 import sys
+import threading
+import time
+import weakref
 
 from . import _progresspriv
+from .logger import log
 
 
 class Meter:
@@ -34,6 +38,13 @@ class Meter:
         self._total_read = 0
         self._meter.start(text, size)
 
+    def set_text(self, text):
+        """
+        Change the text of a started meter, shown from the next update
+        """
+        self._text = text
+        self._meter.text = text
+
     def update(self, new_total):
         self._total_read = new_total
         self._meter.update(new_total)
@@ -42,6 +53,185 @@ class Meter:
         self._meter.end()
 
 
+class _SubMeter:
+    """
+    Meter API handed to each operation tracked by an AggregateMeter
+    """
+    def __init__(self, parent):
+        self._parent = parent
+        self._size = None
+
+    def start(self, text, size):
+        ignore = text
+        self._size = size
+        self._parent.sub_update(self, 0)
+
+    def update(self, new_total):
+        if self._size:
+            new_total = min(new_total, self._size)
+        self._parent.sub_update(self, new_total)
+
+    def end(self):
+        self._parent.sub_update(self, self._size or 0)
+
+
+class AggregateMeter:
+    """
+    Report the combined progress of several concurrent operations
+    through a single Meter. Each operation gets its own meter from
+    get_sub_meter(), which can be used from any thread.
+    """
+    def __init__(self, meter, text, size):
+        self._meter = meter
+        self._lock = threading.Lock()
+        self._totals = {}
+        self._meter.start(text, size)
+
+    def get_sub_meter(self):
+        return _SubMeter(self)
+
+    def sub_update(self, submeter, new_total):
+        with self._lock:
+            self._totals[submeter] = new_total
+            self._meter.update(sum(self._totals.values()))
+
+    def end(self):
+        with self._lock:
+            self._meter.end()
+
+
+class _PolledJob:
+    def __init__(self, poll_cb, min_interval, max_interval, key):
+        self.poll_cb = poll_cb
+        self.key = key
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.due = time.monotonic() + min_interval
+
+    def reschedule(self, progressed):
+        if progressed:
+            self.interval = self.min_interval
+        else:
+            self.interval = min(self.interval * 2, self.max_interval)
+        self.due = time.monotonic() + self.interval
+
+
+class JobPoller:
+    """
+    Poll the progress of every active job on a connection from one
+    thread, rather than a thread per job. Each job's poll callback
+    returns True if it saw progress. Jobs that aren't progressing back
+    off from min_interval towards max_interval, and return to
+    min_interval once they progress again. The thread exits when there
+    are no jobs left.
+    """
+    _instances = weakref.WeakKeyDictionary()
+    _instances_lock = threading.Lock()
+
+    @classmethod
+    def get_instance(cls, conn):
+        """
+        Return the JobPoller shared by all jobs on conn
+        """
+        with cls._instances_lock:
+            if conn not in cls._instances:
+                cls._instances[conn] = cls()
+            return cls._instances[conn]
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._jobs = []
+        self._polling = None
+        self._thread = None
+
+    def add(self, poll_cb, min_interval=.5, max_interval=4, key=None):
+        """
+        Start polling poll_cb, and return a handle for poke/remove
+
+        :param key: Optional identifier of what the job is running on,
+            like a domain UUID, so events can find it with poke_key
+        """
+        job = _PolledJob(poll_cb, min_interval, max_interval, key)
+        with self._cond:
+            self._jobs.append(job)
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run,
+                                                name="Polling job progress",
+                                                daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+        return job
+
+    def poke(self, job):
+        """
+        Poll job as soon as possible, for example because an event
+        reported that it made progress. Can be called from any thread.
+        """
+        with self._cond:
+            job.due = 0
+            self._cond.notify_all()
+
+    def poke_key(self, key):
+        """
+        poke every job added with key. Lets an event handler reach jobs
+        without a reference to them, for example ones started from a
+        separate object for the same domain.
+        """
+        with self._cond:
+            for job in self._jobs:
+                if job.key == key:
+                    job.due = 0
+            self._cond.notify_all()
+
+    def remove(self, job):
+        """
+        Stop polling job. If its callback is running, wait for it to
+        finish, so no progress is reported after this returns.
+        """
+        with self._cond:
+            if job in self._jobs:
+                self._jobs.remove(job)
+            while (self._polling is job and
+                   threading.current_thread() is not self._thread):
+                self._cond.wait()
+            self._cond.notify_all()
+
+    def _get_due_jobs(self):
+        with self._cond:
+            while True:
+                if not self._jobs:
+                    self._thread = None
+                    return None
+                now = time.monotonic()
+                due = [j for j in self._jobs if j.due <= now]
+                if due:
+                    return due
+                self._cond.wait(min(j.due for j in self._jobs) - now)
+
+    def _run(self):
+        while True:
+            due = self._get_due_jobs()
+            if due is None:
+                return
+
+            for job in due:
+                with self._cond:
+                    if job not in self._jobs:
+                        continue
+                    self._polling = job
+
+                try:
+                    job.reschedule(job.poll_cb())
+                except Exception:  # pragma: no cover
+                    log.exception("Error polling job progress")
+                    self.remove(job)
+
+                with self._cond:
+                    self._polling = None
+                    self._cond.notify_all()
+
+
 def make_meter(quiet):
     return Meter(quiet=quiet)
 
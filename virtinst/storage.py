@@ -5,7 +5,6 @@
 # See the COPYING file in the top-level directory.
 
 import os
-import threading
 
 import libvirt
 
@@ -54,14 +53,6 @@ def _preferred_default_pool_path(conn):
     return path
 
 
-def _lookup_poolxml_by_path(conn, path):
-    for poolxml in conn.fetch_all_pools():
-        xml_path = poolxml.target_path
-        if xml_path is not None and os.path.abspath(xml_path) == path:
-            return poolxml
-    return None
-
-
 class _Host(XMLBuilder):
     _XML_PROP_ORDER = ["name", "port"]
     XML_NAME = "host"
@@ -127,13 +118,9 @@ class StoragePool(_StorageObject):
         name = "default"
         path = _preferred_default_pool_path(conn)
 
-        poolxml = None
-        for trypool in conn.fetch_all_pools():
-            if trypool.name == name:
-                poolxml = trypool
-                break
-        else:
-            poolxml = _lookup_poolxml_by_path(conn, path)
+        poolxml = conn.lookup_pool_by_name(name)
+        if not poolxml:
+            poolxml = conn.lookup_pool_by_target_path(path)
 
         if poolxml:
             log.debug("Found default pool name=%s target=%s",
@@ -171,12 +158,12 @@ class StoragePool(_StorageObject):
     def lookup_pool_by_path(conn, path):
         """
         Return the first pool with matching matching target path.
-        return the first we find, active or inactive. This iterates over
-        all pools and dumps their xml, so it is NOT quick.
+        return the first we find, active or inactive. The first lookup
+        fetches the XML of every pool, so it is NOT quick.
 
         :returns: virStoragePool object if found, None otherwise
         """
-        poolxml = _lookup_poolxml_by_path(conn, path)
+        poolxml = conn.lookup_pool_by_target_path(path)
         if not poolxml:
             return None
         return conn.storagePoolLookupByName(poolxml.name)
@@ -188,10 +175,7 @@ class StoragePool(_StorageObject):
         in use by another pool. Extra params are passed to generate_name
         """
         def cb(name):
-            for pool in conn.fetch_all_pools():
-                if pool.name == name:
-                    return True
-            return False
+            return bool(conn.lookup_pool_by_name(name))
         return generatename.generate_name(basename, cb, **kwargs)
 
     @staticmethod
@@ -421,30 +405,32 @@ class StoragePool(_StorageObject):
         return pool
 
 
-def _progress_thread(volname, pool, meter, event):
+def _start_allocation_progress(conn, volname, pool, meter):
+    """
+    Report the allocation of volume volname to meter while it is being
+    created. The polling is shared with every other job on conn by
+    progress.JobPoller. Returns the job, to pass to JobPoller.remove.
+    """
     vol = None
-    if not meter:
-        return  # pragma: no cover
+    alloc = None
 
-    while True:
-        try:
-            if not vol:
+    def _poll():
+        nonlocal vol, alloc
+        if not vol:
+            try:
                 vol = pool.storageVolLookupByName(volname)
-            vol.info()  # pragma: no cover
-            break  # pragma: no cover
-        except Exception:
-            if event.wait(.2):
-                break
+            except Exception:
+                # Not created yet, keep checking at the minimum interval
+                return True
 
-    if vol is None:
-        log.debug("Couldn't lookup storage volume in prog thread.")
-        return
+        dummy1, dummy2, newalloc = vol.info()  # pragma: no cover
+        meter.update(newalloc)  # pragma: no cover
+        progressed = newalloc != alloc  # pragma: no cover
+        alloc = newalloc  # pragma: no cover
+        return progressed  # pragma: no cover
 
-    while True:  # pragma: no cover
-        dummy1, dummy2, alloc = vol.info()
-        meter.update(alloc)
-        if event.wait(1):
-            break
+    return progress.JobPoller.get_instance(conn).add(_poll,
+            min_interval=.5, max_interval=4)
 
 
 class StorageVolume(_StorageObject):
@@ -471,11 +457,9 @@ class StorageVolume(_StorageObject):
         collidelist = []
         if collideguest:
             pooltarget = None
-            poolname = pool_object.name()
-            for poolxml in conn.fetch_all_pools():
-                if poolxml.name == poolname:
-                    pooltarget = poolxml.target_path
-                    break
+            poolxml = conn.lookup_pool_by_name(pool_object.name())
+            if poolxml:
+                pooltarget = poolxml.target_path
 
             for disk in collideguest.devices.disk:
                 checkpath = disk.get_source_path()
@@ -490,7 +474,11 @@ class StorageVolume(_StorageObject):
                 pool_object.storageVolLookupByName, tryname)
 
         StoragePool.ensure_pool_is_running(pool_object, refresh=True)
-        return generatename.generate_name(basename, cb, **kwargs)
+        existing = generatename.libvirt_name_set(pool_object.listAllVolumes)
+        if existing is not None:
+            existing.update(collidelist)
+        return generatename.generate_name(basename, cb,
+                existing_names=existing, **kwargs)
 
     TYPE_FILE = getattr(libvirt, "VIR_STORAGE_VOL_FILE", 0)
     TYPE_BLOCK = getattr(libvirt, "VIR_STORAGE_VOL_BLOCK", 1)
@@ -675,17 +663,15 @@ class StorageVolume(_StorageObject):
             cloneflags |= getattr(libvirt,
                 "VIR_STORAGE_VOL_CREATE_REFLINK", 1)
 
-        event = threading.Event()
         meter = progress.ensure_meter(meter)
-        t = threading.Thread(target=_progress_thread,
-                             name="Checking storage allocation",
-                             args=(self.name, self.pool, meter, event))
-        t.setDaemon(True)
+        poller = progress.JobPoller.get_instance(self.conn)
+        job = None
 
         try:
-            t.start()
             msg = _("Allocating '%(filename)s'") % {"filename": self.name}
             meter.start(msg, self.capacity)
+            job = _start_allocation_progress(self.conn, self.name,
+                                             self.pool, meter)
 
             if self.conn.is_really_test():
                 # Test suite doesn't support any flags, so reset them
@@ -707,8 +693,8 @@ class StorageVolume(_StorageObject):
                 self.name, str(e)))
             raise RuntimeError(msg) from None
         finally:
-            event.set()
-            t.join()
+            if job:
+                poller.remove(job)
 
     def is_size_conflict(self):
         """
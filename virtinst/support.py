@@ -238,6 +238,7 @@ class SupportCache:
         function="virConnect.listNetworks", run_args=())
 
     conn_stream = _make(function="virConnect.newStream", run_args=(0,))
+    conn_stream_sparse = _make(version="3.4.0")
     conn_working_xen_events = _make(hv_version={"xen": "4.0.0", "all": 0})
     # This is an arbitrary check to say whether it's a good idea to
     # default to qcow2. It might be fine for xen or qemu older than the versions
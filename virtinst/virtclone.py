@@ -63,6 +63,48 @@ def _validate_disks(cloner):
                 warn_overwrite=warn_overwrite)
 
 
+def _check_bulk_options(options):
+    # Options that only make sense for a single clone
+    for val, optname in [(options.new_diskfile, "--file"),
+                         (options.new_mac, "--mac"),
+                         (options.new_uuid, "--uuid"),
+                         (options.new_nvram, "--nvram"),
+                         (options.preserve, "--preserve-data"),
+                         (options.parallel > 1, "--parallel")]:
+        if val:
+            fail(_("%(option)s can not be used with --count") %
+                 {"option": optname})
+
+
+def _setup_cloner(options, cloner):
+    cloner.set_replace(bool(options.replace))
+    cloner.set_reflink(bool(options.reflink))
+    cloner.set_sparse(bool(options.sparse))
+    cloner.set_parallel(options.parallel)
+
+    if options.new_uuid is not None:
+        cloner.set_clone_uuid(options.new_uuid)
+    if options.new_nvram:
+        cloner.set_nvram_path(options.new_nvram)
+
+    force_targets = options.target or []
+    skip_targets = options.skip_copy or []
+    for diskinfo in cloner.get_diskinfos():
+        if diskinfo.disk.target in force_targets:
+            diskinfo.set_clone_requested()
+        if diskinfo.disk.target in skip_targets:
+            diskinfo.set_share_requested()
+
+    if options.preserve:
+        for diskinfo in cloner.get_nonshare_diskinfos():
+            diskinfo.set_preserve_requested()
+        if cloner.nvram_diskinfo:
+            cloner.nvram_diskinfo.set_preserve_requested()
+
+    _process_macs(options, cloner)
+    _process_disks(options, cloner)
+
+
 def parse_args():
     desc = _("Duplicate a virtual machine, changing all the unique "
         "host side configuration like MAC address, name, etc. \n\n"
@@ -83,7 +125,12 @@ def parse_args():
                     help=_("Auto generate clone name and storage paths from"
                            " the original guest configuration."))
     geng.add_argument("-n", "--name", dest="new_name",
-                    help=_("Name for the new guest"))
+                    help=_("Name for the new guest. With --count, a "
+                           "template for the names, where '%%d' is "
+                           "replaced by a number"))
+    geng.add_argument("--count", type=int, default=1,
+                    help=_("Number of clones to create from the original "
+                           "guest. Requires --auto-clone"))
     geng.add_argument("-u", "--uuid", dest="new_uuid", help=argparse.SUPPRESS)
     geng.add_argument("--reflink", action="store_true",
             help=_("use btrfs COW lightweight copy"))
@@ -111,6 +158,8 @@ def parse_args():
                    "every cloneable disk image."))
     stog.add_argument("--nvram", dest="new_nvram",
                       help=_("New file to use as storage for nvram VARS"))
+    stog.add_argument("--parallel", type=int, default=1,
+                    help=_("Number of disks to clone concurrently"))
 
     netg = parser.add_argument_group(_("Networking Configuration"))
     netg.add_argument("-m", "--mac", dest="new_mac", action="append",
@@ -147,53 +196,42 @@ def main(conn=None):
         fail(_("Either --auto-clone or --file is required,"
                " use '--auto-clone or --file' and try again."))
 
-    src_name, src_xml = _process_src(options)
-    cloner = Cloner(conn, src_name, src_xml)
+    if options.count < 1:
+        fail(_("--count must be at least 1"))
 
-    cloner.set_replace(bool(options.replace))
-    cloner.set_reflink(bool(options.reflink))
-    cloner.set_sparse(bool(options.sparse))
-
-    if options.new_uuid is not None:
-        cloner.set_clone_uuid(options.new_uuid)
-    if options.new_nvram:
-        cloner.set_nvram_path(options.new_nvram)
-
-    force_targets = options.target or []
-    skip_targets = options.skip_copy or []
-    for diskinfo in cloner.get_diskinfos():
-        if diskinfo.disk.target in force_targets:
-            diskinfo.set_clone_requested()
-        if diskinfo.disk.target in skip_targets:
-            diskinfo.set_share_requested()
-
-    if options.preserve:
-        for diskinfo in cloner.get_nonshare_diskinfos():
-            diskinfo.set_preserve_requested()
-        if cloner.nvram_diskinfo:
-            cloner.nvram_diskinfo.set_preserve_requested()
-
-    if options.new_name:
-        cloner.set_clone_name(options.new_name)
-    elif not options.auto_clone:
-        fail(_("A name is required for the new virtual machine,"
-            " use '--name NEW_VM_NAME' to specify one."))
-
-    _process_macs(options, cloner)
-    _process_disks(options, cloner)
-
-    cloner.prepare()
-
-    _validate_disks(cloner)
+    src_name, src_xml = _process_src(options)
+    if options.count > 1:
+        _check_bulk_options(options)
+        cloners = Cloner.build_bulk(conn, options.count,
+                src_name=src_name, src_xml=src_xml,
+                name_template=options.new_name)
+    else:
+        cloners = [Cloner(conn, src_name, src_xml)]
+        if options.new_name:
+            cloners[0].set_clone_name(options.new_name)
+        elif not options.auto_clone:
+            fail(_("A name is required for the new virtual machine,"
+                " use '--name NEW_VM_NAME' to specify one."))
+
+    for cloner in cloners:
+        _setup_cloner(options, cloner)
+        cloner.prepare()
+        _validate_disks(cloner)
 
     run = True
     if options.xmlonly:
         run = options.test_nodry
-        print_stdout(cloner.new_guest.get_xml(), do_force=True)
+        for cloner in cloners:
+            print_stdout(cloner.new_guest.get_xml(), do_force=True)
     if run:
-        cloner.start_duplicate(cli.get_meter())
+        if len(cloners) > 1:
+            Cloner.start_bulk_duplicate(cloners, cli.get_meter())
+        else:
+            cloners[0].start_duplicate(cli.get_meter())
         print_stdout("")
-        print_stdout(_("Clone '%s' created successfully.") % cloner.new_guest.name)
+        for cloner in cloners:
+            print_stdout(_("Clone '%s' created successfully.") %
+                    cloner.new_guest.name)
 
     return 0
 
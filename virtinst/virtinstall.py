@@ -385,6 +385,7 @@ def build_installer(options, guest, installdata):
     location = None
     location_kernel = None
     location_initrd = None
+    location_cache = True
     is_reinstall = bool(options.reinstall)
     unattended_data = None
     extra_args = options.extra_args
@@ -410,7 +411,8 @@ def build_installer(options, guest, installdata):
     elif options.location:
         (location,
          location_kernel,
-         location_initrd) = cli.parse_location(options.location)
+         location_initrd,
+         location_cache) = cli.parse_location(options.location)
     elif options.cdrom:
         cdrom = options.cdrom
         if options.livecd:
@@ -429,6 +431,7 @@ def build_installer(options, guest, installdata):
             location=location,
             location_kernel=location_kernel,
             location_initrd=location_initrd,
+            location_cache=location_cache,
             install_bootdev=install_bootdev,
             install_kernel=install_kernel,
             install_initrd=install_initrd,
@@ -4,6 +4,8 @@
 # This work is licensed under the GNU GPLv2 or later.
 # See the COPYING file in the top-level directory.
 
+import functools
+
 import libxml2
 
 from . import xmlutil
@@ -11,6 +13,11 @@ from .logger import log
 
 # pylint: disable=protected-access
 
+# Upper bound on the number of distinct parsed xpath strings we keep
+# around. XMLProperty xpaths are a fixed set, but device indexes like
+# ./devices/disk[12] multiply them, so don't let it grow unbounded
+_XPATH_CACHE_SIZE = 4096
+
 
 class _XPathSegment(object):
     """
@@ -57,6 +64,9 @@ class _XPath(object):
     """
     Helper class for performing manipulations of XPath strings. Splits
     the xpath into segments.
+
+    Instances are shared via _parse_xpath, so they must not be altered
+    after creation.
     """
     def __init__(self, fullxpath):
         self.fullxpath = fullxpath
@@ -66,7 +76,7 @@ class _XPath(object):
                 # Resolve and flatten .. in xpaths
                 self.segments = self.segments[:-1]
                 continue
-            self.segments.append(_XPathSegment(s))
+            self.segments.append(_parse_xpath_segment(s))
 
         self.is_prop = self.segments[-1].is_prop
         self.propname = (self.is_prop and self.segments[-1].nodename or None)
@@ -74,6 +84,12 @@ class _XPath(object):
             self.segments = self.segments[:-1]
         self.xpath = self.join(self.segments)
 
+        # Stub creation plan: the xpath of every ancestor element,
+        # so stub_xpaths[i] is the node addressed by segments[:i+1]
+        self.stub_xpaths = []
+        for idx in range(len(self.segments)):
+            self.stub_xpaths.append(self.join(self.segments[:idx + 1]))
+
     @staticmethod
     def join(segments):
         return "/".join(s.fullsegment for s in segments)
@@ -82,12 +98,34 @@ class _XPath(object):
         return self.join(self.segments[:-1])
 
 
+@functools.lru_cache(maxsize=_XPATH_CACHE_SIZE)
+def _parse_xpath_segment(fullsegment):
+    return _XPathSegment(fullsegment)
+
+
+@functools.lru_cache(maxsize=_XPATH_CACHE_SIZE)
+def _parse_xpath(fullxpath):
+    """
+    Return the cached _XPath for the passed xpath string
+    """
+    return _XPath(fullxpath)
+
+
 class _XMLBase(object):
     NAMESPACES = {}
     @classmethod
     def register_namespace(cls, nsname, uri):
         cls.NAMESPACES[nsname] = uri
 
+    def __init__(self):
+        # Bumped every time the document or the XMLBuilder state layered
+        # on top of it changes. XMLBuilder uses this to skip regenerating
+        # XML that hasn't changed since the last get_xml call
+        self.generation = 0
+
+    def mark_dirty(self):
+        self.generation += 1
+
     def copy_api(self):
         raise NotImplementedError()
     def count(self, xpath):
@@ -135,12 +173,13 @@ class _XMLBase(object):
             return None
         if is_bool:
             return True
-        xpathobj = _XPath(xpath)
+        xpathobj = _parse_xpath(xpath)
         if xpathobj.is_prop:
             return self._node_get_property(node, xpathobj.propname)
         return self._node_get_text(node)
 
     def set_xpath_content(self, xpath, setval):
+        self.mark_dirty()
         node = self._find(xpath)
         if setval is False:
             # Boolean False, means remove the node entirely
@@ -159,6 +198,7 @@ class _XMLBase(object):
             self._node_set_content(xpath, node, setval)
 
     def node_add_xml(self, xml, xpath):
+        self.mark_dirty()
         newnode = self._node_from_xml(xml)
         parentnode = self._node_make_stub(xpath)
         self._node_add_child(xpath, parentnode, newnode)
@@ -167,6 +207,7 @@ class _XMLBase(object):
         """
         Replace the node at xpath with the passed in xml
         """
+        self.mark_dirty()
         newnode = self._node_from_xml(xml)
         self._node_replace_child(xpath, newnode)
 
@@ -176,7 +217,8 @@ class _XMLBase(object):
         of whether it has children or not, and then clean up the XML
         chain
         """
-        xpathobj = _XPath(fullxpath)
+        self.mark_dirty()
+        xpathobj = _parse_xpath(fullxpath)
         parentnode = self._find(xpathobj.parent_xpath())
         childnode = self._find(fullxpath)
         if parentnode is None or childnode is None:
@@ -193,7 +235,7 @@ class _XMLBase(object):
             {"expectname": expected_root_name, "foundname": rootname})
 
     def _node_set_content(self, xpath, node, setval):
-        xpathobj = _XPath(xpath)
+        xpathobj = _parse_xpath(xpath)
         if setval is not None:
             setval = str(setval)
         if xpathobj.is_prop:
@@ -223,24 +265,29 @@ class _XMLBase(object):
         Even if <bar> didn't exist before. So we fill in the dependent property
         expression values
         """
-        xpathobj = _XPath(fullxpath)
-        parentxpath = "."
-        parentnode = self._find(parentxpath)
-        if not parentnode:
+        xpathobj = _parse_xpath(fullxpath)
+        stub_xpaths = xpathobj.stub_xpaths
+
+        # Search backwards for the deepest node that already exists.
+        # Usually that's the immediate parent, so this saves an
+        # xpathEval for every ancestor compared to walking down from
+        # the root. Everything below it needs to be created, so no
+        # further lookups are required.
+        idx = len(stub_xpaths) - 1
+        parentnode = None
+        while idx >= 0:
+            parentnode = self._find(stub_xpaths[idx])
+            if parentnode is not None:
+                break
+            idx -= 1
+        if idx < 0:
             raise xmlutil.DevError(
                     "Did not find XML root node for xpath=%s" % fullxpath)
 
-        for xpathseg in xpathobj.segments[1:]:
-            oldxpath = parentxpath
-            parentxpath += "/%s" % xpathseg.fullsegment
-            tmpnode = self._find(parentxpath)
-            if tmpnode is not None:
-                # xpath node already exists, nothing to create yet
-                parentnode = tmpnode
-                continue
-
+        for segidx in range(idx + 1, len(stub_xpaths)):
+            xpathseg = xpathobj.segments[segidx]
             newnode = self._node_new(xpathseg, parentnode)
-            self._node_add_child(oldxpath, parentnode, newnode)
+            self._node_add_child(stub_xpaths[segidx - 1], parentnode, newnode)
             parentnode = newnode
 
             # For a conditional xpath like ./foo[@bar='baz'],
@@ -257,7 +304,7 @@ class _XMLBase(object):
         if it doesn't have any children or attributes, so we don't
         leave stale elements in the XML
         """
-        xpathobj = _XPath(fullxpath)
+        xpathobj = _parse_xpath(fullxpath)
         segments = xpathobj.segments[:]
         parent = None
         while segments:
@@ -280,7 +327,12 @@ def node_is_text(n):
 
 
 class _Libxml2API(_XMLBase):
-    def __init__(self, xml):
+    def __init__(self, xml, doc=None):
+        """
+        :param xml: XML string to parse
+        :param doc: Already parsed libxml2 document to take ownership
+            of instead of parsing xml
+        """
         _XMLBase.__init__(self)
 
         # Use of gtksourceview in virt-manager changes this libxml
@@ -289,7 +341,9 @@ class _Libxml2API(_XMLBase):
         # would take some investigation
         libxml2.keepBlanksDefault(1)
 
-        self._doc = libxml2.parseDoc(xml)
+        if doc is None:
+            doc = libxml2.parseDoc(xml)
+        self._doc = doc
         self._ctx = self._doc.xpathNewContext()
         self._ctx.setContextNode(self._doc.children)
         for key, val in self.NAMESPACES.items():
@@ -310,10 +364,12 @@ class _Libxml2API(_XMLBase):
         return xml
 
     def copy_api(self):
-        return _Libxml2API(self._doc.children.serialize())
+        # Deep copy the document tree in memory, rather than
+        # serializing it to a string and parsing that back in
+        return _Libxml2API(None, doc=self._doc.copyDoc(1))
 
     def _find(self, fullxpath):
-        xpath = _XPath(fullxpath).xpath
+        xpath = _parse_xpath(fullxpath).xpath
         try:
             node = self._ctx.xpathEval(xpath)
         except Exception as e:
@@ -371,6 +427,7 @@ class _Libxml2API(_XMLBase):
         return newnode
 
     def node_clear(self, xpath):
+        self.mark_dirty()
         node = self._find(xpath)
         if node:
             propnames = [p.name for p in (node.properties or [])]
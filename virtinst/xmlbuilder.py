@@ -183,12 +183,16 @@ class XMLChildProperty(_XMLPropertyBase):
 
     def insert(self, xmlbuilder, newobj, idx):
         self._get(xmlbuilder).insert(idx, newobj)
+        xmlbuilder._xmlstate.xmlapi.mark_dirty()
     def append(self, xmlbuilder, newobj):
         self._get(xmlbuilder).append(newobj)
+        xmlbuilder._xmlstate.xmlapi.mark_dirty()
     def remove(self, xmlbuilder, obj):
         self._get(xmlbuilder).remove(obj)
+        xmlbuilder._xmlstate.xmlapi.mark_dirty()
     def set(self, xmlbuilder, obj):
         xmlbuilder._propstore[self.propname] = obj
+        xmlbuilder._xmlstate.xmlapi.mark_dirty()
 
     def get_prop_xpath(self, _xmlbuilder, obj):
         return self.relative_xpath + "/" + obj.XML_NAME
@@ -313,6 +317,7 @@ class XMLProperty(_XMLPropertyBase):
         if self.propname in propstore:
             del(propstore[self.propname])
         propstore[self.propname] = val
+        xmlbuilder._xmlstate.xmlapi.mark_dirty()
 
     def _nonxml_fget(self, xmlbuilder):
         """
@@ -512,6 +517,7 @@ class XMLBuilder(object):
             parsexml = "".join([c for c in parsexml if c in string.printable])
 
         self._propstore = collections.OrderedDict()
+        self._xml_cache = None
         self._xmlstate = _XMLState(self.XML_NAME,
                                    parsexml, parentxmlstate,
                                    relative_object_xpath)
@@ -579,7 +585,13 @@ class XMLBuilder(object):
         """
         Return XML string of the object
         """
-        xmlapi = self._xmlstate.xmlapi
+        origapi = self._xmlstate.xmlapi
+        abs_xpath = self._xmlstate.abs_xpath()
+        cachekey = (origapi, origapi.generation, abs_xpath)
+        if self._xml_cache and self._xml_cache[0] == cachekey:
+            return self._xml_cache[1]
+
+        xmlapi = origapi
         if self._xmlstate.is_build:
             xmlapi = xmlapi.copy_api()
 
@@ -588,6 +600,10 @@ class XMLBuilder(object):
 
         if ret and not ret.endswith("\n"):
             ret += "\n"
+
+        # For parsed objects _add_parse_bits alters the backing document
+        # itself, so key the cache on the state it was left in
+        self._xml_cache = ((origapi, origapi.generation, abs_xpath), ret)
         return ret
 
     def clear(self, leave_stub=False):
@@ -651,6 +667,7 @@ class XMLBuilder(object):
         XML building step. Triggered via --xml on the command line
         """
         self._manual_actions.append(manualaction)
+        self._xmlstate.xmlapi.mark_dirty()
 
 
     ################
@@ -719,6 +736,7 @@ class XMLBuilder(object):
         """
         Set new backing XML objects in ourselves and all our child props
         """
+        self._xml_cache = None
         self._xmlstate.parse(*args, **kwargs)
         for propname in self._all_child_props():
             for p in xmlutil.listify(getattr(self, propname, [])):